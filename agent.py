@@ -1,11 +1,17 @@
 """Agentic AI routing using LangGraph for autonomous tool selection."""
-from typing import TypedDict, Literal, List, Dict, Any
+from typing import TypedDict, Literal, List, Dict, Any, Iterator, AsyncIterator, Tuple
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 from config import config
 from tools import AgentTools
+from router import get_shared_router
+from sessions import Conversation
+from logging_setup import get_logger, SAMPLED
 import json
 
+logger = get_logger(__name__)
+
 class AgentState(TypedDict):
     """State schema for the agent graph."""
     messages: List[Dict[str, str]]
@@ -14,8 +20,9 @@ class AgentState(TypedDict):
 class MarketAnalystAgent:
     """Autonomous agent that routes queries to appropriate tools using LangGraph."""
 
-    def __init__(self, retriever):
-        self.agent_tools = AgentTools(retriever)
+    def __init__(self, retriever, vector_store_manager=None):
+        self.agent_tools = AgentTools(retriever, vector_store_manager)
+        self.router = get_shared_router(vector_store_manager)
         self.graph = self._build_graph()
 
     def _build_graph(self):
@@ -26,16 +33,7 @@ class MarketAnalystAgent:
             if not state["messages"]:
                 return state
             
-            last_message = state["messages"][-1]["content"].lower()
-            
-            # Route based on query content
-            if any(word in last_message for word in ["extract", "json", "data", "structure"]):
-                state["next_action"] = "extract"
-            elif any(word in last_message for word in ["summarize", "summary", "overview"]):
-                state["next_action"] = "summarize"
-            else:
-                state["next_action"] = "qa"
-            
+            state["next_action"] = self.route_query(state["messages"][-1]["content"])
             return state
 
         def qa_tool_node(state: AgentState) -> AgentState:
@@ -47,17 +45,31 @@ class MarketAnalystAgent:
             state["messages"].append({"role": "assistant", "content": response})
             return state
 
+        async def aqa_tool_node(state: AgentState) -> AgentState:
+            """Async Q&A tool node."""
+            if not state["messages"]:
+                return state
+            query = state["messages"][-1]["content"]
+            response = await self.agent_tools.aqa_tool(query)
+            state["messages"].append({"role": "assistant", "content": response})
+            return state
+
+        def summary_aspect(state: AgentState) -> str:
+            return self._summary_aspect(state["messages"][-1]["content"])
+
         def summarize_tool_node(state: AgentState) -> AgentState:
             """Summarization tool node."""
             if not state["messages"]:
                 return state
-            query = state["messages"][-1]["content"]
-            aspect = "overall"
-            if "competitor" in query.lower():
-                aspect = "competitors"
-            elif "swot" in query.lower():
-                aspect = "swot"
-            response = self.agent_tools.summarize_tool(aspect)
+            response = self.agent_tools.summarize_tool(summary_aspect(state))
+            state["messages"].append({"role": "assistant", "content": response})
+            return state
+
+        async def asummarize_tool_node(state: AgentState) -> AgentState:
+            """Async summarization tool node."""
+            if not state["messages"]:
+                return state
+            response = await self.agent_tools.asummarize_tool(summary_aspect(state))
             state["messages"].append({"role": "assistant", "content": response})
             return state
 
@@ -68,6 +80,13 @@ class MarketAnalystAgent:
             state["messages"].append({"role": "assistant", "content": response})
             return state
 
+        async def aextract_tool_node(state: AgentState) -> AgentState:
+            """Async data extraction tool node."""
+            data = await self.agent_tools.aextract_data_tool()
+            response = json.dumps(data, indent=2)
+            state["messages"].append({"role": "assistant", "content": response})
+            return state
+
         def route_decision(state: AgentState) -> Literal["qa", "summarize", "extract", "end"]:
             """Conditional routing based on agent decision."""
             action = state.get("next_action", "end")
@@ -76,11 +95,11 @@ class MarketAnalystAgent:
         # Build the graph
         workflow = StateGraph(AgentState)
         
-        # Add nodes
+        # Add nodes (sync for invoke, async for ainvoke)
         workflow.add_node("router", router_node)
-        workflow.add_node("qa", qa_tool_node)
-        workflow.add_node("summarize", summarize_tool_node)
-        workflow.add_node("extract", extract_tool_node)
+        workflow.add_node("qa", RunnableLambda(qa_tool_node, aqa_tool_node))
+        workflow.add_node("summarize", RunnableLambda(summarize_tool_node, asummarize_tool_node))
+        workflow.add_node("extract", RunnableLambda(extract_tool_node, aextract_tool_node))
         
         # Set entry point
         workflow.set_entry_point("router")
@@ -104,9 +123,64 @@ class MarketAnalystAgent:
         
         return workflow.compile()
 
+    def route_query(self, query: str) -> str:
+        """Pick the tool for a query: "qa", "summarize" or "extract"."""
+        return self.router.route(query)
+
+    def _run_tool(self, action: str, query: str) -> str:
+        if action == "extract":
+            return json.dumps(self.agent_tools.extract_data_tool(), indent=2)
+        if action == "summarize":
+            return self.agent_tools.summarize_tool(self._summary_aspect(query))
+        return self.agent_tools.qa_tool(query)
+
+    async def _arun_tool(self, action: str, query: str) -> str:
+        if action == "extract":
+            return json.dumps(await self.agent_tools.aextract_data_tool(), indent=2)
+        if action == "summarize":
+            return await self.agent_tools.asummarize_tool(self._summary_aspect(query))
+        return await self.agent_tools.aqa_tool(query)
+
+    async def _aroute_query(self, query: str) -> str:
+        # Routing may embed the query, which is CPU-bound
+        return await self.agent_tools._run_blocking(self.route_query, query)
+
+    def _summary_aspect(self, query: str) -> str:
+        aspect = "overall"
+        if "competitor" in query.lower():
+            aspect = "competitors"
+        elif "swot" in query.lower():
+            aspect = "swot"
+        return aspect
+
+    def stream_query(self, query: str) -> Iterator[str]:
+        """Route a query and yield the tool's output tokens as they arrive."""
+        action = self.route_query(query)
+        if action == "extract":
+            yield json.dumps(self.agent_tools.extract_data_tool(), indent=2)
+        elif action == "summarize":
+            yield from self.agent_tools.summarize_tool_stream(self._summary_aspect(query))
+        else:
+            yield from self.agent_tools.qa_tool_stream(query)
+
+    async def astream_query(self, query: str) -> AsyncIterator[str]:
+        """Async variant of stream_query."""
+        action = await self._aroute_query(query)
+        if action == "extract":
+            yield json.dumps(await self.agent_tools.aextract_data_tool(), indent=2)
+        elif action == "summarize":
+            async for token in self.agent_tools.asummarize_tool_stream(self._summary_aspect(query)):
+                yield token
+        else:
+            async for token in self.agent_tools.aqa_tool_stream(query):
+                yield token
+
     def process_query(self, query: str) -> str:
         """Process a user query through the agentic workflow."""
-        print(f"🤖 Processing query through LangGraph agent...")
+        if config.AGENT_DIRECT_DISPATCH:
+            # Same routing and tools as the graph, without the graph's per-step state handling
+            return self._run_tool(self.route_query(query), query)
+        logger.debug("Processing query through LangGraph agent", extra=SAMPLED)
         initial_state = {
             "messages": [{"role": "user", "content": query}],
             "next_action": ""
@@ -115,6 +189,22 @@ class MarketAnalystAgent:
         result = self.graph.invoke(initial_state)
         
         # Extract final response
+        return self._final_response(result)
+
+    async def aprocess_query(self, query: str) -> str:
+        """Process a user query through the agentic workflow without blocking."""
+        if config.AGENT_DIRECT_DISPATCH:
+            return await self._arun_tool(await self._aroute_query(query), query)
+        logger.debug("Processing query through LangGraph agent (async)", extra=SAMPLED)
+        initial_state = {
+            "messages": [{"role": "user", "content": query}],
+            "next_action": ""
+        }
+
+        result = await self.graph.ainvoke(initial_state)
+        return self._final_response(result)
+
+    def _final_response(self, result: Dict[str, Any]) -> str:
         if result["messages"]:
             last_message = result["messages"][-1]
             if isinstance(last_message, dict):
@@ -122,21 +212,47 @@ class MarketAnalystAgent:
             return str(last_message)
         return "No response generated"
 
+    def process_turn(self, conversation: Conversation, message: str) -> Tuple[str, str]:
+        """Answer one chat message; returns (standalone query, response).
+
+        Follow-ups are rewritten against the conversation's compact history,
+        the turn is recorded, and turns leaving the window are summarized.
+        """
+        query = self.agent_tools.rewrite_query(message, conversation)
+        response = self.process_query(query)
+        conversation.add("user", message)
+        conversation.add("assistant", response)
+        conversation.fold(self.agent_tools.summarize_history)
+        return query, response
+
+    async def aprocess_turn(self, conversation: Conversation, message: str) -> Tuple[str, str]:
+        """Async variant of process_turn."""
+        query = await self.agent_tools.arewrite_query(message, conversation)
+        response = await self.aprocess_query(query)
+        conversation.add("user", message)
+        conversation.add("assistant", response)
+        await conversation.afold(self.agent_tools.asummarize_history)
+        return query, response
+
     def process_query_with_history(self, messages: List[Dict[str, str]]) -> str:
-        """Process query with conversation history."""
+        """Process query with conversation history.
+
+        Only the most recent turns within SESSION_WINDOW_TOKENS are used, to
+        rewrite a follow-up into a standalone query; use process_turn with a
+        Conversation to keep a summary of older turns as well.
+        """
         if not messages:
             return "No query found"
+        conversation = Conversation.from_messages(messages[:-1])
+        query = self.agent_tools.rewrite_query(messages[-1]["content"], conversation)
+        if config.AGENT_DIRECT_DISPATCH:
+            return self._run_tool(self.route_query(query), query)
         
         initial_state = {
-            "messages": messages,
+            "messages": conversation.prompt_turns() + [{"role": "user", "content": query}],
             "next_action": ""
         }
         
         result = self.graph.invoke(initial_state)
         
-        if result["messages"]:
-            last_message = result["messages"][-1]
-            if isinstance(last_message, dict):
-                return last_message.get("content", "No response")
-            return str(last_message)
-        return "No response generated"
+        return self._final_response(result)
@@ -1,11 +1,26 @@
 """FastAPI application for AI Market Analyst (Groq/HuggingFace)."""
-from fastapi import FastAPI, HTTPException
+import asyncio
+import os
+import tempfile
+import time
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, AsyncIterator
 from config import config
 from document_processor import DocumentProcessor
 from vector_store import VectorStoreManager
 from agent import MarketAnalystAgent
+from document_registry import DocumentRegistry
+from ingest_jobs import IngestQueue
+from streaming import ThinkStreamSplitter, sse_event
+from sessions import SessionStore
+import groq
+import metrics
+from llm_client import get_llm_client, retry_after
+from logging_setup import get_logger
+
+logger = get_logger(__name__)
 
 app = FastAPI(
     title="AI Market Analyst API",
@@ -15,30 +30,160 @@ app = FastAPI(
 
 agent = None
 vector_store_manager = None
+document_registry = None
+ingest_queue = None
+# Bounds in-flight LLM work so a burst of requests queues instead of piling onto Groq
+request_limiter = metrics.TrackedSemaphore(config.MAX_CONCURRENT_REQUESTS)
+# Server-side chat state for /api/chat
+session_store = SessionStore()
 
 class QueryRequest(BaseModel):
     query: str
     mode: Optional[str] = "auto"  # auto, qa, summarize, extract
+    # Registered documents to search; the default report when omitted
+    document_ids: Optional[List[str]] = None
 
 class QueryResponse(BaseModel):
     query: str
     response: str
     mode: str
 
+class ExtractRequest(BaseModel):
+    document_ids: Optional[List[str]] = None
+
 class ExtractionResponse(BaseModel):
     data: Dict[str, Any]
 
+class ChatRequest(BaseModel):
+    message: str
+    # Omit to start a new conversation; the response carries the ID to send next time
+    session_id: Optional[str] = None
+    document_ids: Optional[List[str]] = None
+
+class ChatResponse(BaseModel):
+    session_id: str
+    message: str
+    # The follow-up rewritten as a standalone question (same as message when not needed)
+    query: str
+    response: str
+    turns: int
+    summarized: bool
+
+class BatchRequest(BaseModel):
+    queries: List[str]
+    document_ids: Optional[List[str]] = None
+
+class BatchResponse(BaseModel):
+    results: List[QueryResponse]
+
 @app.on_event("startup")
 async def startup_event():
-    global agent, vector_store_manager
-    print("Initializing AI Market Analyst pipeline...")
+    global agent, vector_store_manager, document_registry, ingest_queue
+    logger.info("Initializing AI Market Analyst pipeline")
     processor = DocumentProcessor()
-    chunks = processor.process_document(config.DOCUMENT_PATH)
     vector_store_manager = VectorStoreManager()
-    vector_store_manager.create_vector_store(chunks)
+    if config.EMBEDDING_WARMUP:
+        # An up-to-date index never touches the model, so load it before the first query
+        vector_store_manager.warm_up(background=True)
+    vector_store_manager.sync_vector_store(processor.iter_chunks(config.DOCUMENT_PATH), processor.settings)
     retriever = vector_store_manager.get_retriever(k=3)
-    agent = MarketAnalystAgent(retriever)
-    print("✓ System initialized successfully!")
+    agent = MarketAnalystAgent(retriever, vector_store_manager)
+    agent.agent_tools.precompute_artifacts(background=True)
+    document_registry = DocumentRegistry()
+    ingest_queue = IngestQueue(document_registry)
+    logger.info("System initialized")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if ingest_queue is not None:
+        ingest_queue.shutdown()
+    await get_llm_client().aclose()
+
+def _cache_hit_ratios() -> dict:
+    ratios = {}
+    if vector_store_manager is not None and vector_store_manager.cache_stats():
+        ratios["embedding"] = vector_store_manager.cache_stats()["hit_ratio"]
+    if agent is not None:
+        ratios["router"] = agent.router.stats()["hit_ratio"]
+        if agent.agent_tools.response_cache is not None:
+            ratios["response"] = agent.agent_tools.response_cache.stats()["hit_ratio"]
+    return ratios
+
+metrics.registry.register_gauge(
+    "request_queue_depth", "API requests waiting for or holding a concurrency slot", "state",
+    lambda: {"waiting": request_limiter.waiting, "in_flight": request_limiter.in_flight}
+)
+metrics.registry.register_gauge("cache_hit_ratio", "Hit ratio per cache", "cache", _cache_hit_ratios)
+metrics.registry.register_gauge(
+    "ingest_jobs", "Upload ingestion jobs by status", "status",
+    lambda: ingest_queue.stats() if ingest_queue is not None else {}
+)
+
+if config.METRICS_ENABLED:
+    @app.middleware("http")
+    async def timing_middleware(request: Request, call_next):
+        """Time each request and report its stage breakdown in a Server-Timing header.
+
+        For streaming endpoints the header covers only the work done before the
+        first byte; the LLM time of the stream still goes to /metrics.
+        """
+        timings, token = metrics.start_request()
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.end_request(token)
+            # Label by route template, not raw path: session and job IDs (and 404 probes)
+            # would otherwise create a new time series per request
+            route = request.scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            metrics.registry.observe("http_request_seconds", elapsed, path=path)
+            metrics.registry.inc("http_requests_total", path=path, status=str(status))
+        response.headers["Server-Timing"] = timings.server_timing(elapsed)
+        if "context_tokens_saved" in timings.counts:
+            response.headers["X-Context-Tokens-Saved"] = str(int(timings.counts["context_tokens_saved"]))
+        return response
+
+def _http_error(error: Exception) -> HTTPException:
+    """Map a pipeline failure to an HTTP error; upstream throttling stays a 429."""
+    if isinstance(error, HTTPException):
+        return error
+    if isinstance(error, groq.RateLimitError):
+        wait = retry_after(error)
+        headers = {"Retry-After": str(max(1, round(wait)))} if wait is not None else None
+        return HTTPException(status_code=429, detail="LLM rate limit reached, retry later", headers=headers)
+    if isinstance(error, groq.APITimeoutError):
+        return HTTPException(status_code=504, detail="LLM request timed out")
+    if isinstance(error, (groq.APIConnectionError, groq.InternalServerError)):
+        return HTTPException(status_code=502, detail=f"LLM service error: {error}")
+    return HTTPException(status_code=500, detail=str(error))
+
+async def _limited(tools, tool: str, argument: str, call):
+    """Await `call()` holding a concurrency slot.
+
+    Identical concurrent requests are coalesced first, so followers wait for
+    the leader's result without taking a slot of their own.
+    """
+    async def run():
+        async with request_limiter:
+            return await call()
+    if tools.single_flight is None:
+        return await run()
+    return await tools.single_flight.ado(tools.flight_key(tool, argument), run)
+
+def _agent_for(document_ids: Optional[List[str]] = None) -> MarketAnalystAgent:
+    """Default agent, or one over the requested registered documents."""
+    if agent is None:
+        raise HTTPException(status_code=503, detail="Agent not initialized")
+    if not document_ids:
+        return agent
+    unknown = [doc_id for doc_id in document_ids if document_registry.get(doc_id) is None]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown document IDs: {', '.join(unknown)}")
+    return document_registry.get_agent(document_ids)
 
 @app.get("/")
 async def root():
@@ -50,7 +195,15 @@ async def root():
             "qa": "/api/qa",
             "summarize": "/api/summarize",
             "extract": "/api/extract",
-            "health": "/health"
+            "batch": "/api/batch",
+            "chat": "/api/chat",
+            "documents": "/api/documents",
+            "document_jobs": "/api/documents/jobs",
+            "query_stream": "/api/query/stream",
+            "qa_stream": "/api/qa/stream",
+            "summarize_stream": "/api/summarize/stream",
+            "health": "/health",
+            "metrics": "/metrics"
         }
     }
 
@@ -59,61 +212,220 @@ async def health_check():
     return {
         "status": "healthy",
         "agent_initialized": agent is not None,
-        "vector_store_initialized": vector_store_manager is not None
+        "vector_store_initialized": vector_store_manager is not None,
+        "embedding_model": vector_store_manager.embedding_info() if vector_store_manager else {},
+        "embedding_cache": vector_store_manager.cache_stats() if vector_store_manager else {},
+        "router": agent.router.stats() if agent else {},
+        "response_cache": agent.agent_tools.response_cache.stats()
+        if agent and agent.agent_tools.response_cache else {},
+        "coalescing": agent.agent_tools.single_flight.stats()
+        if agent and agent.agent_tools.single_flight else {},
+        "summarizer": agent.agent_tools.summarizer.stats()
+        if agent and agent.agent_tools.summarizer else {},
+        "sessions": session_store.stats(),
+        "ingest_jobs": ingest_queue.stats() if ingest_queue else {}
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus text exposition of stage timings, LLM usage, caches and queue depth."""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/api/query", response_model=QueryResponse)
 async def query_endpoint(request: QueryRequest):
-    if agent is None:
-        raise HTTPException(status_code=503, detail="Agent not initialized")
+    target = _agent_for(request.document_ids)
     try:
-        response = agent.process_query(request.query)
+        async with request_limiter:
+            response = await target.aprocess_query(request.query)
         return QueryResponse(
             query=request.query,
             response=response,
             mode="auto"
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _http_error(e)
 
 @app.post("/api/qa", response_model=QueryResponse)
 async def qa_endpoint(request: QueryRequest):
-    if agent is None:
-        raise HTTPException(status_code=503, detail="Agent not initialized")
+    target = _agent_for(request.document_ids)
     try:
-        response = agent.agent_tools.qa_tool(request.query)
+        tools = target.agent_tools
+        response = await _limited(tools, "qa", request.query, lambda: tools.aqa_tool(request.query))
         return QueryResponse(
             query=request.query,
             response=response,
             mode="qa"
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _http_error(e)
 
 @app.post("/api/summarize", response_model=QueryResponse)
 async def summarize_endpoint(request: QueryRequest):
-    if agent is None:
-        raise HTTPException(status_code=503, detail="Agent not initialized")
+    target = _agent_for(request.document_ids)
     try:
         aspect = request.query if request.query else "overall"
-        response = agent.agent_tools.summarize_tool(aspect)
+        tools = target.agent_tools
+        response = await _limited(tools, "summarize", aspect, lambda: tools.asummarize_tool(aspect))
         return QueryResponse(
             query=request.query,
             response=response,
             mode="summarize"
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _http_error(e)
 
 @app.post("/api/extract", response_model=ExtractionResponse)
-async def extract_endpoint():
-    if agent is None:
-        raise HTTPException(status_code=503, detail="Agent not initialized")
+async def extract_endpoint(request: Optional[ExtractRequest] = None):
+    # The body is optional: an empty POST extracts from the default report
+    target = _agent_for(request.document_ids if request else None)
     try:
-        data = agent.agent_tools.extract_data_tool("all")
+        tools = target.agent_tools
+        data = await _limited(tools, "extract", "all", lambda: tools.aextract_data_tool("all"))
         return ExtractionResponse(data=data)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _http_error(e)
+
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat_endpoint(request: ChatRequest):
+    """One turn of a multi-turn conversation kept server-side under session_id."""
+    target = _agent_for(request.document_ids)
+    session = session_store.get(request.session_id)
+    try:
+        async with session.lock:
+            async with request_limiter:
+                query, response = await target.aprocess_turn(session.conversation, request.message)
+            conversation = session.conversation
+            return ChatResponse(
+                session_id=session.id,
+                message=request.message,
+                query=query,
+                response=response,
+                turns=conversation.total_turns // 2,
+                summarized=bool(conversation.summary)
+            )
+    except Exception as e:
+        raise _http_error(e)
+
+@app.get("/api/chat/{session_id}")
+async def get_chat_session(session_id: str):
+    if session_id not in session_store:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    session = session_store.get(session_id)
+    return dict(session.conversation.to_dict(), session_id=session.id)
+
+@app.delete("/api/chat/{session_id}")
+async def delete_chat_session(session_id: str):
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return {"session_id": session_id, "deleted": True}
+
+@app.post("/api/batch", response_model=BatchResponse)
+async def batch_endpoint(request: BatchRequest):
+    target = _agent_for(request.document_ids)
+    if len(request.queries) > config.MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch too large: {len(request.queries)} queries (max {config.MAX_BATCH_SIZE})"
+        )
+    try:
+        async with request_limiter:
+            responses = await target.agent_tools.aqa_batch(request.queries)
+        return BatchResponse(results=[
+            QueryResponse(query=query, response=response, mode="qa")
+            for query, response in zip(request.queries, responses)
+        ])
+    except Exception as e:
+        raise _http_error(e)
+
+async def _sse_stream(tokens: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Forward tokens as server-sent events, separating <think> blocks live."""
+    splitter = ThinkStreamSplitter()
+    async with request_limiter:
+        try:
+            async for token in tokens:
+                for kind, text in splitter.feed(token):
+                    yield sse_event(kind, {"text": text})
+            for kind, text in splitter.flush():
+                yield sse_event(kind, {"text": text})
+            yield sse_event("done", {})
+        except Exception as e:
+            error = _http_error(e)
+            yield sse_event("error", {"status": error.status_code, "detail": error.detail})
+
+def _sse_response(tokens: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        _sse_stream(tokens),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/query/stream")
+async def query_stream_endpoint(request: QueryRequest):
+    target = _agent_for(request.document_ids)
+    return _sse_response(target.astream_query(request.query))
+
+@app.post("/api/qa/stream")
+async def qa_stream_endpoint(request: QueryRequest):
+    target = _agent_for(request.document_ids)
+    return _sse_response(target.agent_tools.aqa_tool_stream(request.query))
+
+@app.post("/api/summarize/stream")
+async def summarize_stream_endpoint(request: QueryRequest):
+    target = _agent_for(request.document_ids)
+    aspect = request.query if request.query else "overall"
+    return _sse_response(target.agent_tools.asummarize_tool_stream(aspect))
+
+@app.get("/api/documents")
+async def list_documents():
+    if document_registry is None:
+        raise HTTPException(status_code=503, detail="Document registry not initialized")
+    return {
+        "documents": document_registry.list_documents(),
+        "open_collections": document_registry.open_count()
+    }
+
+@app.post("/api/documents", status_code=202)
+async def upload_document(file: UploadFile = File(...)):
+    """Queue an uploaded .txt/.pdf for indexing; poll /api/documents/jobs/{job_id} for progress.
+
+    A file whose content is already indexed (or being indexed) is not processed
+    again: the job is complete at once, or is the one already running.
+    """
+    if ingest_queue is None:
+        raise HTTPException(status_code=503, detail="Document registry not initialized")
+    extension = os.path.splitext(file.filename or "")[1].lower()
+    if extension not in (".txt", ".pdf"):
+        raise HTTPException(status_code=415, detail="Only .txt and .pdf files are supported")
+
+    os.makedirs(config.UPLOAD_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=extension, dir=config.UPLOAD_DIR)
+    size, limit = 0, config.MAX_UPLOAD_MB * 1024 * 1024
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while block := await file.read(1 << 20):
+                size += len(block)
+                if size > limit:
+                    raise HTTPException(status_code=413, detail=f"File exceeds {config.MAX_UPLOAD_MB:g} MB")
+                f.write(block)
+    except BaseException:
+        os.remove(path)
+        raise
+    # Hashing reads the whole file, so keep it off the event loop
+    job = await asyncio.to_thread(ingest_queue.submit, path, file.filename, True)
+    return job.to_dict()
+
+@app.get("/api/documents/jobs")
+async def list_ingest_jobs():
+    if ingest_queue is None:
+        raise HTTPException(status_code=503, detail="Document registry not initialized")
+    return {"jobs": [job.to_dict() for job in ingest_queue.jobs()]}
+
+@app.get("/api/documents/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    job = ingest_queue.get(job_id) if ingest_queue is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job.to_dict()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,107 @@
+"""Ingest-time extraction and summary artifacts, persisted beside the vector store."""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+from config import config
+from logging_setup import get_logger
+
+logger = get_logger(__name__)
+
+
+class ArtifactStore:
+    """Stores the structured extraction and every aspect summary per document version.
+
+    Artifacts are computed once per index version and written as JSON under
+    `<persist_directory>/artifacts/<collection>/`; reads are served from an
+    in-memory copy of the file after the first load.
+    """
+
+    def __init__(self, persist_directory: Optional[str] = None, collection_name: Optional[str] = None):
+        self.directory = os.path.join(
+            persist_directory or config.VECTOR_DB_PATH,
+            "artifacts",
+            collection_name or config.COLLECTION_NAME,
+        )
+        self._loaded: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._refreshing = set()
+
+    def path(self, version: str) -> str:
+        return os.path.join(self.directory, f"{version}.json")
+
+    def load(self, version: Optional[str]) -> Optional[Dict[str, Any]]:
+        if version is None:
+            return None
+        artifacts = self._loaded.get(version)
+        if artifacts is not None:
+            return artifacts
+        try:
+            with open(self.path(version), "r", encoding="utf-8") as f:
+                artifacts = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._loaded[version] = artifacts
+        return artifacts
+
+    def save(self, version: str, artifacts: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.path(version) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(artifacts, f, indent=2)
+        os.replace(tmp_path, self.path(version))
+        self._loaded[version] = artifacts
+        self._prune(keep_version=version)
+
+    def _prune(self, keep_version: str) -> None:
+        """Remove artifacts of older document versions."""
+        for name in os.listdir(self.directory):
+            if name.endswith(".json") and name != f"{keep_version}.json":
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+        for version in [v for v in self._loaded if v != keep_version]:
+            del self._loaded[version]
+
+    def compute(self, agent_tools, version: str) -> Dict[str, Any]:
+        """Run the extraction and all summary aspects against the current index."""
+        started = time.time()
+        extract = agent_tools.extract_data_tool("all")
+        artifacts = {
+            "version": version,
+            # A failed parse is not worth pinning; the live tool retries instead
+            "extract": None if "error" in extract else extract,
+            "summaries": {
+                aspect: agent_tools.summarize_tool(aspect) for aspect in agent_tools.SUMMARY_QUERIES
+            },
+            "created_at": started,
+            "duration_seconds": round(time.time() - started, 2),
+        }
+        self.save(version, artifacts)
+        logger.info("Precomputed extraction and %d summaries for index version %s",
+                    len(artifacts["summaries"]), version)
+        return artifacts
+
+    def refresh_in_background(self, agent_tools, version: Optional[str]) -> Optional[threading.Thread]:
+        """Compute artifacts for `version` in a daemon thread unless they already exist."""
+        if version is None or self.load(version) is not None:
+            return None
+        with self._lock:
+            if version in self._refreshing:
+                return None
+            self._refreshing.add(version)
+
+        def run():
+            try:
+                self.compute(agent_tools, version)
+            except Exception:
+                logger.exception("Artifact precompute failed for version %s", version)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(version)
+
+        thread = threading.Thread(target=run, name=f"artifacts-{version}", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,975 @@
+"""Benchmarks and load tests for the AI Market Analyst pipeline.
+
+Usage:
+    python benchmark.py load --requests 20 --latency 0.5 --endpoint /api/qa
+    python benchmark.py backends --scale 10
+    python benchmark.py embeddings --backends torch,int8,onnx --texts 512
+    python benchmark.py routing --repeat 200
+    python benchmark.py retrieval --scale 10 --k 3
+    python benchmark.py splitters --scale 50 --documents 16
+    python benchmark.py suite --scales 1,10,100 --latency 0.3 --concurrency 1,8,32
+    python benchmark.py compare benchmark_results/baseline.json benchmark_results/suite-latest.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+# The stubbed pipeline never reaches Groq, but the client still wants a key
+os.environ.setdefault("GROQ_API_KEY", "benchmark-stub")
+
+from langchain.schema import Document
+
+
+class StubAsyncGroq:
+    """Stand-in for AsyncGroq that answers every completion after a fixed delay."""
+
+    def __init__(self, latency: float, content: str = "stub answer"):
+        async def create(**kwargs):
+            await asyncio.sleep(latency)
+            message = SimpleNamespace(content=content)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+
+class StaticRetriever:
+    """Retriever returning a fixed context, so the load test measures the request path only."""
+
+    def __init__(self, text: str = "Innovate Inc holds 12% of a $15B market."):
+        self.documents = [Document(page_content=text, metadata={"source": "benchmark"})]
+
+    def get_relevant_documents(self, query):
+        return self.documents
+
+
+BENCHMARK_QUERIES = [
+    "What is the current market size?",
+    "Who are the main competitors and their market share?",
+    "What is the projected CAGR through 2030?",
+    "What are the weaknesses in the SWOT analysis?",
+    "What are the strategic priorities?",
+    "Which product is the flagship?",
+]
+
+
+# Labeled retrieval questions: a hit is a retrieved chunk containing the phrase
+RETRIEVAL_CASES = [
+    ("What market share does Synergy Systems hold?", "Synergy Systems"),
+    ("How much of the market does FutureFlow have?", "FutureFlow"),
+    ("Is QuantumLeap a threat?", "QuantumLeap"),
+    ("What is Innovate Inc's market share?", "12%"),
+    ("What is the CAGR?", "CAGR"),
+    ("How big will the market be by 2030?", "2030"),
+    ("What is the current market size in billions?", "$15"),
+    ("What is the projected market size?", "$40"),
+    ("What is AutomateX?", "AutomateX"),
+    ("Which reporting period does the report cover?", "Q3"),
+    ("What are the weaknesses?", "weakness"),
+    ("What are the opportunities for growth?", "opportunit"),
+    ("What strategic priorities are recommended?", "strateg"),
+    ("Who are the competitors?", "compet"),
+]
+
+
+# Held-out labeled queries (none appear in router.ROUTE_EXEMPLARS)
+ROUTING_CASES = [
+    ("What data does the report give on market size?", "qa"),
+    ("Which data centers does Innovate Inc operate?", "qa"),
+    ("How is the structure of the sales team organized?", "qa"),
+    ("Who leads the market?", "qa"),
+    ("What threats are listed?", "qa"),
+    ("What revenue did the company report last year?", "qa"),
+    ("How much funding did Innovate Inc raise?", "qa"),
+    ("What does the report say about data security?", "qa"),
+    ("Summarize the competitors section", "summarize"),
+    ("Give me the gist of this document", "summarize"),
+    ("What are the main points of the report in a few sentences?", "summarize"),
+    ("Recap the SWOT findings", "summarize"),
+    ("TL;DR of the market analysis please", "summarize"),
+    ("An overview of strengths and weaknesses", "summarize"),
+    ("Extract all financial figures", "extract"),
+    ("Give me the key numbers in JSON", "extract"),
+    ("Put the market size, growth rate and top competitors into fields", "extract"),
+    ("I need the company metrics as a structured record", "extract"),
+    ("Pull the competitor market shares into a table", "extract"),
+]
+
+
+def legacy_keyword_route(query: str) -> str:
+    """The substring rules the agent used before the routing subsystem, kept as a baseline."""
+    text = query.lower()
+    if any(word in text for word in ["extract", "json", "data", "structure"]):
+        return "extract"
+    if any(word in text for word in ["summarize", "summary", "overview"]):
+        return "summarize"
+    return "qa"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def synthetic_report(path: str, scale: int) -> str:
+    """The report text repeated `scale` times, each copy tagged so chunks stay distinct."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if scale <= 1:
+        return text
+    return "\n\n".join(f"[Part {i + 1}]\n{text}" for i in range(scale))
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_backend(backend: str, document: str, scale: int, persist_directory: str, repeat: int) -> dict:
+    """Build, reopen and query one vector backend; meant to run in its own process."""
+    from document_processor import DocumentProcessor
+    from langchain.schema import Document as LCDocument
+    from vector_store import VectorStoreManager
+
+    processor = DocumentProcessor()
+    doc = LCDocument(page_content=synthetic_report(document, scale), metadata={"source": document})
+    chunks = processor.text_splitter.split_documents([doc])
+
+    manager = VectorStoreManager(persist_directory=persist_directory, backend=backend)
+    query_vectors = manager.embed_queries(BENCHMARK_QUERIES)
+    rss_before = _peak_rss_mb()
+
+    start = time.perf_counter()
+    manager.create_vector_store(chunks)
+    build_s = time.perf_counter() - start
+
+    reopened = VectorStoreManager(persist_directory=persist_directory, backend=backend)
+    start = time.perf_counter()
+    reopened.load_vector_store()
+    startup_s = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(repeat):
+        for vector in query_vectors:
+            start = time.perf_counter()
+            reopened.vector_store.similarity_search_by_vector(vector, k=5)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "backend": backend,
+        "chunks": len(chunks),
+        "build_s": round(build_s, 3),
+        "startup_s": round(startup_s, 4),
+        "query_p50_ms": round(percentile(latencies, 50), 3),
+        "query_p95_ms": round(percentile(latencies, 95), 3),
+        "rss_growth_mb": round(_peak_rss_mb() - rss_before, 1),
+    }
+
+
+def compare_backends(document: str, scale: int, repeat: int) -> List[dict]:
+    """Run each backend in a fresh process so startup time and RSS are not shared."""
+    results = []
+    for backend in ("chroma", "chroma", "faiss"):
+        # The first chroma pass warms the embedding cache so builds compare storage, not inference
+        persist_directory = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+        try:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "backend-run", "--backend", backend,
+                 "--document", document, "--scale", str(scale), "--repeat", str(repeat),
+                 "--persist-directory", persist_directory],
+                check=True, capture_output=True, text=True
+            ).stdout
+        finally:
+            shutil.rmtree(persist_directory, ignore_errors=True)
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results[1:]
+
+
+def run_embedding_backend(backend: str, document: str, texts: int, batch_size: int, threads: int) -> dict:
+    """Import, load and throughput figures for one embedding backend; meant to run in its own process."""
+    start = time.perf_counter()
+    import api_main  # noqa: F401  (boot cost of the API module graph)
+    import_s = time.perf_counter() - start
+
+    from document_processor import DocumentProcessor
+    from embedding_engine import EmbeddingEngine
+
+    chunks = [
+        doc.page_content for doc in DocumentProcessor().text_splitter.split_documents(
+            [Document(page_content=synthetic_report(document, max(1, texts // 20)))]
+        )
+    ][:texts]
+
+    start = time.perf_counter()
+    if backend == "langchain":
+        # The previous path: HuggingFaceEmbeddings constructed eagerly
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        model = HuggingFaceEmbeddings(
+            model_name=api_main.config.EMBEDDING_MODEL_NAME,
+            model_kwargs={"device": "cpu"},
+            encode_kwargs={"batch_size": batch_size}
+        )
+        model.embed_documents(["warmup"])
+    else:
+        model = EmbeddingEngine(api_main.config.EMBEDDING_MODEL_NAME, backend=backend,
+                                batch_size=batch_size, num_threads=threads)
+        model.warmup()
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model.embed_documents(chunks)
+    embed_s = time.perf_counter() - start
+
+    return {
+        "backend": backend,
+        "texts": len(chunks),
+        "import_api_s": round(import_s, 3),
+        "model_load_s": round(load_s, 3),
+        "embed_s": round(embed_s, 3),
+        "embeddings_per_s": round(len(chunks) / embed_s, 1) if embed_s else 0.0,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def compare_embedding_backends(backends: List[str], document: str, texts: int,
+                               batch_size: int, threads: int) -> List[dict]:
+    """Run each embedding backend in a fresh process so import and load times are cold."""
+    results = []
+    env = dict(os.environ, EMBEDDING_CACHE_ENABLED="false", EMBEDDING_WARMUP="false")
+    for backend in backends:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "embedding-run", "--backend", backend,
+             "--document", document, "--texts", str(texts), "--batch-size", str(batch_size),
+             "--threads", str(threads)],
+            capture_output=True, text=True, env=env
+        )
+        if completed.returncode != 0:
+            error = (completed.stderr.strip().splitlines() or ["failed"])[-1]
+            results.append({"backend": backend, "error": error})
+            continue
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def run_routing_benchmark(repeat: int) -> List[dict]:
+    """Routing accuracy on ROUTING_CASES, and per-query dispatch overhead with stubbed tools."""
+    from agent import MarketAnalystAgent
+    from config import config
+    from router import QueryRouter, keyword_route
+
+    queries = [query for query, _ in ROUTING_CASES]
+
+    def accuracy(route) -> float:
+        return round(sum(route(query) == label for query, label in ROUTING_CASES) / len(ROUTING_CASES), 3)
+
+    results = [
+        {"router": "legacy-keyword", "accuracy": accuracy(legacy_keyword_route)},
+        {"router": "keyword", "accuracy": accuracy(keyword_route)},
+    ]
+
+    try:
+        from vector_store import VectorStoreManager
+        router = QueryRouter(VectorStoreManager())
+        start = time.perf_counter()
+        router.route_many(queries)  # model load + exemplar embedding
+        warmup_s = time.perf_counter() - start
+        router = QueryRouter(router.vector_store_manager)
+        cold = []
+        for query in queries:
+            start = time.perf_counter()
+            router.route(query)
+            cold.append((time.perf_counter() - start) * 1e6)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for query in queries:
+                router.route(query)
+        cached_us = (time.perf_counter() - start) * 1e6 / (repeat * len(queries))
+        results.append({
+            "router": "embedding",
+            "accuracy": accuracy(router.route),
+            "warmup_s": round(warmup_s, 3),
+            "uncached_p50_us": round(percentile(cold, 50), 1),
+            "cached_us": round(cached_us, 2),
+        })
+    except Exception as e:
+        results.append({"router": "embedding", "error": f"{type(e).__name__}: {e}"})
+
+    # Dispatch overhead: tools answer instantly, so the difference is graph bookkeeping
+    agent = MarketAnalystAgent(StaticRetriever())
+    agent.agent_tools.qa_tool = lambda query: "ok"
+    agent.agent_tools.summarize_tool = lambda aspect: "ok"
+    agent.agent_tools.extract_data_tool = lambda: {}
+    for direct in (False, True):
+        config.AGENT_DIRECT_DISPATCH = direct
+        latencies = []
+        for _ in range(repeat):
+            for query in queries:
+                start = time.perf_counter()
+                agent.process_query(query)
+                latencies.append((time.perf_counter() - start) * 1e6)
+        results.append({
+            "dispatch": "direct" if direct else "langgraph",
+            "p50_us": round(percentile(latencies, 50), 1),
+            "p95_us": round(percentile(latencies, 95), 1),
+        })
+    return results
+
+
+def run_retrieval_benchmark(document: str, scale: int, k: int, repeat: int, cases_path: str = None) -> List[dict]:
+    """Latency and recall@k of vector, BM25 and hybrid retrieval on a labeled question set."""
+    from document_processor import DocumentProcessor
+    from lexical_index import BM25Index
+    from vector_store import VectorStoreManager
+
+    cases = RETRIEVAL_CASES
+    if cases_path:
+        with open(cases_path, "r", encoding="utf-8") as f:
+            cases = [tuple(case) for case in json.load(f)]
+
+    processor = DocumentProcessor()
+    doc = Document(page_content=synthetic_report(document, scale), metadata={"source": document})
+    chunks = processor.text_splitter.split_documents([doc])
+
+    persist_directory = tempfile.mkdtemp(prefix="bench_retrieval_")
+    try:
+        manager = VectorStoreManager(persist_directory=persist_directory)
+        manager.create_vector_store(chunks)
+        stored = manager.vector_store.get(include=["documents", "metadatas"])
+        start = time.perf_counter()
+        index = BM25Index.build(stored["ids"], stored["documents"], stored["metadatas"],
+                                persist_directory=persist_directory, collection_name=manager.collection_name,
+                                version=manager.index_version)
+        build_s = time.perf_counter() - start
+        index_mb = sum(os.path.getsize(os.path.join(index.directory, name))
+                       for name in os.listdir(index.directory)) / 2 ** 20
+        start = time.perf_counter()
+        manager.lexical_index = BM25Index(persist_directory, manager.collection_name)
+        open_ms = (time.perf_counter() - start) * 1000
+
+        searches = {
+            "vector": lambda query: manager.similarity_search(query, k=k),
+            "bm25": lambda query: [d for d, _ in manager.lexical_search_with_scores(query, k)],
+            "hybrid": lambda query: manager.similarity_search(query, k=k, hybrid=True),
+        }
+        for search in searches.values():
+            search(cases[0][0])  # model load and first-touch page faults
+
+        results = []
+        for mode, search in searches.items():
+            hits, latencies = 0, []
+            for query, phrase in cases:
+                docs = search(query)
+                hits += any(phrase.lower() in d.page_content.lower() for d in docs)
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    search(query)
+                    latencies.append((time.perf_counter() - start) * 1000)
+            results.append({
+                "mode": mode,
+                "chunks": len(chunks),
+                f"recall@{k}": round(hits / len(cases), 3),
+                "p50_ms": round(percentile(latencies, 50), 3),
+                "p95_ms": round(percentile(latencies, 95), 3),
+            })
+        results.append({
+            "lexical_index": index.directory,
+            "terms": index.meta.get("terms"),
+            "build_s": round(build_s, 3),
+            "open_ms": round(open_ms, 2),
+            "size_mb": round(index_mb, 2),
+        })
+        return results
+    finally:
+        shutil.rmtree(persist_directory, ignore_errors=True)
+
+
+# ----- end-to-end suite --------------------------------------------------------
+
+def _reshape(text: str, shape: str) -> str:
+    """The report as PDF extraction tends to deliver it ("wrapped") or as one flat line ("flat")."""
+    if shape == "wrapped":
+        # Hard-wrapped lines and no blank lines between paragraphs
+        import textwrap
+        return "\n".join(textwrap.fill(paragraph, 80) for paragraph in text.split("\n\n"))
+    if shape == "flat":
+        return " ".join(text.split())
+    return text
+
+
+def _chunk_stats(chunks: List[str], count_tokens=None) -> dict:
+    lengths = [len(chunk) for chunk in chunks] or [0]
+    stats = {
+        "chunks": len(chunks),
+        "mean_chars": round(sum(lengths) / len(lengths), 1),
+        "max_chars": max(lengths),
+        # Chunks ending on a sentence end rather than mid-sentence
+        "sentence_end_ratio": round(
+            sum(chunk.rstrip().endswith((".", "!", "?", ":", '"', ")")) for chunk in chunks) / max(1, len(chunks)), 3
+        ),
+    }
+    if count_tokens is not None:
+        stats["max_tokens"] = max((count_tokens(chunk) for chunk in chunks), default=0)
+    return stats
+
+
+def run_splitter_benchmark(document: str, scale: int, documents: int, repeat: int, workers: int) -> List[dict]:
+    """Split speed and chunk quality of the recursive and span splitters, by characters and by tokens."""
+    from config import config
+    from document_processor import DocumentProcessor
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    def best_of(split, text):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            chunks = split(text)
+            timings.append(time.perf_counter() - start)
+        return min(timings), chunks
+
+    splitters = [
+        ("recursive", DocumentProcessor(splitter="recursive").text_splitter.split_text, None),
+        ("span", DocumentProcessor(splitter="span").text_splitter.split_text, None),
+    ]
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(config.EMBEDDING_MODEL_NAME, use_fast=True)
+
+        def count_tokens(text):
+            return len(tokenizer.encode(text, add_special_tokens=False, verbose=False))
+
+        recursive_tokens = RecursiveCharacterTextSplitter(
+            chunk_size=config.CHUNK_TOKENS, chunk_overlap=config.CHUNK_OVERLAP_TOKENS, length_function=count_tokens
+        )
+        splitters += [
+            ("recursive-tokens", recursive_tokens.split_text, count_tokens),
+            ("span-tokens", DocumentProcessor(length_unit="tokens").text_splitter.split_text, count_tokens),
+        ]
+    except Exception as e:
+        splitters.append(("span-tokens", None, f"{type(e).__name__}: {e}"))
+
+    results = []
+    report = synthetic_report(document, scale)
+    for shape in ("report", "wrapped", "flat"):
+        text = _reshape(report, shape)
+        megabytes = len(text.encode("utf-8")) / 1e6
+        for name, split, count_tokens in splitters:
+            if split is None:
+                results.append({"splitter": name, "shape": shape, "error": count_tokens})
+                continue
+            seconds, chunks = best_of(split, text)
+            results.append(dict(
+                {"splitter": name, "shape": shape, "mb": round(megabytes, 2), "split_s": round(seconds, 4),
+                 "mb_per_s": round(megabytes / seconds, 1) if seconds else 0.0},
+                **_chunk_stats(chunks, count_tokens)
+            ))
+
+    # Many documents at once: one process versus a process pool
+    splitter = DocumentProcessor(splitter="span").text_splitter
+    batch = [Document(page_content=synthetic_report(document, max(1, scale // documents)),
+                      metadata={"source": f"doc-{i}"}) for i in range(documents)]
+    megabytes = sum(len(doc.page_content.encode("utf-8")) for doc in batch) / 1e6
+    for label, pool_size in (("span-serial", 1), ("span-parallel", workers)):
+        seconds, chunks = best_of(lambda docs: splitter.split_documents(docs, workers=pool_size), batch)
+        results.append({"splitter": label, "shape": f"{documents} documents", "workers": pool_size,
+                        "mb": round(megabytes, 2), "split_s": round(seconds, 4),
+                        "mb_per_s": round(megabytes / seconds, 1) if seconds else 0.0, "chunks": len(chunks)})
+    return results
+
+
+SUITE_QUERIES = BENCHMARK_QUERIES + [
+    "Summarize the competitive landscape",
+    "Extract the structured data about market share as JSON",
+]
+
+
+def _free_port() -> int:
+    import socket
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LLMStubServer:
+    """Runs llm_stub.py in a subprocess and points the Groq client at it (GROQ_BASE_URL)."""
+
+    def __init__(self, latency: float, jitter: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.process = None
+
+    def __enter__(self) -> "LLMStubServer":
+        import httpx
+        stub = os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_stub.py")
+        self.process = subprocess.Popen(
+            [sys.executable, stub, "--port", str(self.port), "--latency", str(self.latency),
+             "--jitter", str(self.jitter), "--tokens-per-second", "0"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(f"{self.url}/stats", timeout=1).raise_for_status()
+                break
+            except httpx.HTTPError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("LLM stub failed to start")
+                time.sleep(0.1)
+        os.environ["GROQ_BASE_URL"] = self.url
+        return self
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait(timeout=10)
+
+
+def _summarize(values: List[float]) -> dict:
+    return {
+        "n": len(values),
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+    }
+
+
+def _parse_server_timing(header: str) -> Dict[str, float]:
+    """Stage durations in ms from a Server-Timing header ("search;dur=1.20, llm;dur=300.1")."""
+    stages = {}
+    for part in header.split(","):
+        name, _, duration = part.strip().partition(";dur=")
+        if duration:
+            stages[name] = float(duration)
+    return stages
+
+
+def _time_ingest(path: str, persist_directory: str) -> tuple:
+    """Chunk, embed and index one file, timing each step."""
+    import metrics
+    from document_processor import DocumentProcessor
+    from vector_store import VectorStoreManager
+
+    processor = DocumentProcessor()
+    start = time.perf_counter()
+    chunks = list(processor.iter_chunks(path))
+    chunk_s = time.perf_counter() - start
+
+    manager = VectorStoreManager(persist_directory=persist_directory)
+    timings, token = metrics.start_request()
+    start = time.perf_counter()
+    try:
+        manager.sync_vector_store(iter(chunks), processor.settings)
+    finally:
+        metrics.end_request(token)
+    sync_s = time.perf_counter() - start
+    embed_s = timings.stages.get("embed", 0.0)
+    return manager, {
+        "chunks": len(chunks),
+        "chunk_s": round(chunk_s, 3),
+        "embed_s": round(embed_s, 3),
+        "index_s": round(sync_s - embed_s, 3),  # vector store writes + lexical index
+        "total_s": round(chunk_s + sync_s, 3),
+        "chunks_per_s": round(len(chunks) / (chunk_s + sync_s), 1) if chunks else 0.0,
+    }
+
+
+def _time_queries(agent, repeat: int) -> dict:
+    """Per-stage latency of the query path (route, embed, search, context, prompt, llm, parse)."""
+    import metrics
+    samples: Dict[str, List[float]] = defaultdict(list)
+    agent.process_query(SUITE_QUERIES[0])  # model load, first page faults
+    for _ in range(repeat):
+        for query in SUITE_QUERIES:
+            timings, token = metrics.start_request()
+            start = time.perf_counter()
+            try:
+                agent.process_query(query)
+            finally:
+                metrics.end_request(token)
+            samples["total"].append((time.perf_counter() - start) * 1000)
+            for stage, seconds in timings.stages.items():
+                samples[stage].append(seconds * 1000)
+    return {stage: _summarize(values) for stage, values in sorted(samples.items())}
+
+
+async def _time_throughput(agent, concurrencies: List[int], requests: int, endpoint: str) -> List[dict]:
+    """Requests/s and latency against api_main.app at each client concurrency."""
+    import httpx
+    import api_main
+
+    api_main.agent = agent
+    transport = httpx.ASGITransport(app=api_main.app)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        for concurrency in concurrencies:
+            limiter = asyncio.Semaphore(concurrency)
+            latencies: List[float] = []
+            stages: Dict[str, List[float]] = defaultdict(list)
+            failures = 0
+
+            async def one(i: int):
+                nonlocal failures
+                # Distinct queries, so coalescing and caches do not hide the work
+                query = f"{SUITE_QUERIES[i % len(SUITE_QUERIES)]} (request {i})"
+                async with limiter:
+                    start = time.perf_counter()
+                    response = await client.post(endpoint, json={"query": query})
+                    latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    failures += 1
+                for stage, ms in _parse_server_timing(response.headers.get("server-timing", "")).items():
+                    if stage != "total":
+                        stages[stage].append(ms)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(requests)))
+            wall_s = time.perf_counter() - start
+            results.append({
+                "concurrency": concurrency,
+                "requests": requests,
+                "failures": failures,
+                "throughput_rps": round(requests / wall_s, 2),
+                "latency": _summarize(latencies),
+                "stages": {stage: _summarize(values) for stage, values in sorted(stages.items())},
+            })
+    return results
+
+
+def run_suite_scale(document: str, scale: int, repeat: int, concurrencies: List[int],
+                    requests: int, endpoint: str) -> dict:
+    """Ingest, query-stage and throughput figures for one report size; meant to run in its own process."""
+    from config import config
+    from agent import MarketAnalystAgent
+
+    # Measure the pipeline itself: no response cache, artifacts or client-side quota
+    config.RESPONSE_CACHE_ENABLED = False
+    config.PRECOMPUTE_ARTIFACTS = False
+    config.LLM_REQUESTS_PER_MINUTE = config.LLM_TOKENS_PER_MINUTE = 0
+
+    work_dir = tempfile.mkdtemp(prefix="bench_suite_")
+    # A persistent embedding cache from earlier runs would turn "embed" into cache lookups
+    config.EMBEDDING_CACHE_PATH = os.path.join(work_dir, "embedding_cache.sqlite3")
+    try:
+        path = os.path.join(work_dir, f"report_x{scale}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(synthetic_report(document, scale))
+        manager, ingest = _time_ingest(path, os.path.join(work_dir, "db"))
+        rss_after_ingest = _peak_rss_mb()
+
+        agent = MarketAnalystAgent(manager.get_retriever(k=3), manager)
+        query_stages = _time_queries(agent, repeat)
+        throughput = asyncio.run(_time_throughput(agent, concurrencies, requests, endpoint))
+        return {
+            "scale": scale,
+            "document_mb": round(os.path.getsize(path) / 2 ** 20, 2),
+            "ingest": ingest,
+            "query_stages": query_stages,
+            "throughput": throughput,
+            "peak_rss_mb": {"after_ingest": round(rss_after_ingest, 1), "final": round(_peak_rss_mb(), 1)},
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(document: str, scales: List[int], latency: float, jitter: float, repeat: int,
+              concurrencies: List[int], requests: int, endpoint: str) -> dict:
+    """Run every scale in a fresh process (own peak RSS) against one shared LLM stub."""
+    from config import config
+
+    if not os.path.exists(document):
+        raise FileNotFoundError(f"Benchmark document not found: {document}")
+    runs = []
+    with LLMStubServer(latency, jitter):
+        for scale in scales:
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "suite-run", "--document", document,
+                 "--scale", str(scale), "--repeat", str(repeat),
+                 "--concurrency", ",".join(map(str, concurrencies)),
+                 "--requests", str(requests), "--endpoint", endpoint],
+                check=True, capture_output=True, text=True
+            )
+            runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+            print(f"scale x{scale}: done", file=sys.stderr)
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "document": document,
+            "llm_latency_s": latency,
+            "llm_jitter_s": jitter,
+            "embedding_model": config.EMBEDDING_MODEL_NAME,
+            "embedding_backend": config.EMBEDDING_BACKEND,
+            "vector_backend": config.VECTOR_BACKEND,
+        },
+        "runs": runs,
+    }
+
+
+def _flatten(results: dict) -> Dict[str, float]:
+    """Comparable figures keyed by path, e.g. "x10.query.search.p95_ms"."""
+    flat = {}
+    for run in results["runs"]:
+        prefix = f"x{run['scale']}"
+        for key, value in run["ingest"].items():
+            flat[f"{prefix}.ingest.{key}"] = value
+        for stage, summary in run["query_stages"].items():
+            flat[f"{prefix}.query.{stage}.p50_ms"] = summary["p50_ms"]
+            flat[f"{prefix}.query.{stage}.p95_ms"] = summary["p95_ms"]
+        for row in run["throughput"]:
+            flat[f"{prefix}.c{row['concurrency']}.throughput_rps"] = row["throughput_rps"]
+            flat[f"{prefix}.c{row['concurrency']}.latency.p95_ms"] = row["latency"]["p95_ms"]
+        flat[f"{prefix}.peak_rss_mb"] = run["peak_rss_mb"]["final"]
+    return flat
+
+
+# Absolute changes below these are timer noise, whatever the relative change
+_NOISE_FLOOR = {"_ms": 1.0, "_s": 0.05, "_mb": 5.0}
+
+
+def compare_results(baseline: dict, current: dict, threshold: float) -> List[dict]:
+    """Relative change per figure; `regression` when worse than the threshold (e.g. 0.1 = 10%)."""
+    old, new = _flatten(baseline), _flatten(current)
+    rows = []
+    for key in sorted(old.keys() & new.keys()):
+        if key.endswith(("chunks",)) or not old[key]:
+            continue
+        change = (new[key] - old[key]) / old[key]
+        higher_is_better = key.endswith(("throughput_rps", "chunks_per_s"))
+        worse = -change if higher_is_better else change
+        floor = next((value for suffix, value in _NOISE_FLOOR.items() if key.endswith(suffix)), 0.0)
+        rows.append({
+            "metric": key,
+            "baseline": old[key],
+            "current": new[key],
+            "change": round(change, 3),
+            "regression": worse > threshold and abs(new[key] - old[key]) >= floor,
+        })
+    return rows
+
+
+async def run_load_test(requests: int, latency: float, endpoint: str) -> dict:
+    """Fire one request, then `requests` concurrent ones, against the FastAPI app in-process."""
+    import httpx
+    import api_main
+    from agent import MarketAnalystAgent
+    from config import config
+    from llm_client import LLMClient
+
+    # Measure the request path, not the client-side quota; every request repeats one
+    # query, so the response cache and coalescing would answer all but the first
+    config.LLM_REQUESTS_PER_MINUTE = config.LLM_TOKENS_PER_MINUTE = 0
+    config.RESPONSE_CACHE_ENABLED = False
+    config.REQUEST_COALESCING = False
+    api_main.agent = MarketAnalystAgent(StaticRetriever())
+    api_main.agent.agent_tools.llm = LLMClient(async_client=StubAsyncGroq(latency))
+
+    transport = httpx.ASGITransport(app=api_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        payload = {"query": "What is the market size?"}
+
+        start = time.perf_counter()
+        (await client.post(endpoint, json=payload)).raise_for_status()
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(client.post(endpoint, json=payload) for _ in range(requests)))
+        concurrent = time.perf_counter() - start
+
+    failures = sum(1 for r in responses if r.status_code != 200)
+    return {
+        "endpoint": endpoint,
+        "requests": requests,
+        "llm_latency_s": latency,
+        "single_request_s": round(single, 3),
+        "concurrent_wall_s": round(concurrent, 3),
+        "serial_estimate_s": round(single * requests, 3),
+        "failures": failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    load = subparsers.add_parser("load", help="concurrent requests against the API with a stubbed LLM")
+    load.add_argument("--requests", type=int, default=20)
+    load.add_argument("--latency", type=float, default=0.5, help="simulated LLM latency in seconds")
+    load.add_argument("--endpoint", default="/api/qa")
+
+    backends = subparsers.add_parser("backends", help="compare Chroma and the FAISS/NumPy backend")
+    backends.add_argument("--document", default=None, help="defaults to config.DOCUMENT_PATH")
+    backends.add_argument("--scale", type=int, default=1, help="repeat the document N times")
+    backends.add_argument("--repeat", type=int, default=50, help="passes over the query set")
+
+    backend_run = subparsers.add_parser("backend-run", help=argparse.SUPPRESS)
+    backend_run.add_argument("--backend", required=True)
+    backend_run.add_argument("--document", required=True)
+    backend_run.add_argument("--scale", type=int, default=1)
+    backend_run.add_argument("--repeat", type=int, default=50)
+    backend_run.add_argument("--persist-directory", required=True)
+
+    embeddings = subparsers.add_parser("embeddings", help="compare embedding backends: boot time and throughput")
+    embeddings.add_argument("--backends", default="langchain,torch,int8,onnx",
+                            help="comma-separated; 'langchain' is the eager HuggingFaceEmbeddings baseline")
+    embeddings.add_argument("--document", default=None, help="defaults to config.DOCUMENT_PATH")
+    embeddings.add_argument("--texts", type=int, default=512, help="chunks to embed")
+    embeddings.add_argument("--batch-size", type=int, default=32)
+    embeddings.add_argument("--threads", type=int, default=0, help="0 = library default")
+
+    embedding_run = subparsers.add_parser("embedding-run", help=argparse.SUPPRESS)
+    embedding_run.add_argument("--backend", required=True)
+    embedding_run.add_argument("--document", required=True)
+    embedding_run.add_argument("--texts", type=int, default=512)
+    embedding_run.add_argument("--batch-size", type=int, default=32)
+    embedding_run.add_argument("--threads", type=int, default=0)
+
+    routing = subparsers.add_parser("routing", help="routing accuracy and per-query dispatch overhead")
+    routing.add_argument("--repeat", type=int, default=200, help="passes over the labeled queries")
+
+    retrieval = subparsers.add_parser("retrieval", help="latency and recall@k of vector, BM25 and hybrid search")
+    retrieval.add_argument("--document", default=None, help="defaults to config.DOCUMENT_PATH")
+    retrieval.add_argument("--scale", type=int, default=1, help="repeat the document N times")
+    retrieval.add_argument("--k", type=int, default=3)
+    retrieval.add_argument("--repeat", type=int, default=20, help="timed passes per question")
+    retrieval.add_argument("--cases", default=None, help="JSON list of [question, expected phrase] pairs")
+
+    splitters = subparsers.add_parser("splitters", help="split speed and chunk quality: recursive vs span splitter")
+    splitters.add_argument("--document", default=None, help="defaults to config.DOCUMENT_PATH")
+    splitters.add_argument("--scale", type=int, default=50, help="repeat the document N times")
+    splitters.add_argument("--documents", type=int, default=16, help="documents in the multi-document batch")
+    splitters.add_argument("--repeat", type=int, default=3, help="timed passes; the fastest counts")
+    splitters.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    suite = subparsers.add_parser("suite", help="end-to-end ingest/query/throughput suite against a local LLM stub")
+    suite.add_argument("--document", default=None, help="defaults to config.DOCUMENT_PATH")
+    suite.add_argument("--scales", default="1,10,100", help="report sizes as multiples, e.g. 1,10,100,1000")
+    suite.add_argument("--latency", type=float, default=0.3, help="stub LLM latency in seconds")
+    suite.add_argument("--jitter", type=float, default=0.0, help="extra uniform random stub latency")
+    suite.add_argument("--repeat", type=int, default=3, help="passes over the query set for stage timings")
+    suite.add_argument("--concurrency", default="1,8,32", help="client concurrencies for the throughput test")
+    suite.add_argument("--requests", type=int, default=64, help="requests per concurrency level")
+    suite.add_argument("--endpoint", default="/api/query")
+    suite.add_argument("--output", default=None, help="defaults to benchmark_results/suite-<timestamp>.json")
+    suite.add_argument("--baseline", default=None, help="results JSON to compare against")
+    suite.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+
+    suite_run = subparsers.add_parser("suite-run", help=argparse.SUPPRESS)
+    suite_run.add_argument("--document", required=True)
+    suite_run.add_argument("--scale", type=int, default=1)
+    suite_run.add_argument("--repeat", type=int, default=3)
+    suite_run.add_argument("--concurrency", default="1,8,32")
+    suite_run.add_argument("--requests", type=int, default=64)
+    suite_run.add_argument("--endpoint", default="/api/query")
+
+    compare = subparsers.add_parser("compare", help="compare two suite result files")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=0.1)
+
+    args = parser.parse_args()
+
+    if args.command == "load":
+        result = asyncio.run(run_load_test(args.requests, args.latency, args.endpoint))
+        for key, value in result.items():
+            print(f"{key:>20}: {value}")
+    elif args.command == "backends":
+        from config import config
+        for result in compare_backends(args.document or config.DOCUMENT_PATH, args.scale, args.repeat):
+            print(json.dumps(result))
+    elif args.command == "backend-run":
+        result = run_backend(args.backend, args.document, args.scale, args.persist_directory, args.repeat)
+        print(json.dumps(result))
+    elif args.command == "embeddings":
+        from config import config
+        backends = [name.strip() for name in args.backends.split(",") if name.strip()]
+        for result in compare_embedding_backends(backends, args.document or config.DOCUMENT_PATH,
+                                                 args.texts, args.batch_size, args.threads):
+            print(json.dumps(result))
+    elif args.command == "routing":
+        for result in run_routing_benchmark(args.repeat):
+            print(json.dumps(result))
+    elif args.command == "retrieval":
+        from config import config
+        for result in run_retrieval_benchmark(args.document or config.DOCUMENT_PATH, args.scale,
+                                              args.k, args.repeat, args.cases):
+            print(json.dumps(result))
+    elif args.command == "splitters":
+        from config import config
+        for result in run_splitter_benchmark(args.document or config.DOCUMENT_PATH, args.scale,
+                                             args.documents, args.repeat, args.workers):
+            print(json.dumps(result))
+    elif args.command == "suite":
+        from config import config
+        results = run_suite(
+            args.document or config.DOCUMENT_PATH,
+            [int(scale) for scale in args.scales.split(",")],
+            args.latency, args.jitter, args.repeat,
+            [int(c) for c in args.concurrency.split(",")],
+            args.requests, args.endpoint
+        )
+        output = args.output or os.path.join("benchmark_results", f"suite-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        for run in results["runs"]:
+            print(json.dumps({
+                "scale": run["scale"],
+                "ingest_s": run["ingest"]["total_s"],
+                "query_p95_ms": run["query_stages"]["total"]["p95_ms"],
+                "throughput_rps": {row["concurrency"]: row["throughput_rps"] for row in run["throughput"]},
+                "peak_rss_mb": run["peak_rss_mb"]["final"],
+            }))
+        print(f"Results written to {output}")
+        if args.baseline:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                rows = compare_results(json.load(f), results, args.threshold)
+            regressions = [row for row in rows if row["regression"]]
+            for row in regressions:
+                print(json.dumps(row))
+            print(f"{len(regressions)} regressions of {len(rows)} figures")
+            sys.exit(1 if regressions else 0)
+    elif args.command == "suite-run":
+        result = run_suite_scale(args.document, args.scale, args.repeat,
+                                 [int(c) for c in args.concurrency.split(",")], args.requests, args.endpoint)
+        print(json.dumps(result))
+    elif args.command == "compare":
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.current, "r", encoding="utf-8") as f:
+            current = json.load(f)
+        rows = compare_results(baseline, current, args.threshold)
+        for row in rows:
+            print(json.dumps(row))
+        regressions = sum(row["regression"] for row in rows)
+        print(f"{regressions} regressions of {len(rows)} figures")
+        sys.exit(1 if regressions else 0)
+    elif args.command == "embedding-run":
+        result = run_embedding_backend(args.backend, args.document, args.texts, args.batch_size, args.threads)
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
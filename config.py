@@ -10,24 +10,160 @@ class Config:
     # Groq Configuration
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     GROQ_MODEL = os.getenv("GROQ_MODEL", "mixtral-8x7b-32768")
+    # Shared LLM client: connection pool, per-call timeout and retries on 429/5xx
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+    LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+    LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+    # Client-side quota (0 disables); burst is how many requests may go out back to back
+    LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+    LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+    LLM_RATE_BURST = float(os.getenv("LLM_RATE_BURST", "5"))
+    # Send a second identical request if the first is slower than this (seconds; 0 disables)
+    LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
     
     # Embedding Configuration (HuggingFace - Free!)
     EMBEDDING_MODEL_TYPE = os.getenv("EMBEDDING_MODEL_TYPE", "huggingface")
     EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+    EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+    # Embedding runtime: "torch", "int8" (quantized torch) or "onnx" (ONNX Runtime),
+    # texts per forward pass, CPU threads (0 = library default), and max tokens per text
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+    EMBEDDING_ENCODE_BATCH_SIZE = int(os.getenv("EMBEDDING_ENCODE_BATCH_SIZE", "32"))
+    EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+    EMBEDDING_MAX_TOKENS = int(os.getenv("EMBEDDING_MAX_TOKENS", "256"))
+    # Load the embedding model in the background at API startup
+    EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "true").lower() == "true"
     
     # Vector DB Configuration
     VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", "./chroma_db")
     COLLECTION_NAME = os.getenv("COLLECTION_NAME", "innovate_inc_docs")
+    # Reuse stored chunks on startup and only embed new/changed ones
+    # "chroma" (SQLite-backed) or "faiss" (in-process memory-mapped index)
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+    VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float32")  # faiss backend: float32, float16 or int8
+    FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")  # flat or ivf
+    FAISS_NLIST = int(os.getenv("FAISS_NLIST", "64"))
+    FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "8"))
+    # Per-document collections: how many stay open, and when idle ones are released
+    MAX_OPEN_DOCUMENTS = int(os.getenv("MAX_OPEN_DOCUMENTS", "8"))
+    DOCUMENT_IDLE_SECONDS = float(os.getenv("DOCUMENT_IDLE_SECONDS", "1800"))
+    INCREMENTAL_INDEXING = os.getenv("INCREMENTAL_INDEXING", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH = os.getenv(
+        "EMBEDDING_CACHE_PATH", os.path.join(VECTOR_DB_PATH, "embedding_cache.sqlite3")
+    )
     
     # Chunking Configuration
     CHUNK_SIZE = 500
     CHUNK_OVERLAP = 100
+    # "span" (sentence-aware, one boundary scan per text) or "recursive" (LangChain's
+    # RecursiveCharacterTextSplitter); span chunks can be sized in "chars" or in
+    # "tokens" of the embedding model, which truncates input beyond EMBEDDING_MAX_TOKENS
+    TEXT_SPLITTER = os.getenv("TEXT_SPLITTER", "span").lower()
+    CHUNK_UNIT = os.getenv("CHUNK_UNIT", "chars").lower()
+    CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", str(EMBEDDING_MAX_TOKENS - 2)))  # [CLS] and [SEP]
+    CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "48"))
+    
+    # Streaming ingestion: worker processes for PDF page extraction, pages per
+    # task, text segment size for large .txt files, chunks per embedding batch
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+    PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+    TEXT_SEGMENT_CHARS = int(os.getenv("TEXT_SEGMENT_CHARS", "1000000"))
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+    # Bulk ingestion (ingest.py): chunks embedded and written per batch
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "2048"))
+    # Uploads (/api/documents, Streamlit) are indexed by background jobs: worker
+    # threads, finished jobs kept for polling, where uploads wait, and their size limit
+    INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "1"))
+    MAX_INGEST_JOBS = int(os.getenv("MAX_INGEST_JOBS", "1000"))
+    UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(VECTOR_DB_PATH, "uploads"))
+    MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "100"))
     
     # Document Path
     DOCUMENT_PATH = "innovate_inc_report.txt"
     
+    # LLM response cache (exact prompt match, plus optional semantic match for Q&A)
+    RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+    # Cosine similarity needed to reuse an answer to a different question; 0 disables
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0"))
+    
+    # Retrieval: MMR re-ranks for diversity; threshold drops weak matches (0 disables)
+    RETRIEVAL_USE_MMR = os.getenv("RETRIEVAL_USE_MMR", "false").lower() == "true"
+    RETRIEVAL_SCORE_THRESHOLD = float(os.getenv("RETRIEVAL_SCORE_THRESHOLD", "0"))
+    # BM25 index built next to each collection, and hybrid retrieval fusing it with
+    # vector search by reciprocal rank (exact names and figures the embeddings miss)
+    LEXICAL_INDEX_ENABLED = os.getenv("LEXICAL_INDEX_ENABLED", "true").lower() == "true"
+    RETRIEVAL_HYBRID = os.getenv("RETRIEVAL_HYBRID", "true").lower() == "true"
+    BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+    BM25_B = float(os.getenv("BM25_B", "0.75"))
+    RRF_K = int(os.getenv("RRF_K", "60"))
+    
+    # Routing: "embedding" (nearest labeled exemplars, reusing the embedding model)
+    # or "keyword"; summarize/extract need this similarity, else the query is Q&A
+    ROUTER_MODE = os.getenv("ROUTER_MODE", "embedding").lower()
+    ROUTER_MIN_SIMILARITY = float(os.getenv("ROUTER_MIN_SIMILARITY", "0.4"))
+    ROUTER_CACHE_SIZE = int(os.getenv("ROUTER_CACHE_SIZE", "1024"))
+    # Call the routed tool directly instead of stepping through the LangGraph workflow
+    AGENT_DIRECT_DISPATCH = os.getenv("AGENT_DIRECT_DISPATCH", "true").lower() == "true"
+    
+    # Context compression: merge overlapping chunks, drop repeated sentences and keep
+    # the most query-relevant ones within a per-tool budget (estimated tokens)
+    CONTEXT_COMPRESSION = os.getenv("CONTEXT_COMPRESSION", "true").lower() == "true"
+    CONTEXT_TOKENS_QA = int(os.getenv("CONTEXT_TOKENS_QA", "400"))
+    CONTEXT_TOKENS_SUMMARY = int(os.getenv("CONTEXT_TOKENS_SUMMARY", "900"))
+    CONTEXT_TOKENS_EXTRACT = int(os.getenv("CONTEXT_TOKENS_EXTRACT", "1600"))
+    CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.9"))
+    
+    # Summaries: "map_reduce" summarizes every section of the document and combines the
+    # section summaries, "retrieval" summarizes the top retrieved chunks only. Sections of
+    # SUMMARY_GROUP_TOKENS are summarized in parallel into at most SUMMARY_NODE_TOKENS each,
+    # and node summaries are cached so an updated document only redoes changed sections
+    SUMMARY_STRATEGY = os.getenv("SUMMARY_STRATEGY", "map_reduce").lower()
+    SUMMARY_GROUP_TOKENS = int(os.getenv("SUMMARY_GROUP_TOKENS", "3000"))
+    SUMMARY_NODE_TOKENS = int(os.getenv("SUMMARY_NODE_TOKENS", "300"))
+    SUMMARY_LLM_CONCURRENCY = int(os.getenv("SUMMARY_LLM_CONCURRENCY", "8"))
+    SUMMARY_CACHE_PATH = os.getenv(
+        "SUMMARY_CACHE_PATH", os.path.join(VECTOR_DB_PATH, "summary_cache.sqlite3")
+    )
+    
+    # Chat sessions: recent turns kept verbatim within a token window, older ones folded
+    # into a capped summary (by the LLM, or extractively); follow-ups rewritten into
+    # standalone queries; idle sessions dropped
+    SESSION_WINDOW_TOKENS = int(os.getenv("SESSION_WINDOW_TOKENS", "1200"))
+    SESSION_SUMMARY_TOKENS = int(os.getenv("SESSION_SUMMARY_TOKENS", "300"))
+    SESSION_LLM_SUMMARY = os.getenv("SESSION_LLM_SUMMARY", "true").lower() == "true"
+    QUERY_REWRITE = os.getenv("QUERY_REWRITE", "true").lower() == "true"
+    SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "1800"))
+    MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "10000"))
+    
+    # Concurrent identical tool calls (same tool, normalized argument, document version)
+    # share one retrieval + completion instead of each calling Groq
+    REQUEST_COALESCING = os.getenv("REQUEST_COALESCING", "true").lower() == "true"
+    
+    # Compute extraction + all summary aspects once per document version at ingest
+    PRECOMPUTE_ARTIFACTS = os.getenv("PRECOMPUTE_ARTIFACTS", "false").lower() == "true"
+    
+    # Logging: level, "text" or "json" lines, and the share of per-request messages kept
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+    LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+    
+    # Stage timings, token counts and cache ratios at /metrics, plus Server-Timing headers
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    
     # API Configuration
     API_HOST = "0.0.0.0"
     API_PORT = 8000
+    # Requests processed concurrently by the API; extra requests wait their turn
+    MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "32"))
+    # Threads used to run blocking embedding/vector search from async handlers
+    RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "4"))
+    # /api/batch: maximum questions per call and parallel LLM calls per batch
+    MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "64"))
+    BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
 
 config = Config()
@@ -0,0 +1,150 @@
+"""Prompt context assembly: merge overlapping chunks, drop repeats, fit a token budget."""
+import re
+from typing import List, Optional, Tuple
+import numpy as np
+from langchain.schema import Document
+from config import config
+from embedding_cache import CachedEmbeddings
+from logging_setup import get_logger, SAMPLED
+from metrics import record_context_tokens, timed
+
+logger = get_logger(__name__)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n{2,}|\n(?=[-*•]|\d+\.)")
+_WORD = re.compile(r"\w+")
+# Shortest suffix/prefix match treated as chunk overlap rather than coincidence
+_MIN_OVERLAP = 20
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), the same estimate the LLM client budgets with."""
+    return len(text) // 4 + 1 if text else 0
+
+
+def _overlap(left: str, right: str, max_overlap: int) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`."""
+    for length in range(min(len(left), len(right), max_overlap), _MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:length]):
+            return length
+    return 0
+
+
+def merge_chunks(documents: List[Document], max_overlap: Optional[int] = None) -> List[str]:
+    """Join chunks of the same source whose edges overlap (the splitter's CHUNK_OVERLAP).
+
+    Retrieval returns chunks by relevance, so neighbours are found by text
+    rather than position; blocks keep the order their first chunk was retrieved.
+    """
+    max_overlap = max_overlap or config.CHUNK_OVERLAP * 2
+    blocks: List[Tuple[object, str]] = []
+    for doc in documents:
+        text = doc.page_content.strip()
+        source = doc.metadata.get("source")
+        if not text:
+            continue
+        for i, (block_source, block) in enumerate(blocks):
+            if block_source != source:
+                continue
+            if text in block:
+                break
+            if block in text:
+                blocks[i] = (source, text)
+                break
+            after = _overlap(block, text, max_overlap)
+            if after:
+                blocks[i] = (source, block + text[after:])
+                break
+            before = _overlap(text, block, max_overlap)
+            if before:
+                blocks[i] = (source, text + block[before:])
+                break
+        else:
+            blocks.append((source, text))
+    return [block for _, block in blocks]
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text) if sentence and sentence.strip()]
+
+
+def _similar(a: frozenset, b: frozenset, threshold: float) -> bool:
+    if not a or not b:
+        return a == b
+    return len(a & b) / len(a | b) >= threshold
+
+
+class ContextBuilder:
+    """Builds the context block for a prompt within a token budget.
+
+    1. Merge retrieved chunks whose edges overlap, so the overlap is sent once.
+    2. Split into sentences and drop exact or near-identical repeats (word-set
+       Jaccard >= CONTEXT_DEDUP_THRESHOLD).
+    3. If still over budget, keep the sentences most similar to the query
+       (using the store's embeddings model, bypassing its cache: sentences are
+       one-off texts that would only evict chunk vectors and grow the cache
+       file), in their original order.
+    """
+
+    def __init__(self, embeddings=None, dedup_threshold: Optional[float] = None):
+        self.embeddings = embeddings
+        self.sentence_embeddings = embeddings.embeddings if isinstance(embeddings, CachedEmbeddings) else embeddings
+        self.dedup_threshold = config.CONTEXT_DEDUP_THRESHOLD if dedup_threshold is None else dedup_threshold
+
+    def _dedupe(self, blocks: List[str]) -> List[List[str]]:
+        """Sentences per block, skipping any that repeat an earlier sentence in any block."""
+        seen: List[frozenset] = []
+        result = []
+        for block in blocks:
+            kept = []
+            for sentence in split_sentences(block):
+                words = frozenset(_WORD.findall(sentence.lower()))
+                if any(_similar(words, other, self.dedup_threshold) for other in seen):
+                    continue
+                seen.append(words)
+                kept.append(sentence)
+            if kept:
+                result.append(kept)
+        return result
+
+    def _select(self, query: str, sentences: List[str], budget: int) -> set:
+        """Indexes of the most query-similar sentences that fit the budget."""
+        if self.embeddings is not None:
+            vectors = np.asarray(self.sentence_embeddings.embed_documents(sentences), dtype=np.float32)
+            query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+            order = np.argsort(-(vectors @ query_vector / np.clip(norms, 1e-12, None)))
+        else:
+            order = range(len(sentences))
+
+        chosen, used = set(), 0
+        for index in order:
+            cost = estimate_tokens(sentences[index])
+            if used + cost <= budget:
+                chosen.add(int(index))
+                used += cost
+        return chosen
+
+    @timed("context")
+    def build(self, query: str, documents: List[Document], budget: int, tool: str = "qa") -> str:
+        raw = "\n\n".join(doc.page_content for doc in documents)
+        if not config.CONTEXT_COMPRESSION or not documents:
+            return raw
+
+        blocks = self._dedupe(merge_chunks(documents))
+        context = "\n\n".join(" ".join(sentences) for sentences in blocks)
+
+        if estimate_tokens(context) > budget:
+            flat = [sentence for sentences in blocks for sentence in sentences]
+            chosen = self._select(query, flat, budget)
+            kept_blocks, index = [], 0
+            for sentences in blocks:
+                kept = [s for offset, s in enumerate(sentences) if index + offset in chosen]
+                index += len(sentences)
+                if kept:
+                    kept_blocks.append(" ".join(kept))
+            context = "\n\n".join(kept_blocks)
+
+        raw_tokens, sent_tokens = estimate_tokens(raw), estimate_tokens(context)
+        record_context_tokens(tool, raw_tokens, sent_tokens)
+        logger.debug("Context for %s: %d -> %d tokens", tool, raw_tokens, sent_tokens, extra=SAMPLED)
+        return context
@@ -1,70 +1,196 @@
 """Document processing and chunking utilities."""
+import logging
 import os
-from typing import List
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 from config import config
+from logging_setup import get_logger
+from span_splitter import SpanSplitter
 
 try:
     import PyPDF2
 except ImportError:
     PyPDF2 = None
 
+logger = get_logger(__name__)
+
+
+class DocumentReadError(Exception):
+    """A document could not be read or extracted to the end."""
+
+
 class DocumentProcessor:
     """Handles document loading and chunking."""
     
-    def __init__(self, chunk_size=None, chunk_overlap=None):
-        self.chunk_size = chunk_size or config.CHUNK_SIZE
-        self.chunk_overlap = chunk_overlap or config.CHUNK_OVERLAP
+    def __init__(self, chunk_size=None, chunk_overlap=None, splitter=None, length_unit=None):
+        self.splitter = splitter or config.TEXT_SPLITTER
+        self.length_unit = length_unit or config.CHUNK_UNIT
+        tokens = self.length_unit == "tokens"
+        self.chunk_size = chunk_size or (config.CHUNK_TOKENS if tokens else config.CHUNK_SIZE)
+        self.chunk_overlap = chunk_overlap or (config.CHUNK_OVERLAP_TOKENS if tokens else config.CHUNK_OVERLAP)
         
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", ". ", " ", ""]
-        )
+        self.separators = ["\n\n", "\n", ". ", " ", ""]
+        if self.splitter == "span":
+            self.text_splitter = SpanSplitter(self.chunk_size, self.chunk_overlap, self.length_unit)
+        elif self.splitter == "recursive" and not tokens:
+            self.text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self.chunk_size,
+                chunk_overlap=self.chunk_overlap,
+                length_function=len,
+                separators=self.separators
+            )
+        else:
+            raise ValueError(f"Unsupported splitter: {self.splitter} ({self.length_unit})")
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        """Chunker settings that affect chunk content (used for index addressing)."""
+        settings = {
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "separators": self.separators,
+        }
+        # Recursive-splitter indexes built before these settings existed keep their chunk IDs
+        if self.splitter != "recursive":
+            settings.update(splitter=self.splitter, length_unit=self.length_unit)
+        return settings
+
+    def _locate(self, text: str) -> List[Tuple[int, str]]:
+        """(offset, text) of each chunk of `text`; offset is -1 if it could not be found."""
+        if isinstance(self.text_splitter, SpanSplitter):
+            return [(start, text[start:end]) for start, end in self.text_splitter.split_spans(text)]
+        located = []
+        search_from = 0
+        for piece in self.text_splitter.split_text(text):
+            position = text.find(piece, search_from)
+            located.append((position, piece))
+            if position >= 0:
+                search_from = position + 1
+        return located
     
-    def process_document(self, file_path: str) -> List[Document]:
-        _, ext = os.path.splitext(file_path)
-        text = ""
+    def iter_chunks(self, file_path: str) -> Iterator[Document]:
+        """Yield chunks page by page without holding the whole document in memory.
 
+        PDF pages are extracted in a process pool and text files are read in
+        fixed-size segments. The last chunk of each page is carried into the
+        next one, so chunk boundaries and overlap behave as if the text were
+        split in one piece. PDF chunks record the page they start on, and every
+        chunk its position in the document.
+
+        Raises DocumentReadError when the file cannot be read to the end, so a
+        failed read is never mistaken for a shorter document.
+        """
+        _, ext = os.path.splitext(file_path)
         if ext.lower() == ".pdf":
             if PyPDF2 is None:
                 raise ImportError("PyPDF2 is not installed. Please run: pip install PyPDF2")
-            try:
-                with open(file_path, "rb") as f:
-                    pdf_reader = PyPDF2.PdfReader(f)
-                    text = "\n".join(page.extract_text() or "" for page in pdf_reader.pages)
-            except Exception as e:
-                print(f"Error reading PDF {file_path}: {e}")
-                return []
+            pages, joiner = self._iter_pdf_pages(file_path), "\n"
         elif ext.lower() == ".txt":
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    text = f.read()
-            except Exception as e:
-                print(f"Error reading TXT {file_path}: {e}")
-                return []
+            pages, joiner = self._iter_text_segments(file_path), ""
         else:
-            print(f"Unsupported file type: {ext}")
-            return []
+            logger.warning("Unsupported file type: %s", ext)
+            return
 
-        if not text.strip():
-            print(f"No text extracted from document: {file_path}")
-            return []
+        carry, carry_page = "", None
+        produced = 0
+        try:
+            for page_number, page_text in pages:
+                if not page_text:
+                    continue
+                text = carry + joiner + page_text if carry else page_text
+                boundary = len(carry) + len(joiner) if carry else 0
+                located = self._locate(text)
+                if not located:
+                    continue
 
-        doc = Document(page_content=text, metadata={"source": file_path})
-        chunks = self.text_splitter.split_documents([doc])
-        
-        chunks = [chunk for chunk in chunks if chunk.page_content.strip()]
-        
-        print(f"✓ Loaded document from: {file_path}")
-        print(f"✓ Created {len(chunks)} chunks")
-        print(f"✓ Chunk size: {self.chunk_size}, Overlap: {self.chunk_overlap}")
+                starts = [position for position, _ in located]
+                pieces = [piece for _, piece in located]
+                pages_of = [carry_page if 0 <= position < boundary else page_number for position in starts]
+
+                for piece, page in zip(pieces[:-1], pages_of[:-1]):
+                    if piece.strip():
+                        yield self._make_chunk(piece, file_path, page, produced)
+                        produced += 1
+                # Carry the raw tail (not the stripped piece) so whitespace at the seam survives
+                carry = text[starts[-1]:] if starts[-1] >= 0 else pieces[-1]
+                carry_page = pages_of[-1]
+        except Exception as e:
+            raise DocumentReadError(f"Error reading {ext.lstrip('.').upper()} {file_path}: {e}") from e
+
+        if carry.strip():
+            yield self._make_chunk(carry, file_path, carry_page, produced)
+            produced += 1
+        if not produced:
+            logger.warning("No text extracted from document: %s", file_path)
+
+    def _make_chunk(self, text: str, file_path: str, page: Optional[int], index: int) -> Document:
+        metadata = {"source": file_path, "chunk": index}
+        if page is not None:
+            metadata["page"] = page
+        return Document(page_content=text, metadata=metadata)
+
+    def _iter_text_segments(self, file_path: str) -> Iterator[Tuple[Optional[int], str]]:
+        with open(file_path, "r", encoding="utf-8") as f:
+            while True:
+                segment = f.read(config.TEXT_SEGMENT_CHARS)
+                if not segment:
+                    return
+                yield None, segment
+
+    def _iter_pdf_pages(self, file_path: str) -> Iterator[Tuple[Optional[int], str]]:
+        """Yield (page number, text) in order, extracting page ranges in worker processes."""
+        with open(file_path, "rb") as f:
+            page_count = len(PyPDF2.PdfReader(f).pages)
+        per_task = config.PDF_PAGES_PER_TASK
+        ranges = [(start, min(start + per_task, page_count)) for start in range(0, page_count, per_task)]
+
+        if len(ranges) <= 1 or config.INGEST_WORKERS <= 1:
+            for start, end in ranges:
+                for offset, text in enumerate(_extract_pdf_pages(file_path, start, end)):
+                    yield start + offset + 1, text
+            return
+
+        # Keep a bounded window of ranges in flight so extracted text never piles up
+        with ProcessPoolExecutor(max_workers=config.INGEST_WORKERS) as pool:
+            remaining = iter(ranges)
+            in_flight = deque(
+                (start, pool.submit(_extract_pdf_pages, file_path, start, end))
+                for start, end in islice(remaining, config.INGEST_WORKERS * 2)
+            )
+            while in_flight:
+                start, future = in_flight.popleft()
+                texts = future.result()
+                following = next(remaining, None)
+                if following is not None:
+                    in_flight.append((following[0], pool.submit(_extract_pdf_pages, file_path, *following)))
+                for offset, text in enumerate(texts):
+                    yield start + offset + 1, text
+    
+    def process_document(self, file_path: str) -> List[Document]:
+        try:
+            chunks = list(self.iter_chunks(file_path))
+        except DocumentReadError as e:
+            logger.error("%s", e)
+            return []
+        if not chunks:
+            return []
         
-        print(f"[DEBUG] extracted text first 200 chars: {text[:200]}")
-        print(f"[DEBUG] Number of chunks after split/filter: {len(chunks)}")
-        for i, chunk in enumerate(chunks[:3]):  # Only show first few
-            print(f"[DEBUG] chunk {i}: {chunk.page_content[:60]}")
+        logger.info("Loaded document from %s: %d chunks (size %d, overlap %d)",
+                    file_path, len(chunks), self.chunk_size, self.chunk_overlap)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Extracted text first 200 chars: %s", chunks[0].page_content[:200])
+            for i, chunk in enumerate(chunks[:3]):  # Only show first few
+                logger.debug("Chunk %d: %s", i, chunk.page_content[:60])
         
-        return chunks
\ No newline at end of file
+        return chunks
+
+
+def _extract_pdf_pages(file_path: str, start: int, end: int) -> List[str]:
+    """Extract text of pages [start, end) (runs in a worker process)."""
+    with open(file_path, "rb") as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        return [pdf_reader.pages[i].extract_text() or "" for i in range(start, end)]
\ No newline at end of file
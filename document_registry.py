@@ -0,0 +1,238 @@
+"""Registry of indexed documents: one vector collection per document ID."""
+import hashlib
+import heapq
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain, zip_longest
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from langchain.schema import Document
+from config import config
+from document_processor import DocumentProcessor
+from vector_store import VectorStoreManager
+from agent import MarketAnalystAgent
+from logging_setup import get_logger
+
+logger = get_logger(__name__)
+
+
+def document_id_for(file_path: str) -> str:
+    """Content hash of a file, so the same report always maps to the same ID."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def document_id_for_bytes(data: bytes) -> str:
+    """document_id_for() of content already in memory (e.g. an upload)."""
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def _counted(chunks: Iterable[Document], progress: Callable[[int], None]) -> Iterator[Document]:
+    for count, chunk in enumerate(chunks, 1):
+        progress(count)
+        yield chunk
+
+
+class MultiDocumentStore:
+    """Searches several per-document stores and merges results by relevance.
+
+    Exposes the subset of the VectorStoreManager interface AgentTools uses.
+    """
+
+    def __init__(self, managers: List[VectorStoreManager]):
+        self.managers = managers
+        self.embeddings = managers[0].embeddings
+        self.persist_directory = managers[0].persist_directory
+        self.collection_name = "multi_" + hashlib.sha256(
+            ",".join(sorted(m.collection_name for m in managers)).encode("utf-8")
+        ).hexdigest()[:16]
+
+    @property
+    def embedding_id(self) -> str:
+        return self.managers[0].embedding_id
+
+    @property
+    def index_version(self) -> str:
+        versions = ",".join(sorted(str(m.index_version) for m in self.managers))
+        return hashlib.sha256(versions.encode("utf-8")).hexdigest()[:16]
+
+    def similarity_search(self, query: str, k: int = 3, mmr: bool = False,
+                          score_threshold: Optional[float] = None, hybrid: bool = False) -> List[Document]:
+        if mmr:
+            # Interleave each document's diverse picks so every document contributes
+            per_store = [m.similarity_search(query, k=k, mmr=True) for m in self.managers]
+            merged = [doc for doc in chain.from_iterable(zip_longest(*per_store)) if doc is not None]
+            return merged[:k]
+        if hybrid:
+            # Fused rank scores are comparable across collections
+            fused = chain.from_iterable(m.hybrid_search_with_scores(query, k) for m in self.managers)
+            return [doc for doc, _ in heapq.nlargest(k, fused, key=lambda pair: pair[1])]
+        scored = chain.from_iterable(m.similarity_search_with_scores(query, k) for m in self.managers)
+        top = heapq.nlargest(k, scored, key=lambda pair: pair[1])
+        return [doc for doc, score in top if not score_threshold or score >= score_threshold]
+
+    def all_documents(self) -> List[Document]:
+        return [doc for manager in self.managers for doc in manager.all_documents()]
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        return self.managers[0].embed_queries(queries)
+
+    def batch_similarity_search(self, queries: List[str], k: int = 3) -> List[List[Document]]:
+        per_store = [m.batch_similarity_search_with_scores(queries, k) for m in self.managers]
+        return [
+            [doc for doc, _ in heapq.nlargest(k, chain.from_iterable(results), key=lambda pair: pair[1])]
+            for results in zip(*per_store)
+        ]
+
+
+class DocumentRegistry:
+    """Tracks uploaded documents and serves agents over one or several of them.
+
+    Each document gets its own collection named after its content hash. The
+    embedding model is shared process-wide; collections are opened on first
+    query and the least recently used (or idle) ones are released once more
+    than MAX_OPEN_DOCUMENTS are open.
+    """
+
+    def __init__(self, persist_directory: Optional[str] = None, max_open: Optional[int] = None,
+                 idle_seconds: Optional[float] = None):
+        self.persist_directory = persist_directory or config.VECTOR_DB_PATH
+        self.max_open = max_open or config.MAX_OPEN_DOCUMENTS
+        self.idle_seconds = idle_seconds or config.DOCUMENT_IDLE_SECONDS
+        self.registry_path = os.path.join(self.persist_directory, "documents.json")
+
+        self._lock = threading.RLock()
+        self._documents: Dict[str, Dict[str, Any]] = self._load()
+        # doc_id -> (manager, last used); doc set -> (agent, last used)
+        self._open: "OrderedDict[str, Tuple[VectorStoreManager, float]]" = OrderedDict()
+        self._agents: "OrderedDict[Tuple[str, ...], Tuple[MarketAnalystAgent, float]]" = OrderedDict()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.registry_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self) -> None:
+        os.makedirs(self.persist_directory, exist_ok=True)
+        tmp_path = self.registry_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._documents, f, indent=2)
+        os.replace(tmp_path, self.registry_path)
+
+    def collection_for(self, doc_id: str) -> str:
+        return f"{config.COLLECTION_NAME}_{doc_id}"
+
+    def list_documents(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(entry, document_id=doc_id) for doc_id, entry in self._documents.items()]
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._documents.get(doc_id)
+            return dict(entry, document_id=doc_id) if entry else None
+
+    def register(self, file_path: str, name: Optional[str] = None, doc_id: Optional[str] = None,
+                 progress: Optional[Callable[[int], None]] = None) -> Optional[str]:
+        """Index a file into its own collection; returns its ID, or None if it has no text.
+
+        `progress` is called with the number of chunks read so far.
+        """
+        doc_id = doc_id or document_id_for(file_path)
+        with self._lock:
+            if doc_id in self._documents:
+                return doc_id
+
+        processor = DocumentProcessor()
+        manager = VectorStoreManager(
+            persist_directory=self.persist_directory,
+            collection_name=self.collection_for(doc_id)
+        )
+        chunks = processor.iter_chunks(file_path)
+        if progress is not None:
+            chunks = _counted(chunks, progress)
+        manager.sync_vector_store(chunks, processor.settings)
+        if not manager.chunk_count:
+            return None
+
+        with self._lock:
+            self._documents[doc_id] = {
+                "name": name or os.path.basename(file_path),
+                "collection": manager.collection_name,
+                "chunks": manager.chunk_count,
+                "version": manager.index_version,
+                "created_at": time.time(),
+            }
+            self._save()
+            self._remember(self._open, doc_id, manager)
+            self._evict()
+        logger.info("Registered document %s (%d chunks)", doc_id, manager.chunk_count)
+        if config.PRECOMPUTE_ARTIFACTS:
+            self.get_agent([doc_id]).agent_tools.precompute_artifacts(background=True)
+        return doc_id
+
+    def _remember(self, cache: OrderedDict, key, value) -> None:
+        cache[key] = (value, time.monotonic())
+        cache.move_to_end(key)
+
+    def open(self, doc_id: str) -> VectorStoreManager:
+        """Vector store for a document, opening its collection on first use."""
+        with self._lock:
+            if doc_id not in self._documents:
+                raise KeyError(f"Unknown document: {doc_id}")
+            cached = self._open.get(doc_id)
+            if cached is not None:
+                self._remember(self._open, doc_id, cached[0])
+                return cached[0]
+
+        manager = VectorStoreManager(
+            persist_directory=self.persist_directory,
+            collection_name=self.collection_for(doc_id)
+        )
+        manager.load_vector_store()
+        with self._lock:
+            self._remember(self._open, doc_id, manager)
+            self._evict()
+        return manager
+
+    def get_agent(self, doc_ids: Iterable[str]) -> MarketAnalystAgent:
+        """Agent answering over one document or the union of several."""
+        key = tuple(sorted(set(doc_ids)))
+        if not key:
+            raise ValueError("At least one document ID is required")
+        with self._lock:
+            cached = self._agents.get(key)
+            if cached is not None:
+                self._remember(self._agents, key, cached[0])
+                return cached[0]
+
+        managers = [self.open(doc_id) for doc_id in key]
+        store = managers[0] if len(managers) == 1 else MultiDocumentStore(managers)
+        agent = MarketAnalystAgent(None, store)
+        with self._lock:
+            self._remember(self._agents, key, agent)
+            self._evict()
+        return agent
+
+    def _evict(self) -> None:
+        """Release idle collections and agents, then the LRU ones beyond capacity."""
+        now = time.monotonic()
+        for cache in (self._open, self._agents):
+            for key in [k for k, (_, used) in cache.items() if now - used > self.idle_seconds]:
+                del cache[key]
+            while len(cache) > self.max_open:
+                cache.popitem(last=False)
+        # An agent must not outlive the collections it searches
+        for key in [k for k in self._agents if any(doc_id not in self._open for doc_id in k)]:
+            del self._agents[key]
+
+    def open_count(self) -> int:
+        with self._lock:
+            return len(self._open)
+
@@ -0,0 +1,138 @@
+"""Persistent embedding cache with an in-memory LRU front."""
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from config import config
+from metrics import timed
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embeddings model and caches vectors by (model name, text hash).
+
+    Lookups go to a bounded in-memory LRU first, then to a SQLite file on disk;
+    only texts missing from both are sent to the underlying model, in one batch.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str,
+                 cache_path: Optional[str] = None, max_memory_items: Optional[int] = None):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache_path = cache_path or config.EMBEDDING_CACHE_PATH
+        self.max_memory_items = max_memory_items or config.EMBEDDING_CACHE_SIZE
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._db = sqlite3.connect(self.cache_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._db.commit()
+
+    def _key(self, text: str, kind: str) -> str:
+        normalized = " ".join(text.split())
+        digest = hashlib.sha256(f"{self.model_name}\0{kind}\0{normalized}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Resolve keys from memory, then disk. Caller holds the lock."""
+        found: Dict[str, List[float]] = {}
+        pending = []
+        for key in keys:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                found[key] = vector
+            else:
+                pending.append(key)
+
+        # SQLite limits bound parameters per statement; stay well below it
+        for start in range(0, len(pending), 500):
+            batch = pending[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._db.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            for key, blob in rows:
+                vector = array("f", blob).tolist()
+                self._remember(key, vector)
+                found[key] = vector
+                self.disk_hits += 1
+        return found
+
+    @timed("embed")
+    def _embed(self, texts: List[str], kind: str, compute) -> List[List[float]]:
+        keys = [self._key(text, kind) for text in texts]
+        with self._lock:
+            found = self._lookup(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+
+        if missing:
+            vectors = compute(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            with self._lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, array("f", vector).tobytes()) for key, vector in computed.items()],
+                )
+                self._db.commit()
+                for key, vector in computed.items():
+                    self._remember(key, list(vector))
+            found.update(computed)
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+        return [list(found[key]) for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._embed(texts, "document", self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], "query", lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries with a single model forward pass.
+
+        sentence-transformers models are symmetric, so the batch goes through
+        embed_documents while still being cached under the query namespace.
+        """
+        if not texts:
+            return []
+        return self._embed(texts, "query", self.embeddings.embed_documents)
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters for monitoring."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "memory_items": len(self._memory),
+                "memory_capacity": self.max_memory_items,
+            }
@@ -0,0 +1,139 @@
+"""Process-wide sentence embedding engine with lazy loading and optional ONNX/int8 backends."""
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from config import config
+from metrics import timed
+from logging_setup import get_logger
+
+logger = get_logger(__name__)
+
+
+class EmbeddingEngine(Embeddings):
+    """Embeds text with a sentence-transformers model loaded on first use.
+
+    Backends:
+      torch  sentence-transformers on CPU (same vectors as HuggingFaceEmbeddings)
+      int8   the torch model with dynamically int8-quantized Linear layers
+      onnx   ONNX Runtime via optimum, with mean pooling + L2 normalization
+
+    torch/transformers are imported only when the model is first needed, so
+    importing this module (and the API) stays cheap.
+    """
+
+    def __init__(self, model_name: str, backend: Optional[str] = None,
+                 batch_size: Optional[int] = None, num_threads: Optional[int] = None):
+        self.model_name = model_name
+        self.backend = backend or config.EMBEDDING_BACKEND
+        self.batch_size = batch_size or config.EMBEDDING_ENCODE_BATCH_SIZE
+        self.num_threads = config.EMBEDDING_THREADS if num_threads is None else num_threads
+        if self.backend not in ("torch", "int8", "onnx"):
+            raise ValueError(f"Unknown embedding backend: {self.backend}")
+
+        self._model = None
+        self._tokenizer = None
+        self._lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def embedding_id(self) -> str:
+        """Identifies the vector space: quantized/ONNX vectors differ slightly from torch ones."""
+        return self.model_name if self.backend == "torch" else f"{self.model_name}@{self.backend}"
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def _load(self) -> None:
+        with self._lock:
+            if self._model is not None:
+                return
+            started = time.perf_counter()
+            logger.info("Loading embedding model %s (%s backend)", self.model_name, self.backend)
+            if self.backend == "onnx":
+                self._load_onnx()
+            else:
+                self._load_torch()
+            self.load_seconds = time.perf_counter() - started
+
+    def _load_torch(self) -> None:
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+        model = SentenceTransformer(self.model_name, device="cpu")
+        if self.backend == "int8":
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self._model = model
+
+    def _load_onnx(self) -> None:
+        try:
+            import onnxruntime
+            from optimum.onnxruntime import ORTModelForFeatureExtraction
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError(
+                "The onnx embedding backend needs optimum and onnxruntime. "
+                "Please run: pip install optimum[onnxruntime]"
+            ) from e
+
+        session_options = onnxruntime.SessionOptions()
+        if self.num_threads:
+            session_options.intra_op_num_threads = self.num_threads
+        self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        self._model = ORTModelForFeatureExtraction.from_pretrained(
+            self.model_name, export=True, session_options=session_options
+        )
+
+    @timed("embed")
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        self._load()
+        # Same preprocessing as HuggingFaceEmbeddings, so existing indexes stay valid
+        texts = [text.replace("\n", " ") for text in texts]
+        if self.backend == "onnx":
+            return self._encode_onnx(texts)
+        return self._model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True).tolist()
+
+    def _encode_onnx(self, texts: List[str]) -> List[List[float]]:
+        import numpy as np
+
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = self._tokenizer(
+                texts[start:start + self.batch_size],
+                padding=True,
+                truncation=True,
+                max_length=config.EMBEDDING_MAX_TOKENS,
+                return_tensors="np",
+            )
+            hidden = self._model(**batch).last_hidden_state
+            hidden = hidden.numpy() if hasattr(hidden, "numpy") else np.asarray(hidden)
+            mask = batch["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            vectors.extend(pooled.tolist())
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._encode(list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+    def warmup(self) -> None:
+        """Load the model and run one tiny batch so the first real request is fast."""
+        self.embed_documents(["warmup"])
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "model_name": self.model_name,
+            "backend": self.backend,
+            "batch_size": self.batch_size,
+            "num_threads": self.num_threads,
+            "loaded": self.loaded,
+            "load_seconds": self.load_seconds,
+        }
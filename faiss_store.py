@@ -0,0 +1,476 @@
+"""In-process vector index backed by a memory-mapped NumPy matrix and FAISS."""
+import io
+import json
+import mmap
+import os
+import shutil
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from langchain.schema import Document
+from config import config
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+
+class _Snapshot:
+    """Immutable view of the on-disk index; searches hold one while mutations swap it."""
+
+    def __init__(self, ids=None, vectors=None, scales=None, offsets=None, chunks=None, index=None):
+        self.ids: List[str] = ids or []
+        self.vectors = vectors
+        self.scales = scales
+        self.offsets = offsets
+        self.chunks = chunks
+        self.index = index
+
+
+class FaissVectorStore(VectorStore):
+    """Single-process vector store for small and medium corpora.
+
+    Layout under `<persist_directory>/<collection>.faiss/`:
+      vectors.npy   normalized embeddings (float32, float16, or int8 + scales.npy)
+      chunks.jsonl  one {"text", "metadata"} record per row, addressed by offsets.npy
+      ids.txt       chunk ids in row order, one per line
+      index.faiss   FAISS flat or IVF inner-product index (when faiss is installed)
+
+    Matrices and chunk records are memory-mapped, so opening an index is cheap
+    and only the rows a query touches are read. Without faiss, search falls
+    back to a blocked NumPy matrix product.
+
+    Adds append rows to these files in place, ids last, so a crash mid-append
+    leaves the previous rows intact. Rows beyond those in index.faiss are
+    searched with NumPy until rebuild_index() (called once per sync) covers them.
+    """
+
+    def __init__(self, embedding_function: Embeddings, persist_directory: Optional[str] = None,
+                 collection_name: Optional[str] = None, dtype: Optional[str] = None,
+                 index_type: Optional[str] = None):
+        self._embedding = embedding_function
+        self.directory = os.path.join(
+            persist_directory or config.VECTOR_DB_PATH,
+            f"{collection_name or config.COLLECTION_NAME}.faiss",
+        )
+        self.dtype = dtype or config.VECTOR_DTYPE
+        self.index_type = index_type or config.FAISS_INDEX_TYPE
+        if self.dtype not in ("float32", "float16", "int8"):
+            raise ValueError(f"Unsupported VECTOR_DTYPE: {self.dtype}")
+        self._snapshot = self._open()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    # ----- persistence -------------------------------------------------
+
+    def _path(self, name: str, directory: Optional[str] = None) -> str:
+        return os.path.join(directory or self.directory, name)
+
+    def _read_ids(self) -> Optional[List[str]]:
+        ids_path = self._path("ids.txt")
+        if not os.path.exists(ids_path):
+            # Indexes written before appends were supported
+            if not os.path.exists(self._path("ids.json")):
+                return None
+            with open(self._path("ids.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        with open(ids_path, "r", encoding="utf-8") as f:
+            lines = f.read().split("\n")
+        if lines[-1]:
+            # An append was cut short: drop its partial id so the next append starts clean
+            with open(ids_path, "w", encoding="utf-8") as f:
+                f.writelines(chunk_id + "\n" for chunk_id in lines[:-1])
+        return lines[:-1]
+
+    def _open(self, ids: Optional[List[str]] = None) -> _Snapshot:
+        """Map the index files; `ids` skips re-reading them after an append."""
+        old_dir = self.directory + ".old"
+        if not os.path.exists(self.directory) and os.path.exists(old_dir):
+            # Interrupted between the two renames of _write(): keep the previous index
+            os.replace(old_dir, self.directory)
+        ids = ids if ids is not None else self._read_ids()
+        if not ids:
+            return _Snapshot()
+
+        # Files may hold rows of an interrupted append; only rows with an id count
+        rows = len(ids)
+        vectors = np.load(self._path("vectors.npy"), mmap_mode="r")[:rows]
+        scales = np.load(self._path("scales.npy"), mmap_mode="r")[:rows] if self.dtype == "int8" else None
+        offsets = np.load(self._path("offsets.npy"), mmap_mode="r")[:rows + 1]
+        with open(self._path("chunks.jsonl"), "rb") as f:
+            chunks = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        index = None
+        if faiss is not None and os.path.exists(self._path("index.faiss")):
+            try:
+                index = faiss.read_index(self._path("index.faiss"), faiss.IO_FLAG_MMAP)
+            except RuntimeError:
+                index = faiss.read_index(self._path("index.faiss"))
+            if hasattr(index, "nprobe"):
+                index.nprobe = config.FAISS_NPROBE
+            if index.ntotal > rows:
+                index = None
+        return _Snapshot(ids, vectors, scales, offsets, chunks, index)
+
+    def _write(self, ids: List[str], records: List[Dict[str, Any]], matrix: np.ndarray) -> None:
+        """Write a complete index to a temporary directory, then swap it in."""
+        tmp_dir = self.directory + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        offsets = [0]
+        with open(self._path("chunks.jsonl", tmp_dir), "wb") as f:
+            for record in records:
+                line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+        np.save(self._path("offsets.npy", tmp_dir), np.asarray(offsets, dtype=np.int64))
+        with open(self._path("ids.txt", tmp_dir), "w", encoding="utf-8") as f:
+            f.writelines(chunk_id + "\n" for chunk_id in ids)
+
+        stored, scales = self._quantize(matrix)
+        if scales is not None:
+            np.save(self._path("scales.npy", tmp_dir), scales)
+        np.save(self._path("vectors.npy", tmp_dir), stored)
+
+        if faiss is not None and len(matrix):
+            faiss.write_index(self._build_index(matrix), self._path("index.faiss", tmp_dir))
+
+        # A directory cannot be replaced in one rename: move the old one aside first,
+        # and only delete it once the new one is in place (_open() recovers in between)
+        old_dir = self.directory + ".old"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.exists(self.directory):
+            os.replace(self.directory, old_dir)
+        os.replace(tmp_dir, self.directory)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        self._snapshot = self._open()
+
+    def _quantize(self, matrix: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Rows in the stored dtype, plus per-row scales for int8."""
+        if self.dtype != "int8":
+            return matrix.astype(self.dtype), None
+        scales = np.abs(matrix).max(axis=1) / 127.0 if len(matrix) else np.zeros(0, np.float32)
+        scales[scales == 0] = 1.0
+        return np.round(matrix / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _append(self, ids: List[str], records: List[Dict[str, Any]], matrix: np.ndarray) -> bool:
+        """Append rows to the files in place; False if they cannot be (the caller rewrites instead)."""
+        snapshot = self._snapshot
+        rows = len(snapshot.ids)
+        if not os.path.exists(self._path("ids.txt")):
+            return False
+        stored, scales = self._quantize(matrix)
+        # Check every file first so a refused append leaves nothing half-written
+        arrays = [("vectors.npy", stored), ("offsets.npy", None)]
+        if scales is not None:
+            arrays.append(("scales.npy", scales))
+        for name, _ in arrays:
+            if not _appendable(self._path(name), rows + 1 if name == "offsets.npy" else rows):
+                return False
+
+        end = int(snapshot.offsets[rows])
+        offsets = []
+        with open(self._path("chunks.jsonl"), "r+b") as f:
+            # Drop any records of an interrupted append
+            f.truncate(end)
+            f.seek(end)
+            for record in records:
+                line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+                f.write(line)
+                end += len(line)
+                offsets.append(end)
+        _append_rows(self._path("vectors.npy"), stored, rows)
+        if scales is not None:
+            _append_rows(self._path("scales.npy"), scales, rows)
+        _append_rows(self._path("offsets.npy"), np.asarray(offsets, dtype=np.int64), rows + 1)
+        # The ids commit the rows: until they are written the rows above are ignored
+        with open(self._path("ids.txt"), "a", encoding="utf-8") as f:
+            f.writelines(chunk_id + "\n" for chunk_id in ids)
+
+        # Reopen the grown files; the FAISS index still covers the earlier rows only
+        fresh = self._open(snapshot.ids + ids)
+        fresh.index = snapshot.index
+        self._snapshot = fresh
+        return True
+
+    def rebuild_index(self) -> None:
+        """Rebuild index.faiss when rows were appended after it was written."""
+        snapshot = self._snapshot
+        total = len(snapshot.ids)
+        if faiss is None or not total or (snapshot.index is not None and snapshot.index.ntotal == total):
+            return
+        matrix = self._rows(snapshot, np.arange(total))
+        tmp_path = self._path("index.faiss.tmp")
+        faiss.write_index(self._build_index(matrix), tmp_path)
+        os.replace(tmp_path, self._path("index.faiss"))
+        self._snapshot = self._open()
+
+    def _build_index(self, matrix: np.ndarray):
+        dim = matrix.shape[1]
+        quantizer_type = {
+            "float16": faiss.ScalarQuantizer.QT_fp16,
+            "int8": faiss.ScalarQuantizer.QT_8bit,
+        }.get(self.dtype)
+
+        nlist = min(config.FAISS_NLIST, max(1, len(matrix) // 39))
+        if self.index_type == "ivf" and nlist > 1:
+            coarse = faiss.IndexFlatIP(dim)
+            if quantizer_type is None:
+                index = faiss.IndexIVFFlat(coarse, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            else:
+                index = faiss.IndexIVFScalarQuantizer(
+                    coarse, dim, nlist, quantizer_type, faiss.METRIC_INNER_PRODUCT
+                )
+            # The IVF index only borrows the coarse quantizer; keep it alive with the index
+            index.own_fields = True
+            coarse.this.disown()
+        elif quantizer_type is not None:
+            index = faiss.IndexScalarQuantizer(dim, quantizer_type, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexFlatIP(dim)
+
+        if not index.is_trained:
+            index.train(matrix)
+        index.add(matrix)
+        return index
+
+    def _records_and_matrix(self, snapshot: _Snapshot) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        records = [self._record(snapshot, row) for row in range(len(snapshot.ids))]
+        return records, self._rows(snapshot, np.arange(len(snapshot.ids)))
+
+    # ----- row access ---------------------------------------------------
+
+    @staticmethod
+    def _record(snapshot: _Snapshot, row: int) -> Dict[str, Any]:
+        start, end = int(snapshot.offsets[row]), int(snapshot.offsets[row + 1])
+        return json.loads(snapshot.chunks[start:end])
+
+    def _document(self, snapshot: _Snapshot, row: int) -> Document:
+        record = self._record(snapshot, row)
+        return Document(page_content=record["text"], metadata=record.get("metadata") or {})
+
+    def _rows(self, snapshot: _Snapshot, rows: np.ndarray) -> np.ndarray:
+        """Dequantized float32 vectors for the given rows."""
+        if not len(snapshot.ids):
+            return np.zeros((0, 0), dtype=np.float32)
+        vectors = np.asarray(snapshot.vectors[rows], dtype=np.float32)
+        if snapshot.scales is not None:
+            vectors *= snapshot.scales[rows][:, None]
+        return vectors
+
+    # ----- search -------------------------------------------------------
+
+    def _search(self, snapshot: _Snapshot, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Scores and rows of the top k matches for each query row."""
+        total = len(snapshot.ids)
+        k = min(k, total)
+        if k <= 0:
+            empty = np.zeros((len(queries), 0))
+            return empty, empty.astype(np.int64)
+        indexed = snapshot.index.ntotal if snapshot.index is not None else 0
+        if indexed == total:
+            return snapshot.index.search(queries, k)
+        if not indexed:
+            return self._scan(snapshot, queries, k, 0)
+
+        # Rows appended since the index was built: merge index and NumPy results
+        index_scores, index_rows = snapshot.index.search(queries, min(k, indexed))
+        tail_scores, tail_rows = self._scan(snapshot, queries, min(k, total - indexed), indexed)
+        scores = np.hstack([index_scores, tail_scores])
+        rows = np.hstack([index_rows, tail_rows])
+        order = np.argsort(-scores, axis=1)[:, :k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(rows, order, axis=1)
+
+    def _scan(self, snapshot: _Snapshot, queries: np.ndarray, k: int, first: int) -> Tuple[np.ndarray, np.ndarray]:
+        """NumPy search of rows [first, total): score the matrix in blocks to bound temporary memory."""
+        total = len(snapshot.ids)
+        scores = np.empty((len(queries), total - first), dtype=np.float32)
+        for start in range(first, total, 65536):
+            rows = np.arange(start, min(start + 65536, total))
+            scores[:, rows - first] = queries @ self._rows(snapshot, rows).T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top_scores, order, axis=1), np.take_along_axis(top, order, axis=1) + first
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def similarity_search_by_vector_with_scores(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        snapshot = self._snapshot
+        scores, rows = self._search(snapshot, self._normalize(embedding), k)
+        return [
+            (self._document(snapshot, int(row)), float(score))
+            for score, row in zip(scores[0], rows[0]) if row >= 0
+        ]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_scores(embedding, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self._embedding.embed_query(query), k)
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_scores(self._embedding.embed_query(query), k)
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities of normalized vectors already
+        return lambda score: max(0.0, min(1.0, score))
+
+    def max_marginal_relevance_search_by_vector(self, embedding: List[float], k: int = 4, fetch_k: int = 20,
+                                                lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        snapshot = self._snapshot
+        query = self._normalize(embedding)
+        _, rows = self._search(snapshot, query, fetch_k)
+        candidates = [int(row) for row in rows[0] if row >= 0]
+        if not candidates:
+            return []
+        selected = maximal_marginal_relevance(
+            query[0], self._rows(snapshot, np.asarray(candidates)), k=k, lambda_mult=lambda_mult
+        )
+        return [self._document(snapshot, candidates[i]) for i in selected]
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20,
+                                      lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self._embedding.embed_query(query), k, fetch_k, lambda_mult
+        )
+
+    def search_by_vectors_with_scores(self, embeddings: List[List[float]],
+                                      k: int = 3) -> List[List[Tuple[Document, float]]]:
+        """Top-k documents for many query vectors in one matrix search; shared rows share objects."""
+        snapshot = self._snapshot
+        scores, rows = self._search(snapshot, self._normalize(embeddings), k)
+        relevance = self._select_relevance_score_fn()
+        documents: Dict[int, Document] = {}
+        results = []
+        for query_scores, query_rows in zip(scores, rows):
+            docs = []
+            for score, row in zip(query_scores, query_rows):
+                row = int(row)
+                if row < 0:
+                    continue
+                if row not in documents:
+                    documents[row] = self._document(snapshot, row)
+                docs.append((documents[row], relevance(float(score))))
+            results.append(docs)
+        return results
+
+    # ----- mutation (Chroma-compatible subset used by VectorStoreManager) ---
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = self._normalize(self._embedding.embed_documents(texts))
+
+        records = [{"text": text, "metadata": metadata} for text, metadata in zip(texts, metadatas)]
+        snapshot = self._snapshot
+        if snapshot.ids and self._append(ids, records, vectors):
+            return ids
+        old_records, matrix = self._records_and_matrix(snapshot)
+        matrix = np.vstack([matrix, vectors]) if len(matrix) else vectors
+        self._write(snapshot.ids + ids, old_records + records, matrix)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        doomed = set(ids)
+        snapshot = self._snapshot
+        keep = [row for row, chunk_id in enumerate(snapshot.ids) if chunk_id not in doomed]
+        if len(keep) == len(snapshot.ids):
+            return False
+        records, matrix = self._records_and_matrix(snapshot)
+        self._write(
+            [snapshot.ids[row] for row in keep],
+            [records[row] for row in keep],
+            matrix[keep] if keep else np.zeros((0, matrix.shape[1]), dtype=np.float32),
+        )
+        return True
+
+    def get(self, include: Optional[List[str]] = None, **kwargs: Any) -> Dict[str, Any]:
+        """Chunk ids, plus "documents" and/or "metadatas" when listed in `include` (Chroma's shape)."""
+        snapshot = self._snapshot
+        result: Dict[str, Any] = {"ids": list(snapshot.ids)}
+        include = include or []
+        if "documents" in include or "metadatas" in include:
+            records = [self._record(snapshot, row) for row in range(len(snapshot.ids))]
+            if "documents" in include:
+                result["documents"] = [record["text"] for record in records]
+            if "metadatas" in include:
+                result["metadatas"] = [record.get("metadata") or {} for record in records]
+        return result
+
+    def reset(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self._snapshot = _Snapshot()
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, persist_directory: Optional[str] = None,
+                   collection_name: Optional[str] = None, **kwargs: Any) -> "FaissVectorStore":
+        store = cls(embedding, persist_directory=persist_directory, collection_name=collection_name)
+        store.reset()
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+
+def _read_npy_header(f) -> Tuple[Tuple[int, ...], bool, np.dtype]:
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        return np.lib.format.read_array_header_1_0(f)
+    return np.lib.format.read_array_header_2_0(f)
+
+
+def _appendable(path: str, rows: int) -> bool:
+    """Whether a .npy file holds exactly `rows` rows (C order) and its header has room to grow."""
+    try:
+        with open(path, "rb") as f:
+            shape, fortran_order, dtype = _read_npy_header(f)
+            header_size = f.tell()
+    except (OSError, ValueError):
+        return False
+    if fortran_order or shape[0] != rows:
+        return False
+    # NumPy pads headers so the row count can grow in place; old or foreign files may not be
+    grown = (shape[0] + 10 ** 12,) + tuple(shape[1:])
+    return _npy_header(grown, dtype, header_size) is not None
+
+
+def _npy_header(shape: Tuple[int, ...], dtype: np.dtype, size: int) -> Optional[bytes]:
+    """A version 1.0 header for `shape`, if it is exactly `size` bytes long."""
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(
+        header, {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": shape}
+    )
+    data = header.getvalue()
+    return data if len(data) == size else None
+
+
+def _append_rows(path: str, rows: np.ndarray, count: int) -> None:
+    """Append rows to a .npy file of `count` rows (checked by _appendable), then update its header."""
+    with open(path, "r+b") as f:
+        shape, _, dtype = _read_npy_header(f)
+        header_size = f.tell()
+        f.seek(header_size + count * dtype.itemsize * int(np.prod(shape[1:], dtype=np.int64)))
+        f.truncate()
+        f.write(np.ascontiguousarray(rows, dtype=dtype).tobytes())
+        f.flush()
+        # Data first, then the row count, so an interrupted append is never read
+        f.seek(0)
+        f.write(_npy_header((count + len(rows),) + tuple(shape[1:]), dtype, header_size))
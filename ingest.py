@@ -0,0 +1,267 @@
+"""Bulk ingestion of a directory or zip archive of reports into one collection.
+
+Usage:
+    python ingest.py reports/2025-q3/
+    python ingest.py reports-2025-q3.zip --collection quarterly --workers 8
+    python ingest.py reports/ --restart    # ignore the checkpoint and start over
+
+Files are extracted and chunked in a process pool while the main process
+embeds the chunks in large batches and writes each batch in one add. After
+every batch the files whose chunks are all stored are recorded in a
+checkpoint next to the collection, so an interrupted run resumes where it
+stopped; unchanged files already ingested are skipped on later runs too.
+Files that fail to read are reported, make the run exit with status 1 and
+are retried on the next run.
+
+The default collection is the one the API and app query. Ingested chunks are
+flagged as appended, so syncing the uploaded document at startup never
+prunes them.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from langchain.schema import Document
+from config import config
+from logging_setup import get_logger
+
+logger = get_logger(__name__)
+
+SUPPORTED_EXTENSIONS = (".txt", ".pdf")
+
+# (key, location, fingerprint): key names the file in chunk metadata and the
+# checkpoint, location is a path or (archive, member), fingerprint detects changes
+Source = Tuple[str, Any, str]
+
+
+def iter_sources(path: str) -> Iterator[Source]:
+    """Supported files under a directory, or inside a zip archive, in a stable order."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            members = sorted(archive.infolist(), key=lambda info: info.filename)
+        for info in members:
+            if not info.is_dir() and info.filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                key = f"{os.path.basename(path)}/{info.filename}"
+                yield key, (path, info.filename), f"{info.file_size}:{info.CRC}"
+        return
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        yield os.path.basename(path), path, f"{stat.st_size}:{stat.st_mtime_ns}"
+        return
+    for directory, subdirectories, files in os.walk(path):
+        subdirectories.sort()
+        for name in sorted(files):
+            if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                file_path = os.path.join(directory, name)
+                stat = os.stat(file_path)
+                yield os.path.relpath(file_path, path), file_path, f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+_processor = None
+
+
+def _init_worker(settings: Dict[str, Any]) -> None:
+    global _processor
+    from document_processor import DocumentProcessor
+
+    # Each worker handles whole files; no nested pools for PDF pages
+    config.INGEST_WORKERS = 1
+    _processor = DocumentProcessor(**settings)
+
+
+def _chunk_source(key: str, location: Any) -> List[Tuple[str, Dict[str, Any]]]:
+    """(text, metadata) of every chunk of one file (runs in a worker process).
+
+    A file that cannot be read raises DocumentReadError: it is counted as
+    failed and stays out of the checkpoint, so the next run tries it again.
+    """
+    if isinstance(location, str):
+        chunks = _processor.iter_chunks(location)
+        return [(chunk.page_content, dict(chunk.metadata, source=key)) for chunk in chunks]
+
+    # Archive members are unpacked to a temporary file only for as long as they are read
+    archive_path, member = location
+    directory = tempfile.mkdtemp(prefix="ingest_")
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            file_path = archive.extract(member, directory)
+        return [(chunk.page_content, dict(chunk.metadata, source=key))
+                for chunk in _processor.iter_chunks(file_path)]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class Checkpoint:
+    """Files already ingested into a collection, keyed by name with their fingerprint."""
+
+    def __init__(self, path: str, restart: bool = False):
+        self.path = path
+        self.files: Dict[str, Dict[str, Any]] = {}
+        if not restart:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.files = json.load(f).get("files", {})
+            except (OSError, ValueError):
+                pass
+
+    def done(self, key: str, fingerprint: str) -> bool:
+        entry = self.files.get(key)
+        return entry is not None and entry["fingerprint"] == fingerprint
+
+    def record(self, key: str, fingerprint: str, chunks: int) -> None:
+        self.files[key] = {"fingerprint": fingerprint, "chunks": chunks, "ingested_at": time.time()}
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def ingest(path: str, collection_name: Optional[str] = None, persist_directory: Optional[str] = None,
+           workers: Optional[int] = None, batch_size: Optional[int] = None,
+           checkpoint_path: Optional[str] = None, restart: bool = False) -> Dict[str, Any]:
+    """Ingest every supported file under `path` (a directory, zip archive or single file)."""
+    from document_processor import DocumentProcessor
+    from vector_store import VectorStoreManager
+
+    workers = workers or config.INGEST_WORKERS
+    batch_size = batch_size or config.INGEST_BATCH_SIZE
+    manager = VectorStoreManager(persist_directory=persist_directory, collection_name=collection_name)
+    processor = DocumentProcessor()
+    processor_settings = {
+        "chunk_size": processor.chunk_size, "chunk_overlap": processor.chunk_overlap,
+        "splitter": processor.splitter, "length_unit": processor.length_unit,
+    }
+    checkpoint = Checkpoint(
+        checkpoint_path or os.path.join(manager.persist_directory, f"{manager.collection_name}.ingest.json"),
+        restart=restart,
+    )
+
+    found = list(iter_sources(path))
+    sources = [source for source in found if not checkpoint.done(source[0], source[2])]
+    stats = {"files": 0, "chunks": 0, "embedded": 0, "skipped": len(found) - len(sources), "failed": 0}
+    logger.info("Ingesting %d files from %s into %s (%d already ingested)",
+                len(sources), path, manager.collection_name, stats["skipped"])
+
+    started = time.perf_counter()
+    batch: List[Document] = []
+    # Files whose chunks are in `batch` or earlier: stored once the batch is written
+    waiting: List[Tuple[str, str, int]] = []
+    last_report = started
+
+    def flush() -> None:
+        nonlocal last_report
+        if batch:
+            stats["embedded"] += manager.append_documents(batch, processor.settings)
+            batch.clear()
+        for key, fingerprint, chunks in waiting:
+            checkpoint.record(key, fingerprint, chunks)
+        if waiting:
+            checkpoint.save()
+            waiting.clear()
+        now = time.perf_counter()
+        if now - last_report >= 10:
+            last_report = now
+            logger.info("Progress: %d/%d files, %d chunks, %.1f docs/s",
+                        stats["files"], len(sources), stats["chunks"], stats["files"] / (now - started))
+
+    def collect(source: Source, chunks: List[Tuple[str, Dict[str, Any]]]) -> None:
+        key, _, fingerprint = source
+        batch.extend(Document(page_content=text, metadata=metadata) for text, metadata in chunks)
+        waiting.append((key, fingerprint, len(chunks)))
+        stats["files"] += 1
+        stats["chunks"] += len(chunks)
+        if len(batch) >= batch_size:
+            flush()
+
+    try:
+        for source, chunks in _chunk_all(sources, processor_settings, workers):
+            if chunks is None:
+                stats["failed"] += 1
+                continue
+            collect(source, chunks)
+        flush()
+    finally:
+        # Keep whatever was written consistent even when interrupted
+        manager.finish_append(processor.settings)
+    if manager.chunk_count is None:
+        # Nothing new was ingested: report the collection as it stands
+        manager.load_vector_store()
+
+    elapsed = time.perf_counter() - started
+    stats.update(
+        collection=manager.collection_name,
+        chunks_total=manager.chunk_count,
+        elapsed_s=round(elapsed, 2),
+        docs_per_s=round(stats["files"] / elapsed, 2) if elapsed else 0.0,
+        chunks_per_s=round(stats["chunks"] / elapsed, 1) if elapsed else 0.0,
+    )
+    return stats
+
+
+def _chunk_all(sources: List[Source], settings: Dict[str, Any],
+               workers: int) -> Iterator[Tuple[Source, Optional[List[Tuple[str, Dict[str, Any]]]]]]:
+    """Chunks of each source as they become ready; None for a file that failed."""
+    if workers <= 1 or len(sources) <= 1:
+        _init_worker(settings)
+        for source in sources:
+            yield source, _chunk_safely(source, lambda: _chunk_source(source[0], source[1]))
+        return
+
+    # A bounded number of files in flight, so chunks never pile up ahead of embedding
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(settings,)) as pool:
+        remaining = iter(sources)
+        in_flight = {}
+        for source in remaining:
+            in_flight[pool.submit(_chunk_source, source[0], source[1])] = source
+            if len(in_flight) >= workers * 2:
+                break
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                source = in_flight.pop(future)
+                following = next(remaining, None)
+                if following is not None:
+                    in_flight[pool.submit(_chunk_source, following[0], following[1])] = following
+                yield source, _chunk_safely(source, future.result)
+
+
+def _chunk_safely(source: Source, produce) -> Optional[List[Tuple[str, Dict[str, Any]]]]:
+    try:
+        return produce()
+    except Exception as e:
+        logger.error("Failed to ingest %s: %s", source[0], e)
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="directory, zip archive or single .txt/.pdf file")
+    parser.add_argument("--collection", default=None, help="defaults to config.COLLECTION_NAME")
+    parser.add_argument("--persist-directory", default=None, help="defaults to config.VECTOR_DB_PATH")
+    parser.add_argument("--workers", type=int, default=None, help="chunking processes (default INGEST_WORKERS)")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="chunks embedded and written per batch (default INGEST_BATCH_SIZE)")
+    parser.add_argument("--checkpoint", default=None, help="defaults to <collection>.ingest.json in the DB directory")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and ingest every file")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        parser.error(f"No such file or directory: {args.path}")
+    stats = ingest(args.path, args.collection, args.persist_directory, args.workers,
+                   args.batch_size, args.checkpoint, args.restart)
+    for key, value in stats.items():
+        print(f"{key:>14}: {value}")
+    sys.exit(1 if stats["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Background ingestion jobs: uploads are indexed off the request/UI thread and polled by job ID."""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from config import config
+from document_registry import DocumentRegistry, document_id_for
+from logging_setup import get_logger
+
+logger = get_logger(__name__)
+
+
+def _estimate_chunks(file_path: str) -> Optional[int]:
+    """Rough chunk count of a text file from its size (PDF text size is unknown up front)."""
+    if not file_path.lower().endswith(".txt"):
+        return None
+    if config.CHUNK_UNIT == "tokens":
+        # ~4 characters per token
+        stride = 4 * (config.CHUNK_TOKENS - config.CHUNK_OVERLAP_TOKENS)
+    else:
+        stride = config.CHUNK_SIZE - config.CHUNK_OVERLAP
+    return max(1, os.path.getsize(file_path) // max(1, stride))
+
+
+class IngestJob:
+    def __init__(self, name: str, document_id: str, estimated_chunks: Optional[int] = None):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.document_id = document_id
+        self.status = "queued"  # queued, running, done or failed
+        self.chunks = 0
+        self.estimated_chunks = estimated_chunks
+        self.error: Optional[str] = None
+        # Already indexed when submitted: nothing to do
+        self.deduplicated = False
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def progress(self) -> Optional[float]:
+        if self.status == "done":
+            return 1.0
+        if self.status == "queued":
+            return 0.0
+        if not self.estimated_chunks:
+            return None
+        # The estimate can be low; never claim completion before the job finishes
+        return round(min(0.99, self.chunks / self.estimated_chunks), 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "name": self.name,
+            "document_id": self.document_id,
+            "status": self.status,
+            "progress": self.progress(),
+            "chunks": self.chunks,
+            "deduplicated": self.deduplicated,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestQueue:
+    """Indexes submitted files into the document registry on background threads.
+
+    Files are identified by content hash: a file already in the registry
+    completes at once, and one already queued or running returns the
+    existing job, so re-submitting never parses or embeds twice. Finished
+    jobs are kept for polling, the oldest dropped beyond MAX_INGEST_JOBS.
+    """
+
+    def __init__(self, registry: DocumentRegistry, workers: Optional[int] = None,
+                 max_jobs: Optional[int] = None):
+        self.registry = registry
+        self.max_jobs = max_jobs or config.MAX_INGEST_JOBS
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or config.INGEST_JOB_WORKERS, thread_name_prefix="ingest"
+        )
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        # document ID -> its queued or running job
+        self._active: Dict[str, IngestJob] = {}
+
+    def submit(self, file_path: str, name: Optional[str] = None, remove_after: bool = False,
+               document_id: Optional[str] = None) -> IngestJob:
+        """Queue a file for indexing; `remove_after` deletes it once it is no longer needed."""
+        document_id = document_id or document_id_for(file_path)
+        name = name or os.path.basename(file_path)
+        with self._lock:
+            job = self._active.get(document_id)
+            if job is not None:
+                queued = False
+            else:
+                job = IngestJob(name, document_id, _estimate_chunks(file_path))
+                existing = self.registry.get(document_id)
+                if existing is not None:
+                    job.status, job.deduplicated = "done", True
+                    job.chunks = existing.get("chunks", 0)
+                    job.started_at = job.finished_at = time.time()
+                else:
+                    self._active[document_id] = job
+                queued = not job.deduplicated
+                self._jobs[job.id] = job
+                self._trim()
+
+        if queued:
+            self._executor.submit(self._run, job, file_path, remove_after)
+        elif remove_after:
+            _remove(file_path)
+        return job
+
+    def _run(self, job: IngestJob, file_path: str, remove_after: bool) -> None:
+        job.status, job.started_at = "running", time.time()
+
+        def progress(count: int) -> None:
+            job.chunks = count
+
+        try:
+            document_id = self.registry.register(file_path, name=job.name, doc_id=job.document_id,
+                                                 progress=progress)
+            if document_id is None:
+                job.status, job.error = "failed", "No text could be extracted from the document"
+            else:
+                job.chunks = (self.registry.get(document_id) or {}).get("chunks", job.chunks)
+                job.status = "done"
+        except Exception as e:
+            logger.exception("Ingestion of %s failed", job.name)
+            job.status, job.error = "failed", str(e)
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._active.pop(job.document_id, None)
+            if remove_after:
+                _remove(file_path)
+        logger.info("Ingestion job %s (%s): %s, %d chunks in %.1fs", job.id, job.name, job.status,
+                    job.chunks, job.finished_at - job.started_at)
+
+    def _trim(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_jobs)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[IngestJob]:
+        """All retained jobs, newest first."""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def stats(self) -> Dict[str, int]:
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        return counts
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _remove(file_path: str) -> None:
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
@@ -0,0 +1,183 @@
+"""BM25 inverted index over chunk texts, persisted as memory-mapped arrays."""
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from langchain.schema import Document
+from config import config
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.,'][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were "
+    "what which who with how does do did".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word and number tokens; keeps "2030", "22", "15.5" and "synergy" intact."""
+    return [token for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over the chunks of one collection.
+
+    Layout under `<persist_directory>/<collection>.bm25/`:
+      meta.json     index version, k1, b, average document length
+      vocab.json    term -> [first posting, document frequency]
+      postings.npy  int32 chunk rows, grouped by term
+      tfs.npy       uint16 term frequency for each posting
+      lengths.npy   float32 token count per chunk
+      ids.json      chunk ids in row order
+      chunks.jsonl  one {"text", "metadata"} record per row, addressed by offsets.npy
+
+    Postings, frequencies and chunk records are memory-mapped, so opening the
+    index only reads the vocabulary. A query touches the postings of its own
+    terms and the records of the top k chunks.
+    """
+
+    def __init__(self, persist_directory: Optional[str] = None, collection_name: Optional[str] = None):
+        self.directory = os.path.join(
+            persist_directory or config.VECTOR_DB_PATH,
+            f"{collection_name or config.COLLECTION_NAME}.bm25",
+        )
+        self.meta: Dict[str, Any] = {}
+        self.vocab: Dict[str, List[int]] = {}
+        self._open()
+
+    def _path(self, name: str, directory: Optional[str] = None) -> str:
+        return os.path.join(directory or self.directory, name)
+
+    def _open(self) -> None:
+        try:
+            with open(self._path("meta.json"), "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+            with open(self._path("vocab.json"), "r", encoding="utf-8") as f:
+                self.vocab = json.load(f)
+            with open(self._path("ids.json"), "r", encoding="utf-8") as f:
+                self.ids: List[str] = json.load(f)
+        except (OSError, ValueError):
+            self.meta, self.vocab, self.ids = {}, {}, []
+            return
+        if not self.ids:
+            return
+        self.postings = np.load(self._path("postings.npy"), mmap_mode="r")
+        self.tfs = np.load(self._path("tfs.npy"), mmap_mode="r")
+        self.lengths = np.load(self._path("lengths.npy"), mmap_mode="r")
+        self.offsets = np.load(self._path("offsets.npy"), mmap_mode="r")
+        with open(self._path("chunks.jsonl"), "rb") as f:
+            self.chunks = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @property
+    def version(self) -> Optional[str]:
+        return self.meta.get("version")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids: List[str], texts: List[str], metadatas: Optional[List[dict]] = None,
+              persist_directory: Optional[str] = None, collection_name: Optional[str] = None,
+              version: Optional[str] = None) -> "BM25Index":
+        """Write a complete index to a temporary directory, swap it in, and open it."""
+        index = cls.__new__(cls)
+        index.directory = os.path.join(
+            persist_directory or config.VECTOR_DB_PATH,
+            f"{collection_name or config.COLLECTION_NAME}.bm25",
+        )
+        metadatas = metadatas or [{} for _ in texts]
+        tmp_dir = index.directory + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        term_postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        lengths = np.zeros(len(texts), dtype=np.float32)
+        offsets = [0]
+        with open(index._path("chunks.jsonl", tmp_dir), "wb") as f:
+            for row, (text, metadata) in enumerate(zip(texts, metadatas)):
+                tokens = tokenize(text)
+                lengths[row] = len(tokens)
+                for term, count in Counter(tokens).items():
+                    term_postings[term].append((row, min(count, 65535)))
+                line = (json.dumps({"text": text, "metadata": metadata or {}}, ensure_ascii=False) + "\n").encode("utf-8")
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+
+        vocab, postings, tfs = {}, [], []
+        for term in sorted(term_postings):
+            entries = term_postings[term]
+            vocab[term] = [len(postings), len(entries)]
+            postings.extend(row for row, _ in entries)
+            tfs.extend(count for _, count in entries)
+
+        np.save(index._path("postings.npy", tmp_dir), np.asarray(postings, dtype=np.int32))
+        np.save(index._path("tfs.npy", tmp_dir), np.asarray(tfs, dtype=np.uint16))
+        np.save(index._path("lengths.npy", tmp_dir), lengths)
+        np.save(index._path("offsets.npy", tmp_dir), np.asarray(offsets, dtype=np.int64))
+        with open(index._path("vocab.json", tmp_dir), "w", encoding="utf-8") as f:
+            json.dump(vocab, f, separators=(",", ":"))
+        with open(index._path("ids.json", tmp_dir), "w", encoding="utf-8") as f:
+            json.dump(list(ids), f)
+        with open(index._path("meta.json", tmp_dir), "w", encoding="utf-8") as f:
+            json.dump({
+                "version": version,
+                "k1": config.BM25_K1,
+                "b": config.BM25_B,
+                "avgdl": float(lengths.mean()) if len(lengths) else 0.0,
+                "documents": len(texts),
+                "terms": len(vocab),
+            }, f)
+
+        shutil.rmtree(index.directory, ignore_errors=True)
+        os.replace(tmp_dir, index.directory)
+        index._open()
+        return index
+
+    def _document(self, row: int) -> Document:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        record = json.loads(self.chunks[start:end])
+        return Document(page_content=record["text"], metadata=record.get("metadata") or {})
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[Document, float]]:
+        """Top-k chunks by BM25 score (unnormalized, higher is better)."""
+        if not self.ids:
+            return []
+        k1, b = self.meta["k1"], self.meta["b"]
+        avgdl = self.meta["avgdl"] or 1.0
+        total = len(self.ids)
+        scores = np.zeros(total, dtype=np.float32)
+        for term in set(tokenize(query)):
+            entry = self.vocab.get(term)
+            if entry is None:
+                continue
+            start, df = entry
+            rows = np.asarray(self.postings[start:start + df])
+            tf = np.asarray(self.tfs[start:start + df], dtype=np.float32)
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            norm = k1 * (1 - b + b * np.asarray(self.lengths[rows]) / avgdl)
+            scores[rows] += idf * tf * (k1 + 1) / (tf + norm)
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        k = min(k, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(self._document(int(row)), float(scores[row])) for row in top]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int, constant: int = 60) -> List[Tuple[Document, float]]:
+    """Fuse ranked lists by summing 1 / (constant + rank); chunks are identified by their text."""
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = doc.page_content
+            documents.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (constant + rank + 1)
+    top = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [(documents[key], scores[key]) for key in top]
@@ -0,0 +1,309 @@
+"""Shared Groq client: pooled connections, rate limiting, retries and hedged requests."""
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+import groq
+import httpx
+from config import config
+from logging_setup import get_logger
+from metrics import record, registry
+
+logger = get_logger(__name__)
+
+registry.describe("llm_retries_total", "counter", "Groq calls retried, by reason")
+registry.describe("llm_hedged_total", "counter", "Groq calls that launched a hedge request")
+
+# Errors worth retrying: throttling, server faults, and transport failures
+RETRYABLE_ERRORS = (groq.RateLimitError, groq.InternalServerError, groq.APIConnectionError)
+# Timeouts are connection errors too, but a timed-out call already took LLM_TIMEOUT:
+# retrying would hold the worker for several timeouts before the caller's 504
+NON_RETRYABLE_ERRORS = (groq.APITimeoutError,)
+
+
+class TokenBucket:
+    """Token bucket shared by threads and coroutines.
+
+    `reserve()` takes tokens immediately (the balance may go negative) and
+    returns how long the caller must wait, so sync and async callers sleep
+    outside the lock in arrival order.
+    """
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def acquire(self, amount: float = 1.0) -> float:
+        delay = self.reserve(amount)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    async def aacquire(self, amount: float = 1.0) -> float:
+        delay = self.reserve(amount)
+        if delay:
+            await asyncio.sleep(delay)
+        return delay
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait (Retry-After header), if any."""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _estimate_tokens(messages: List[Dict[str, str]]) -> int:
+    # ~4 characters per token is close enough for budgeting against a quota
+    return sum(len(message.get("content") or "") for message in messages) // 4 + 1
+
+
+class LLMClient:
+    """Process-wide Groq access used by every AgentTools instance.
+
+    - one keep-alive connection pool per client (LLM_MAX_CONNECTIONS)
+    - request and token buckets matched to the Groq quota (LLM_REQUESTS_PER_MINUTE,
+      LLM_TOKENS_PER_MINUTE; 0 disables either)
+    - jittered exponential backoff on 429, 5xx and connection errors, honouring
+      Retry-After (LLM_MAX_RETRIES)
+    - per-call timeout (LLM_TIMEOUT); a timed-out call is not retried
+    - optional hedging: if a non-streaming call has not finished after
+      LLM_HEDGE_AFTER seconds, a second identical request races it
+
+    GROQ_BASE_URL points the client at a compatible server such as llm_stub.py.
+    """
+
+    def __init__(self, client=None, async_client=None):
+        self.model = config.GROQ_MODEL
+        self.timeout = config.LLM_TIMEOUT
+        self.max_retries = config.LLM_MAX_RETRIES
+        self.hedge_after = config.LLM_HEDGE_AFTER
+        self.limits = httpx.Limits(
+            max_connections=config.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=config.LLM_MAX_CONNECTIONS,
+        )
+        self.request_bucket = (
+            TokenBucket(config.LLM_REQUESTS_PER_MINUTE, config.LLM_RATE_BURST)
+            if config.LLM_REQUESTS_PER_MINUTE > 0 else None
+        )
+        self.token_bucket = (
+            TokenBucket(config.LLM_TOKENS_PER_MINUTE) if config.LLM_TOKENS_PER_MINUTE > 0 else None
+        )
+
+        self._client = client
+        # An injected async client serves every loop; otherwise one client per event loop
+        self._async_client = async_client
+        self._async_clients: Dict[asyncio.AbstractEventLoop, Any] = {}
+        self._lock = threading.Lock()
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = groq.Groq(
+                    api_key=config.GROQ_API_KEY,
+                    max_retries=0,  # retries are handled here, with backoff and rate limiting
+                    http_client=httpx.Client(limits=self.limits, timeout=self.timeout),
+                )
+            return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is not None:
+            return self._async_client
+        # httpx.AsyncClient pools are bound to the event loop that opened them, so each
+        # loop gets its own client instead of replacing (and leaking) another loop's
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                # A closed loop's pool can no longer be closed from here; just release it
+                for stale in [other for other in self._async_clients if other.is_closed()]:
+                    del self._async_clients[stale]
+                client = self._async_clients[loop] = groq.AsyncGroq(
+                    api_key=config.GROQ_API_KEY,
+                    max_retries=0,
+                    http_client=httpx.AsyncClient(limits=self.limits, timeout=self.timeout),
+                )
+            return client
+
+    async def aclose(self) -> None:
+        """Close the running loop's connection pool, and the sync one (on shutdown)."""
+        with self._lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            client, self._client = self._client, None
+        if isinstance(client, groq.Groq):
+            client.close()
+
+    def _request_args(self, messages: List[Dict[str, str]], stream: bool, max_tokens: int) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": 0,
+            "max_tokens": max_tokens,
+            "stream": stream,
+            "timeout": self.timeout,
+        }
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        delay = min(config.LLM_BACKOFF_MAX, config.LLM_BACKOFF_BASE * (2 ** attempt))
+        delay = random.uniform(0, delay)  # full jitter
+        return max(delay, retry_after(error) or 0.0)
+
+    def _retry_reason(self, error: Exception) -> str:
+        if isinstance(error, groq.RateLimitError):
+            return "rate_limited"
+        if isinstance(error, groq.APIConnectionError):
+            return "connection"
+        return "server_error"
+
+    def _charge_usage(self, response, estimated: int) -> None:
+        """Correct the token bucket with the completion tokens Groq actually reported."""
+        usage = getattr(response, "usage", None)
+        if self.token_bucket is not None and usage is not None:
+            # Streaming responses and some compatible servers leave the counts out
+            used = (getattr(usage, "prompt_tokens", None) or 0) + (getattr(usage, "completion_tokens", None) or 0)
+            self.token_bucket.reserve(max(0, used - estimated))
+
+    # ----- sync ---------------------------------------------------------------
+
+    def _call(self, messages, stream: bool, max_tokens: int):
+        estimated = _estimate_tokens(messages)
+        for attempt in range(self.max_retries + 1):
+            waited = 0.0
+            if self.request_bucket is not None:
+                waited += self.request_bucket.acquire()
+            if self.token_bucket is not None:
+                waited += self.token_bucket.acquire(estimated)
+            if waited:
+                record("ratelimit", waited)
+            try:
+                response = self.client.chat.completions.create(**self._request_args(messages, stream, max_tokens))
+                if not stream:
+                    self._charge_usage(response, estimated)
+                return response
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries or isinstance(e, NON_RETRYABLE_ERRORS):
+                    raise
+                delay = self._backoff(attempt, e)
+                registry.inc("llm_retries_total", reason=self._retry_reason(e))
+                logger.warning("Groq call failed (%s), retry %d/%d in %.2fs",
+                               type(e).__name__, attempt + 1, self.max_retries, delay)
+                time.sleep(delay)
+
+    def complete(self, messages: List[Dict[str, str]], max_tokens: int = 2048):
+        """Chat completion response, hedged when LLM_HEDGE_AFTER is set."""
+        if not self.hedge_after:
+            return self._call(messages, False, max_tokens)
+        with self._lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(thread_name_prefix="llm-hedge")
+        first = self._hedge_pool.submit(self._call, messages, False, max_tokens)
+        done, _ = wait([first], timeout=self.hedge_after)
+        if done:
+            return first.result()
+        registry.inc("llm_hedged_total")
+        pending = {first, self._hedge_pool.submit(self._call, messages, False, max_tokens)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def stream(self, messages: List[Dict[str, str]], max_tokens: int = 2048):
+        """Streaming completion; retries cover opening the stream, not a stream cut mid-way."""
+        return self._call(messages, True, max_tokens)
+
+    # ----- async --------------------------------------------------------------
+
+    async def _acall(self, messages, stream: bool, max_tokens: int):
+        estimated = _estimate_tokens(messages)
+        for attempt in range(self.max_retries + 1):
+            waited = 0.0
+            if self.request_bucket is not None:
+                waited += await self.request_bucket.aacquire()
+            if self.token_bucket is not None:
+                waited += await self.token_bucket.aacquire(estimated)
+            if waited:
+                record("ratelimit", waited)
+            try:
+                response = await self.async_client.chat.completions.create(
+                    **self._request_args(messages, stream, max_tokens)
+                )
+                if not stream:
+                    self._charge_usage(response, estimated)
+                return response
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries or isinstance(e, NON_RETRYABLE_ERRORS):
+                    raise
+                delay = self._backoff(attempt, e)
+                registry.inc("llm_retries_total", reason=self._retry_reason(e))
+                logger.warning("Groq call failed (%s), retry %d/%d in %.2fs",
+                               type(e).__name__, attempt + 1, self.max_retries, delay)
+                await asyncio.sleep(delay)
+
+    async def acomplete(self, messages: List[Dict[str, str]], max_tokens: int = 2048):
+        """Async variant of complete()."""
+        if not self.hedge_after:
+            return await self._acall(messages, False, max_tokens)
+        first = asyncio.ensure_future(self._acall(messages, False, max_tokens))
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+        if done:
+            return first.result()
+        registry.inc("llm_hedged_total")
+        pending = {first, asyncio.ensure_future(self._acall(messages, False, max_tokens))}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise error
+
+    async def astream(self, messages: List[Dict[str, str]], max_tokens: int = 2048):
+        """Async variant of stream()."""
+        return await self._acall(messages, True, max_tokens)
+
+
+_shared_client: Optional[LLMClient] = None
+_shared_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """The process-wide LLM client, created on first use."""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = LLMClient()
+        return _shared_client
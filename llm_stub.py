@@ -0,0 +1,147 @@
+"""Local Groq-compatible chat completions server for tests and benchmarks.
+
+Usage:
+    python llm_stub.py --port 8100 --latency 0.3 --error-rate 0.1
+    GROQ_BASE_URL=http://127.0.0.1:8100 GROQ_API_KEY=stub uvicorn api_main:app
+
+Serves POST /openai/v1/chat/completions (plain and streaming) after a
+configurable delay, and fails a configurable share of calls with 429
+(with Retry-After) or 500 so retry and hedging behaviour can be observed.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+STUB_ANSWER = (
+    "Innovate Inc holds 12% of a $15B AI workflow automation market, "
+    "which is projected to reach $40B by 2030 at a 22% CAGR."
+)
+STUB_JSON = {
+    "company_name": "Innovate Inc.",
+    "report_period": "Q3 2025",
+    "flagship_product": "AutomateX",
+    "market_data": {
+        "current_market_size_billion": 15,
+        "projected_market_size_billion": 40,
+        "cagr_percentage": 22,
+        "projection_year": 2030,
+    },
+    "market_share": {"innovate_inc": 12, "synergy_systems": 18, "futureflow": 15, "quantumleap": 3},
+    "swot": {"strengths": [], "weaknesses": [], "opportunities": [], "threats": []},
+    "strategic_priorities": [],
+}
+
+
+class StubSettings:
+    latency = 0.2          # seconds before the first byte
+    jitter = 0.0           # extra uniform random delay, seconds
+    error_rate = 0.0       # share of calls failing
+    rate_limit_share = 0.5  # of the failures, how many are 429 (the rest are 500)
+    tokens_per_second = 200.0  # streaming speed
+
+
+settings = StubSettings()
+stats = {"requests": 0, "errors": 0, "streams": 0}
+app = FastAPI(title="Groq stub")
+
+
+def _answer_for(messages) -> str:
+    system = " ".join(m.get("content", "") for m in messages if m.get("role") == "system")
+    return json.dumps(STUB_JSON) if "JSON" in system else STUB_ANSWER
+
+
+def _usage(messages, text: str) -> dict:
+    prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4 + 1
+    completion_tokens = len(text) // 4 + 1
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    await asyncio.sleep(settings.latency + random.uniform(0, settings.jitter))
+
+    if random.random() < settings.error_rate:
+        stats["errors"] += 1
+        if random.random() < settings.rate_limit_share:
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+                status_code=429, headers={"retry-after": "0.1"}
+            )
+        return JSONResponse({"error": {"message": "Internal error", "type": "server_error"}}, status_code=500)
+
+    messages = body.get("messages", [])
+    text = _answer_for(messages)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+    model = body.get("model", "stub")
+
+    if not body.get("stream"):
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": _usage(messages, text),
+        }
+
+    stats["streams"] += 1
+
+    async def events():
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            delta = {"content": word if i == 0 else " " + word}
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                     "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            if settings.tokens_per_second:
+                await asyncio.sleep(1 / settings.tokens_per_second)
+        final = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                 "x_groq": {"id": completion_id, "usage": _usage(messages, text)}}
+        yield f"data: {json.dumps(final)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/stats")
+async def stub_stats():
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=settings.latency)
+    parser.add_argument("--jitter", type=float, default=settings.jitter)
+    parser.add_argument("--error-rate", type=float, default=settings.error_rate)
+    parser.add_argument("--rate-limit-share", type=float, default=settings.rate_limit_share,
+                        help="share of failures returned as 429 rather than 500")
+    parser.add_argument("--tokens-per-second", type=float, default=settings.tokens_per_second)
+    args = parser.parse_args()
+
+    settings.latency = args.latency
+    settings.jitter = args.jitter
+    settings.error_rate = args.error_rate
+    settings.rate_limit_share = args.rate_limit_share
+    settings.tokens_per_second = args.tokens_per_second
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Application logging: leveled, sampled, and written by a background thread.
+
+Modules log through `get_logger(__name__)`. Records go through a QueueHandler,
+so the calling thread only checks the level and enqueues; formatting (text or
+JSON) and the actual write happen in a QueueListener thread. Use %-style
+arguments (`logger.info("x=%s", x)`) so suppressed messages are never
+formatted.
+
+Per-request messages pass `extra=SAMPLED` and are kept for roughly
+LOG_SAMPLE_RATE of calls; everything else is always kept when its level is
+enabled.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+from config import config
+
+ROOT_LOGGER = "market_analyst"
+SAMPLED = {"sampled": True}
+
+_configured = False
+_configure_lock = threading.Lock()
+_listener = None
+
+
+class SamplingFilter(logging.Filter):
+    """Drops a share of records marked `sampled` before they are queued."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False) or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+# Message arguments of these types cannot change before the listener formats them
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None))
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stdlib version formats each record in the calling thread. Here the
+    record is passed on as is (the queue is in-process, nothing is pickled),
+    and tracebacks are formatted by the listener too. Only a message with
+    other (possibly mutable) arguments is merged in the calling thread, so it
+    logs the values as they were at the call.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if args and not (isinstance(args, tuple) and all(isinstance(arg, _IMMUTABLE_ARGS) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+def configure_logging(level: str = None, fmt: str = None, sample_rate: float = None) -> None:
+    """Install the queue handler on the application logger (idempotent)."""
+    global _configured, _listener
+    with _configure_lock:
+        if _configured:
+            return
+        level = (level or config.LOG_LEVEL).upper()
+        fmt = (fmt or config.LOG_FORMAT).lower()
+        sample_rate = config.LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+
+        stream_handler = logging.StreamHandler(sys.stderr)
+        if fmt == "json":
+            stream_handler.setFormatter(JsonFormatter())
+        else:
+            stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s %(name)s: %(message)s"))
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = _DeferredQueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter(sample_rate))
+
+        logger = logging.getLogger(ROOT_LOGGER)
+        logger.setLevel(level)
+        logger.addHandler(queue_handler)
+        logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        _configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the application namespace; configures logging on first use."""
+    configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
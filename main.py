@@ -12,18 +12,21 @@ def setup_system():
     # Process document: chunking
     print("\n[1/4] Processing document...")
     processor = DocumentProcessor()
-    chunks = processor.process_document(config.DOCUMENT_PATH)
+    # Generator: chunks are produced page by page while the vector store consumes them
+    chunks = processor.iter_chunks(config.DOCUMENT_PATH)
 
     # Create vector store: embedding + storage
     print("\n[2/4] Creating vector store...")
     vector_store_manager = VectorStoreManager()
-    vector_store = vector_store_manager.create_vector_store(chunks)
+    vector_store = vector_store_manager.sync_vector_store(chunks, processor.settings)
 
     # Initialize agent: autonomous routing
     print("\n[3/4] Initializing agent...")
     retriever = vector_store_manager.get_retriever(k=3)
-    agent = MarketAnalystAgent(retriever)
+    agent = MarketAnalystAgent(retriever, vector_store_manager)
     print("✓ Agent initialized with autonomous routing")
+    if agent.agent_tools.precompute_artifacts(background=False):
+        print("✓ Extraction and summary artifacts ready")
 
     print("\n[4/4] Testing basic pipeline...")
     test_queries = [
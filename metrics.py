@@ -0,0 +1,274 @@
+"""Lightweight timing spans and counters, rendered in the Prometheus text format.
+
+Stages (route, embed, search, prompt, llm, parse) are timed with `span()` or
+`@timed()`. Times are exclusive: a span nested inside another is subtracted
+from its parent, so e.g. "search" excludes the query embedding it triggers.
+Each stage is also added to the current request's timings, which the API
+returns in a Server-Timing header. With METRICS_ENABLED=false, spans are a
+shared no-op context manager.
+"""
+import asyncio
+import contextvars
+import functools
+import math
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
+from config import config
+
+PREFIX = "market_analyst_"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_NOOP = nullcontext()
+_current_span: contextvars.ContextVar[Optional["_Span"]] = contextvars.ContextVar("current_span", default=None)
+_request_timings: contextvars.ContextVar[Optional["RequestTimings"]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Counters, histograms and callback gauges keyed by (name, labels)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], _Histogram] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], Dict[str, float]]]] = {}
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(LATENCY_BUCKETS)
+            histogram.observe(value)
+
+    def register_gauge(self, name: str, help_text: str, label: str,
+                       collect: Callable[[], Dict[str, float]]) -> None:
+        """Gauge evaluated at scrape time; `collect` returns {label value: value}."""
+        self.describe(name, "gauge", help_text)
+        self._gauges[name] = (label, collect)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+        gauges = {}
+        for name, (label, collect) in self._gauges.items():
+            try:
+                gauges[name] = {((label, key),): value for key, value in collect().items()}
+            except Exception:
+                gauges[name] = {}
+
+        def header(name):
+            kind, help_text = self._help.get(name, ("untyped", name))
+            lines.append(f"# HELP {PREFIX}{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        for name in sorted({name for name, _ in counters} | set(gauges)):
+            header(name)
+            samples = gauges.get(name) or {labels: v for (n, labels), v in counters.items() if n == name}
+            for labels, value in sorted(samples.items()):
+                lines.append(f"{PREFIX}{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for name in sorted({name for name, _ in histograms}):
+            header(name)
+            for (n, labels), (counts, total, count) in sorted(histograms.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(LATENCY_BUCKETS, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for key, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return "NaN" if math.isnan(value) else ("+Inf" if value > 0 else "-Inf")
+    return repr(float(value))
+
+
+registry = MetricsRegistry()
+registry.describe("stage_seconds", "histogram", "Exclusive time spent in each pipeline stage")
+registry.describe("http_request_seconds", "histogram", "End-to-end HTTP request latency")
+registry.describe("http_requests_total", "counter", "HTTP requests by path and status code")
+registry.describe("llm_calls_total", "counter", "LLM completions by outcome (groq or cache_hit)")
+registry.describe("llm_tokens_total", "counter", "Tokens reported by Groq, by kind (prompt or completion)")
+registry.describe("context_tokens_total", "counter",
+                  "Estimated context tokens per tool, retrieved (raw) and sent after compression (sent)")
+
+
+class RequestTimings:
+    """Per-request stage totals, shared with worker threads through the copied context."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def count(self, name: str, value: float) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        """Value for a Server-Timing header (durations in milliseconds)."""
+        with self._lock:
+            parts = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in self.stages.items()]
+        if total is not None:
+            parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+class _Span:
+    __slots__ = ("stage", "start", "children", "parent", "token")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self.children = 0.0
+        self.token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        _current_span.reset(self.token)
+        if self.parent is not None:
+            self.parent.children += elapsed
+            if self.parent.stage == self.stage:
+                # Same stage nested in itself (e.g. cache around model): the outer span counts it
+                self.parent.children -= elapsed
+                return False
+        record(self.stage, elapsed - self.children)
+        return False
+
+
+def span(stage: str):
+    """Context manager timing one pipeline stage."""
+    if not config.METRICS_ENABLED:
+        return _NOOP
+    return _Span(stage)
+
+
+def timed(stage: str):
+    """Decorator form of span() for sync functions."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not config.METRICS_ENABLED:
+                return func(*args, **kwargs)
+            with _Span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(stage: str, seconds: float) -> None:
+    """Record stage time measured by the caller (e.g. across a token stream)."""
+    if not config.METRICS_ENABLED:
+        return
+    registry.observe("stage_seconds", seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+def record_llm_call(outcome: str, usage=None) -> None:
+    """Count one completion and the token usage Groq reported for it, if any."""
+    if not config.METRICS_ENABLED:
+        return
+    registry.inc("llm_calls_total", outcome=outcome)
+    if usage is not None:
+        registry.inc("llm_tokens_total", getattr(usage, "prompt_tokens", 0) or 0, kind="prompt")
+        registry.inc("llm_tokens_total", getattr(usage, "completion_tokens", 0) or 0, kind="completion")
+
+
+def record_context_tokens(tool: str, raw_tokens: int, sent_tokens: int) -> None:
+    """Count context tokens before and after compression, and the request's savings."""
+    if not config.METRICS_ENABLED:
+        return
+    registry.inc("context_tokens_total", raw_tokens, tool=tool, kind="raw")
+    registry.inc("context_tokens_total", sent_tokens, tool=tool, kind="sent")
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.count("context_tokens_saved", raw_tokens - sent_tokens)
+
+
+def start_request() -> Tuple[RequestTimings, contextvars.Token]:
+    timings = RequestTimings()
+    return timings, _request_timings.set(timings)
+
+
+def end_request(token: contextvars.Token) -> None:
+    _request_timings.reset(token)
+
+
+class TrackedSemaphore(asyncio.Semaphore):
+    """Semaphore that counts waiting and running holders, for queue-depth gauges."""
+
+    def __init__(self, value: int):
+        super().__init__(value)
+        self.waiting = 0
+        self.in_flight = 0
+
+    async def acquire(self):
+        self.waiting += 1
+        try:
+            await super().acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        super().release()
@@ -0,0 +1,121 @@
+"""LLM response cache with TTL/LRU eviction and optional semantic lookup."""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import numpy as np
+from config import config
+
+
+class _Entry:
+    __slots__ = ("value", "version", "expires_at", "vector")
+
+    def __init__(self, value: Any, version: Optional[str], expires_at: float, vector: Optional[np.ndarray]):
+        self.value = value
+        self.version = version
+        self.expires_at = expires_at
+        self.vector = vector
+
+
+class ResponseCache:
+    """Caches completions keyed by (model, message list hash, document index version).
+
+    Entries expire after a TTL and the least recently used ones are evicted
+    beyond `max_items`. Entries stored with a query embedding can also be
+    found by cosine similarity above `similarity_threshold`.
+    """
+
+    def __init__(self, max_items: Optional[int] = None, ttl_seconds: Optional[float] = None,
+                 similarity_threshold: Optional[float] = None):
+        self.max_items = max_items or config.RESPONSE_CACHE_SIZE
+        self.ttl_seconds = ttl_seconds or config.RESPONSE_CACHE_TTL
+        self.similarity_threshold = (
+            config.SEMANTIC_CACHE_THRESHOLD if similarity_threshold is None else similarity_threshold
+        )
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return 0 < self.similarity_threshold <= 1
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, str]], version: Optional[str]) -> str:
+        payload = json.dumps([model, version, messages], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def get_similar(self, vector: List[float], version: Optional[str]) -> Optional[Any]:
+        """Best entry for the same index version whose query embedding is close enough."""
+        if not self.semantic_enabled:
+            return None
+        query = _normalize(vector)
+        now = time.monotonic()
+        best_key, best_score = None, self.similarity_threshold
+        with self._lock:
+            for key, entry in self._entries.items():
+                if entry.vector is None or entry.version != version or entry.expires_at < now:
+                    continue
+                score = float(np.dot(query, entry.vector))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            self.semantic_hits += 1
+            return self._entries[best_key].value
+
+    def set(self, key: str, value: Any, version: Optional[str], vector: Optional[List[float]] = None) -> None:
+        entry = _Entry(
+            value,
+            version,
+            time.monotonic() + self.ttl_seconds,
+            _normalize(vector) if vector is not None and self.semantic_enabled else None,
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keep_version: Optional[str] = None) -> None:
+        """Drop every entry not built against `keep_version` (all entries if None)."""
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if keep_version is None or e.version != keep_version]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            hits = self.hits + self.semantic_hits
+            total = hits + self.misses
+            return {
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_ratio": hits / total if total else 0.0,
+                "items": len(self._entries),
+                "capacity": self.max_items,
+            }
+
+
+def _normalize(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
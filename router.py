@@ -0,0 +1,192 @@
+"""Query routing: explicit-command rules, then nearest labeled exemplars in embedding space."""
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from config import config
+from metrics import timed
+
+ROUTES = ("qa", "summarize", "extract")
+
+# Labeled example queries per route; a query goes to the route whose examples it is closest to
+ROUTE_EXEMPLARS: Dict[str, List[str]] = {
+    "extract": [
+        "Extract the key metrics as JSON",
+        "Give me the structured data from the report",
+        "Return company name, market size and growth rate as JSON",
+        "Pull out all the numbers into a table",
+        "List every key figure in a machine-readable format",
+        "Extract market share, CAGR and competitors",
+        "Output the report's key fields as structured output",
+        "Dump the main data points as key-value pairs",
+    ],
+    "summarize": [
+        "Summarize the report",
+        "Give me an overview of the market",
+        "What are the key takeaways?",
+        "Provide an executive summary",
+        "Summarize the competitive landscape",
+        "Give me a summary of the SWOT analysis",
+        "Briefly describe the whole document",
+        "What is this report about at a high level?",
+    ],
+    "qa": [
+        "What is the current market size?",
+        "Who are the main competitors?",
+        "What data sources does the report use?",
+        "What is Innovate Inc's market share?",
+        "How fast is the market expected to grow?",
+        "What are the weaknesses in the SWOT analysis?",
+        "Which data privacy regulations are mentioned?",
+        "When was the flagship product launched?",
+        "What is the projected CAGR through 2030?",
+        "How does the company use customer data?",
+    ],
+}
+
+# Unambiguous commands that need no classifier
+_EXPLICIT_RULES = [
+    ("extract", re.compile(r"\b(extract|json)\b|\bstructured (data|output)\b")),
+    ("summarize", re.compile(r"\b(summari[sz]e|summary|overview)\b")),
+]
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def keyword_route(query: str) -> str:
+    """Rule-only routing, used when no embedding model is available."""
+    text = normalize_query(query)
+    for route, pattern in _EXPLICIT_RULES:
+        if pattern.search(text):
+            return route
+    return "qa"
+
+
+class QueryRouter:
+    """Classifies queries into "qa", "summarize" or "extract".
+
+    Explicit commands ("extract ... as JSON", "summarize ...") are matched by
+    rule. Everything else is embedded with the store's already-loaded model
+    and compared against ROUTE_EXEMPLARS: each route scores the mean of its
+    two closest exemplars, and summarize/extract must also clear
+    ROUTER_MIN_SIMILARITY, otherwise the query falls back to the cheap Q&A
+    path. Decisions are cached per normalized query.
+    """
+
+    def __init__(self, vector_store_manager=None, exemplars: Optional[Dict[str, List[str]]] = None,
+                 cache_size: Optional[int] = None, min_similarity: Optional[float] = None):
+        self.vector_store_manager = vector_store_manager
+        self.exemplars = exemplars or ROUTE_EXEMPLARS
+        self.cache_size = cache_size or config.ROUTER_CACHE_SIZE
+        self.min_similarity = config.ROUTER_MIN_SIMILARITY if min_similarity is None else min_similarity
+
+        # (labels, normalized exemplar vectors), published together once built
+        self._exemplars: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._exemplars_lock = threading.Lock()
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def uses_embeddings(self) -> bool:
+        return config.ROUTER_MODE == "embedding" and self.vector_store_manager is not None
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.asarray(self.vector_store_manager.embed_queries(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.clip(norms, 1e-12, None)
+
+    def _exemplar_matrix(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Exemplar labels and vectors, embedded once; concurrent first queries wait for one build."""
+        exemplars = self._exemplars
+        if exemplars is None:
+            with self._exemplars_lock:
+                exemplars = self._exemplars
+                if exemplars is None:
+                    labels, texts = [], []
+                    for route, queries in self.exemplars.items():
+                        labels.extend([route] * len(queries))
+                        texts.extend(queries)
+                    exemplars = self._exemplars = (np.asarray(labels), self._embed(texts))
+        return exemplars
+
+    def _classify(self, vector: np.ndarray) -> str:
+        labels, matrix = self._exemplar_matrix()
+        similarities = matrix @ vector
+        scores = {}
+        for route in self.exemplars:
+            top = np.sort(similarities[labels == route])[-2:]
+            scores[route] = float(top.mean()) if top.size else -1.0
+        best = max(scores, key=scores.get)
+        if best != "qa" and scores[best] < self.min_similarity:
+            return "qa"
+        return best
+
+    def route(self, query: str) -> str:
+        return self.route_many([query])[0]
+
+    @timed("route")
+    def route_many(self, queries: List[str]) -> List[str]:
+        """Routes for several queries, embedding the uncached ones in one batch."""
+        keys = [normalize_query(query) for query in queries]
+        routes: List[Optional[str]] = [None] * len(queries)
+        pending = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    routes[i] = cached
+                else:
+                    self.misses += 1
+                    pending.append(i)
+
+        embed_indexes = []
+        for i in pending:
+            route = keyword_route(keys[i])
+            if route != "qa" or not self.uses_embeddings:
+                routes[i] = route
+            else:
+                embed_indexes.append(i)
+        if embed_indexes:
+            vectors = self._embed([queries[i] for i in embed_indexes])
+            for i, vector in zip(embed_indexes, vectors):
+                routes[i] = self._classify(vector)
+
+        with self._lock:
+            for i in pending:
+                self._cache[keys[i]] = routes[i]
+                self._cache.move_to_end(keys[i])
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return routes
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "mode": "embedding" if self.uses_embeddings else "keyword",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "cached_routes": len(self._cache),
+            }
+
+
+_shared_routers: Dict[Optional[str], QueryRouter] = {}
+_shared_routers_lock = threading.Lock()
+
+
+def get_shared_router(vector_store_manager=None) -> QueryRouter:
+    """One router per embedding model, shared by every agent: routes do not depend on the document."""
+    key = getattr(vector_store_manager, "embedding_id", None)
+    with _shared_routers_lock:
+        router = _shared_routers.get(key)
+        if router is None:
+            router = _shared_routers[key] = QueryRouter(vector_store_manager)
+        return router
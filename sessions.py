@@ -0,0 +1,193 @@
+"""Server-side conversation state: recent turns within a token budget plus a rolling summary."""
+import asyncio
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+from config import config
+from context import estimate_tokens
+
+# Messages that lean on earlier turns: leading connectives ("what about X") or
+# demonstratives, personal pronouns anywhere, and bare question words ("why?")
+_FOLLOW_UP = re.compile(
+    r"^\s*(and|but|also|so|then|what about|how about|same for|compared to|this|that|these|those)\b"
+    r"|\b(it|its|they|them|their|theirs|he|she|his|her|the previous|the former|the latter)\b"
+    r"|^\s*(why|how|when|where|which|who|what)\b\W*(\w+\W*)?$",
+    re.IGNORECASE,
+)
+
+
+def is_follow_up(message: str) -> bool:
+    """Whether a message probably needs earlier turns to be understood."""
+    return bool(_FOLLOW_UP.search(message))
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    """Cut text to roughly `max_tokens` (same ~4 characters per token estimate as the context budget)."""
+    limit = max_tokens * 4
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + " ..."
+
+
+def format_turns(turns: List[Dict[str, str]]) -> str:
+    return "\n".join(f"{turn['role'].capitalize()}: {turn['content']}" for turn in turns)
+
+def extractive_summary(summary: str, turns: List[Dict[str, str]], max_tokens: int) -> str:
+    """Summary without an LLM call: one line per user question with the start of its answer."""
+    lines = summary.splitlines() if summary else []
+    for turn in turns:
+        first_sentence = re.split(r"(?<=[.!?])\s", turn["content"].strip(), maxsplit=1)[0]
+        prefix = "Asked" if turn["role"] == "user" else "Answer"
+        lines.append(f"{prefix}: {_clip(first_sentence, 60)}")
+    # Drop the oldest lines first
+    while lines and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class Conversation:
+    """Compact history of one chat.
+
+    Recent turns are kept verbatim while they fit SESSION_WINDOW_TOKENS; older
+    turns are folded into a summary capped at SESSION_SUMMARY_TOKENS. Each
+    fold only reads the previous summary and the turns leaving the window, so
+    the work per turn stays constant however long the chat runs. Turns are
+    stored in full for display; prompts see each one clipped to half the
+    window, which is also what it counts against the window.
+    """
+
+    def __init__(self, window_tokens: Optional[int] = None, summary_tokens: Optional[int] = None):
+        self.window_tokens = window_tokens or config.SESSION_WINDOW_TOKENS
+        self.summary_tokens = summary_tokens or config.SESSION_SUMMARY_TOKENS
+        self.turns: List[Dict[str, str]] = []
+        self.summary = ""
+        self.total_turns = 0
+
+    @classmethod
+    def from_messages(cls, messages: List[Dict[str, str]], window_tokens: Optional[int] = None) -> "Conversation":
+        """Window over a client-supplied message list; turns beyond the budget are dropped, not summarized."""
+        conversation = cls(window_tokens)
+        for message in messages:
+            conversation.add(message["role"], message["content"])
+        conversation.overflow()
+        return conversation
+
+    def __bool__(self) -> bool:
+        return bool(self.turns or self.summary)
+
+    def _tokens(self) -> int:
+        # A single long answer (e.g. extracted JSON) must not crowd out the rest of the window
+        return sum(min(estimate_tokens(turn["content"]), self.window_tokens // 2) for turn in self.turns)
+
+    def prompt_turns(self, turns: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+        """Recent turns (or `turns`) as they are sent to the LLM, each clipped to half the window."""
+        return [dict(turn, content=_clip(turn["content"], self.window_tokens // 2))
+                for turn in (self.turns if turns is None else turns)]
+
+    def add(self, role: str, content: str) -> None:
+        self.turns.append({"role": role, "content": content})
+        self.total_turns += 1
+
+    def overflow(self) -> List[Dict[str, str]]:
+        """Remove and return the oldest turns until the window fits (the last exchange always stays)."""
+        removed = []
+        while len(self.turns) > 2 and self._tokens() > self.window_tokens:
+            removed.append(self.turns.pop(0))
+        return removed
+
+    def fold(self, summarize: Callable[[str, List[Dict[str, str]]], str]) -> bool:
+        """Fold turns that left the window into the summary; True if anything was folded."""
+        older = self.overflow()
+        if not older:
+            return False
+        self.summary = _clip(summarize(self.summary, self.prompt_turns(older)), self.summary_tokens)
+        return True
+
+    async def afold(self, summarize) -> bool:
+        """Async variant of fold(); `summarize` is a coroutine function."""
+        older = self.overflow()
+        if not older:
+            return False
+        self.summary = _clip(await summarize(self.summary, self.prompt_turns(older)), self.summary_tokens)
+        return True
+
+    def history_text(self) -> str:
+        """Summary and recent turns as plain text, for prompts."""
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of earlier conversation:\n{self.summary}")
+        if self.turns:
+            parts.append(format_turns(self.prompt_turns()))
+        return "\n\n".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "turns": list(self.turns),
+            "summary": self.summary,
+            "total_turns": self.total_turns,
+            "window_tokens_used": self._tokens(),
+        }
+
+
+class Session:
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.conversation = Conversation()
+        self.created = time.time()
+        # Turns of one session are processed in order
+        self.lock = asyncio.Lock()
+
+
+class SessionStore:
+    """Conversations keyed by session ID.
+
+    Sessions idle for longer than SESSION_IDLE_SECONDS are dropped, and the
+    least recently used ones beyond MAX_SESSIONS, checked on each access.
+    """
+
+    def __init__(self, max_sessions: Optional[int] = None, idle_seconds: Optional[float] = None):
+        self.max_sessions = max_sessions or config.MAX_SESSIONS
+        self.idle_seconds = idle_seconds or config.SESSION_IDLE_SECONDS
+        self._lock = threading.Lock()
+        # session id -> (session, last used)
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self.evicted = 0
+
+    def get(self, session_id: Optional[str] = None) -> Session:
+        """The session for an ID, created if missing (a new random ID when none is given)."""
+        with self._lock:
+            session_id = session_id or uuid.uuid4().hex
+            entry = self._sessions.get(session_id)
+            session = entry[0] if entry is not None else Session(session_id)
+            self._sessions[session_id] = (session, time.monotonic())
+            self._sessions.move_to_end(session_id)
+            self._evict()
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def _evict(self) -> None:
+        # Least recently used first, so idle sessions are all at the front
+        now = time.monotonic()
+        while self._sessions:
+            _, used = next(iter(self._sessions.values()))
+            if now - used <= self.idle_seconds and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            self._evict()
+            return session_id in self._sessions
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"active": len(self._sessions), "evicted": self.evicted}
@@ -0,0 +1,118 @@
+"""Single-flight request coalescing: concurrent identical calls share one execution."""
+import asyncio
+import copy
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Hashable, Tuple
+from metrics import record, registry
+
+registry.describe("coalesced_calls_total", "counter",
+                  "Tool calls by outcome: executed, or collapsed onto an identical in-flight call")
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; callers arriving meanwhile wait for it.
+
+    The first caller (the leader) executes; followers get the leader's result,
+    or its exception. Followers receive a deep copy so a caller mutating its
+    result (e.g. an extraction dict) cannot affect the others. Keys are
+    forgotten as soon as the call finishes, so this coalesces, it does not
+    cache. Sync (threads) and async (per event loop) calls are tracked separately.
+    A call made from inside the leader with the same key runs directly, so
+    wrapping layers (an endpoint and the tool it calls) may share a key.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Tuple[Future, int]] = {}
+        self._tasks: Dict[Tuple[Any, Hashable], asyncio.Task] = {}
+        self.executed = 0
+        self.collapsed = 0
+
+    def _count(self, tool: str, leader: bool) -> None:
+        outcome = "executed" if leader else "collapsed"
+        with self._lock:
+            if leader:
+                self.executed += 1
+            else:
+                self.collapsed += 1
+        registry.inc("coalesced_calls_total", tool=tool, outcome=outcome)
+
+    def do(self, key: Tuple[str, Hashable], func, *args):
+        """Call `func(*args)` unless an identical call is already running; key[0] names the tool."""
+        thread = threading.get_ident()
+        with self._lock:
+            entry = self._calls.get(key)
+            if entry is not None and entry[1] == thread:
+                entry = None
+                reentrant = True
+            else:
+                reentrant = False
+            leader = entry is None
+            if leader and not reentrant:
+                future = Future()
+                self._calls[key] = (future, thread)
+        if reentrant:
+            return func(*args)
+        self._count(key[0], leader)
+
+        if not leader:
+            started = time.perf_counter()
+            result = entry[0].result()
+            record("coalesce", time.perf_counter() - started)
+            return copy.deepcopy(result)
+
+        try:
+            result = func(*args)
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._calls.pop(key, None)
+        future.set_result(result)
+        return result
+
+    async def ado(self, key: Tuple[str, Hashable], func, *args):
+        """Async variant of do(); `func(*args)` returns a coroutine.
+
+        The shared call runs as its own task, so a cancelled leader (e.g. a
+        disconnected client) does not cancel the followers' result.
+        """
+        loop = asyncio.get_running_loop()
+        task_key = (loop, key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            if task is not None and task is asyncio.current_task():
+                reentrant, leader = True, False
+            else:
+                reentrant, leader = False, task is None
+            if leader:
+                task = self._tasks[task_key] = loop.create_task(func(*args))
+                task.add_done_callback(lambda _: self._forget(task_key))
+        if reentrant:
+            return await func(*args)
+        self._count(key[0], leader)
+
+        if leader:
+            return await asyncio.shield(task)
+        started = time.perf_counter()
+        result = await asyncio.shield(task)
+        record("coalesce", time.perf_counter() - started)
+        return copy.deepcopy(result)
+
+    def _forget(self, task_key) -> None:
+        with self._lock:
+            self._tasks.pop(task_key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.executed + self.collapsed
+            return {
+                "executed": self.executed,
+                "collapsed": self.collapsed,
+                "in_flight": len(self._calls) + len(self._tasks),
+                "collapse_ratio": round(self.collapsed / total, 4) if total else 0.0,
+            }
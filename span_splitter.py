@@ -0,0 +1,218 @@
+"""Sentence-aware text splitter producing chunks as (start, end) spans over one buffer."""
+import re
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+from langchain.schema import Document
+from config import config
+
+Span = Tuple[int, int]
+
+# Breaks are whitespace: line breaks (paragraphs are blank lines), sentence ends,
+# and any other whitespace run as the weakest (word) break
+_NEWLINE = re.compile(r"\n")
+_SENTENCE_END = re.compile(r"[.!?][\"'”’)\]]*\s")
+_WHITESPACE = re.compile(r"\s+")
+_WORD_START = re.compile(r"(?<=\s)\S")
+
+_tokenizers = {}
+
+
+def _token_offsets(model_name: str) -> Callable[[str], List[Span]]:
+    """Character span of every token the embedding model's tokenizer produces."""
+    tokenizer = _tokenizers.get(model_name)
+    if tokenizer is None:
+        try:
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError(
+                "Token-based chunking needs the model tokenizer. Please run: pip install transformers"
+            ) from e
+        tokenizer = _tokenizers[model_name] = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+
+    def offsets(text: str) -> List[Span]:
+        encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True,
+                             truncation=False, verbose=False)
+        return [span for span in encoding["offset_mapping"] if span[1] > span[0]]
+
+    return offsets
+
+
+class Boundaries:
+    """Break offsets of one text, found in a single scan per kind.
+
+    A break is a position inside a whitespace run: a chunk may end where the
+    run starts and the next chunk begins where it ends. `ends` holds the
+    sorted paragraph, sentence and line break offsets, strongest first, so
+    choosing a chunk end is a bisect rather than a rescan. Single line breaks
+    rank below sentence ends since extracted PDF text wraps lines anywhere.
+    Word breaks are only looked up in a window without any of these.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        lines = [m.start() for m in _NEWLINE.finditer(text)]
+        paragraphs = [b for a, b in zip(lines, lines[1:]) if a + 1 == b or text[a + 1:b].isspace()]
+        sentences = [m.end() - 1 for m in _SENTENCE_END.finditer(text)]
+        self.ends = [paragraphs, sentences, lines]
+        leading = _WHITESPACE.match(text)
+        self.first = leading.end() if leading else 0
+        self.last = len(text.rstrip())
+
+    def run_start(self, position: int) -> int:
+        """Start of the whitespace run containing `position`."""
+        text = self.text
+        while position > 0 and text[position - 1].isspace():
+            position -= 1
+        return position
+
+    def content_after(self, position: int) -> int:
+        """Where text resumes after the whitespace run containing `position`."""
+        run = _WHITESPACE.match(self.text, position)
+        return run.end() if run else position
+
+    def last_space(self, start: int, limit: int) -> Optional[int]:
+        """Start of the last whitespace run in (start, limit], if any."""
+        position = None
+        for run in _WHITESPACE.finditer(self.text, start + 1, limit + 1):
+            position = run.start()
+        return position
+
+    def overlap_start(self, earliest: int, end: int) -> Optional[int]:
+        """First paragraph or sentence start in [earliest, end), else the first word start, if any."""
+        starts = []
+        for breaks in self.ends[:2]:
+            index = bisect_left(breaks, earliest)
+            if index < len(breaks):
+                starts.append(self.content_after(breaks[index]))
+        if starts and min(starts) < end:
+            return min(starts)
+        word = _WORD_START.search(self.text, earliest, end)
+        return word.start() if word else None
+
+
+class SpanSplitter:
+    """Splits text into overlapping chunks at the strongest nearby boundary.
+
+    Each chunk ends at the last paragraph break in its window if one lies in
+    the second half, else the last sentence end, line break or space, and
+    only cuts mid-word when the window has no whitespace at all. The next
+    chunk starts up to `chunk_overlap` back, at a sentence start if there is
+    one, else a word start. Sizes are characters, or tokens of the embedding
+    model when `length_unit` is "tokens" (so no chunk is truncated by it).
+
+    The text is scanned once for boundaries (and tokenized once in token
+    mode); chunks are spans over the original string, sliced only at the end.
+    Compatible with the split_text/split_documents interface of LangChain splitters.
+    """
+
+    def __init__(self, chunk_size: int, chunk_overlap: int, length_unit: str = "chars",
+                 model_name: Optional[str] = None,
+                 token_offsets: Optional[Callable[[str], List[Span]]] = None):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"Chunk overlap ({chunk_overlap}) must be smaller than chunk size ({chunk_size})")
+        if length_unit not in ("chars", "tokens"):
+            raise ValueError(f"Unknown chunk length unit: {length_unit}")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.length_unit = length_unit
+        self.model_name = model_name or config.EMBEDDING_MODEL_NAME
+        self._token_offsets = token_offsets
+
+    def __getstate__(self):
+        # The tokenizer is loaded again in worker processes
+        state = dict(self.__dict__)
+        state["_token_offsets"] = None
+        return state
+
+    def _measure(self, text: str) -> Tuple[Callable[[int], Tuple[int, int]], Callable[[int, int], int]]:
+        """`window(start)` -> (earliest preferred end, furthest end), and `back(start, end)` -> overlap start."""
+        size, overlap = self.chunk_size, self.chunk_overlap
+        if self.length_unit == "chars":
+            def window(start):
+                return start + size // 2, start + size
+
+            def back(start, end):
+                return end - overlap
+            return window, back
+
+        if self._token_offsets is None:
+            self._token_offsets = _token_offsets(self.model_name)
+        tokens = self._token_offsets(text)
+        token_starts = [start for start, _ in tokens]
+        token_ends = [end for _, end in tokens]
+
+        def window(start):
+            first = bisect_right(token_ends, start)
+            if first + size > len(token_ends):
+                return len(text), len(text)
+            return token_ends[first + size // 2 - 1], token_ends[first + size - 1]
+
+        def back(start, end):
+            last = bisect_right(token_ends, end) - 1
+            return token_starts[max(last - overlap + 1, bisect_right(token_ends, start))]
+        return window, back
+
+    def split_spans(self, text: str) -> List[Span]:
+        """(start, end) offsets of each chunk; chunks never start or end with whitespace."""
+        if not text or text.isspace():
+            return []
+        boundaries = Boundaries(text)
+        window, back = self._measure(text)
+        spans = []
+        start = boundaries.first
+        while start < boundaries.last:
+            preferred, limit = window(start)
+            if limit >= boundaries.last:
+                spans.append((start, boundaries.last))
+                break
+
+            end = None
+            for ends in boundaries.ends:
+                # Paragraph, sentence and line breaks only count in the second half of the window
+                index = bisect_right(ends, limit) - 1
+                if index >= 0 and ends[index] > preferred:
+                    end = boundaries.run_start(ends[index])
+                    break
+            if end is None:
+                end = boundaries.last_space(start, limit)
+            if end is None:
+                # No whitespace in the window: cut mid-word
+                end = resume = max(limit, start + 1)
+            else:
+                resume = boundaries.content_after(end)
+            spans.append((start, end))
+
+            next_start = resume
+            if self.chunk_overlap:
+                earliest = max(back(start, end), start + 1)
+                overlap_start = boundaries.overlap_start(earliest, end)
+                if overlap_start is not None:
+                    next_start = overlap_start
+                elif resume == end:
+                    next_start = earliest
+            start = next_start
+        return spans
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def split_many(self, texts: Sequence[str], workers: Optional[int] = None) -> List[List[Span]]:
+        """Spans for several texts, split in a process pool when there is more than one."""
+        workers = config.INGEST_WORKERS if workers is None else workers
+        if len(texts) <= 1 or workers <= 1:
+            return [self.split_spans(text) for text in texts]
+        with ProcessPoolExecutor(max_workers=min(workers, len(texts))) as pool:
+            # Only spans come back, not chunk text
+            return list(pool.map(self.split_spans, texts, chunksize=max(1, len(texts) // (workers * 4))))
+
+    def split_documents(self, documents: Iterable[Document], workers: Optional[int] = None) -> List[Document]:
+        """Chunk documents, in parallel across documents, keeping their metadata."""
+        documents = list(documents)
+        chunks = []
+        for document, spans in zip(documents, self.split_many([d.page_content for d in documents], workers)):
+            text = document.page_content
+            chunks.extend(Document(page_content=text[start:end], metadata=dict(document.metadata))
+                          for start, end in spans)
+        return chunks
+
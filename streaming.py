@@ -0,0 +1,62 @@
+"""Helpers for streaming LLM output: live <think> separation and SSE framing."""
+import json
+from typing import List, Tuple
+
+
+class ThinkStreamSplitter:
+    """Splits a token stream into ("think", text) and ("answer", text) events.
+
+    Tags may arrive split across tokens, so a possible partial tag at the end
+    of the buffer is held back until the next token decides it.
+    """
+
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self):
+        self._buffer = ""
+        self.in_think = False
+
+    def _kind(self) -> str:
+        return "think" if self.in_think else "answer"
+
+    def feed(self, text: str) -> List[Tuple[str, str]]:
+        self._buffer += text
+        events = []
+        while self._buffer:
+            tag = self.CLOSE_TAG if self.in_think else self.OPEN_TAG
+            index = self._buffer.lower().find(tag)
+            if index >= 0:
+                if index:
+                    events.append((self._kind(), self._buffer[:index]))
+                self._buffer = self._buffer[index + len(tag):]
+                self.in_think = not self.in_think
+                continue
+
+            held = _partial_tag_length(self._buffer.lower(), tag)
+            emit = self._buffer[:len(self._buffer) - held]
+            if emit:
+                events.append((self._kind(), emit))
+            self._buffer = self._buffer[len(emit):]
+            break
+        return events
+
+    def flush(self) -> List[Tuple[str, str]]:
+        if not self._buffer:
+            return []
+        events = [(self._kind(), self._buffer)]
+        self._buffer = ""
+        return events
+
+
+def _partial_tag_length(text: str, tag: str) -> int:
+    """Length of the longest suffix of `text` that is a proper prefix of `tag`."""
+    for length in range(min(len(text), len(tag) - 1), 0, -1):
+        if tag.startswith(text[-length:]):
+            return length
+    return 0
+
+
+def sse_event(event: str, data) -> str:
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
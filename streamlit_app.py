@@ -3,44 +3,67 @@ from config import config
 from document_processor import DocumentProcessor
 from vector_store import VectorStoreManager
 from agent import MarketAnalystAgent
+from document_registry import DocumentRegistry, document_id_for_bytes
+from ingest_jobs import IngestQueue
+from streaming import ThinkStreamSplitter
+from sessions import Conversation
+from logging_setup import get_logger, SAMPLED
 import json
 import tempfile
 import os
 
+logger = get_logger("streamlit_app")
+
 st.set_page_config(
     page_title="Agentic Market Analyst – VAIA Residency",
     page_icon="🤖",
     layout="wide"
 )
 
-def process_user_document(uploaded_file):
-    # Save uploaded file safely
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(uploaded_file.name)[1]) as tmp:
-        tmp.write(uploaded_file.read())
-        tmp.flush()
-        doc_path = tmp.name
+@st.cache_resource
+def document_registry():
+    # One registry (and one embedding model) shared by every session
+    return DocumentRegistry()
 
-    # Process the document
-    processor = DocumentProcessor()
-    chunks = processor.process_document(doc_path)
-    if not chunks or len(chunks) == 0:
-        return None, None  # Signal to UI to show error and skip rest
+@st.cache_resource
+def ingest_queue():
+    # Uploads are indexed on a background thread shared by every session
+    return IngestQueue(document_registry())
 
-    # Usual vector store and agent setup
-    vector_store_manager = VectorStoreManager()
-    vector_store_manager.create_vector_store(chunks)
-    retriever = vector_store_manager.get_retriever(k=3)
-    agent = MarketAnalystAgent(retriever)
-    return agent, doc_path
+def process_user_document(uploaded_file):
+    # Identify the upload by content: reruns and re-uploads reuse the finished index
+    doc_id = document_id_for_bytes(uploaded_file.getvalue())
+    registry = document_registry()
+    if registry.get(doc_id) is not None:
+        return registry.get_agent([doc_id]), doc_id, None
+
+    # The session keeps each upload's job: reruns poll it, and a failed upload is not submitted again
+    jobs = st.session_state.setdefault("ingest_jobs", {})
+    job = jobs.get(doc_id)
+    if job is None:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(uploaded_file.name)[1]) as tmp:
+            tmp.write(uploaded_file.getvalue())
+        job = ingest_queue().submit(tmp.name, name=uploaded_file.name, remove_after=True, document_id=doc_id)
+        jobs[doc_id] = job
+    return None, doc_id, job
+
+@st.fragment(run_every=0.5)
+def indexing_progress(job):
+    # Only this fragment reruns while indexing; the rest of the page stays usable
+    if job.finished:
+        if job.status == "failed":
+            logger.warning("Indexing %s failed: %s", job.name, job.error)
+        st.rerun()
+    st.progress(job.progress() or 0.0, text=f"Indexing '{job.name}': {job.chunks} chunks")
 
 @st.cache_resource
 def default_pipeline():
     processor = DocumentProcessor()
-    chunks = processor.process_document(config.DOCUMENT_PATH)
     vector_store_manager = VectorStoreManager()
-    vector_store_manager.create_vector_store(chunks)
+    vector_store_manager.sync_vector_store(processor.iter_chunks(config.DOCUMENT_PATH), processor.settings)
     retriever = vector_store_manager.get_retriever(k=3)
-    agent = MarketAnalystAgent(retriever)
+    agent = MarketAnalystAgent(retriever, vector_store_manager)
+    agent.agent_tools.precompute_artifacts(background=True)
     return agent
 
 # __ UPLOAD HANDLER IN SIDEBAR __
@@ -57,18 +80,23 @@ with st.sidebar:
     """)
     uploaded_file = st.file_uploader("Upload market research `.txt` or `.pdf`", type=["txt", "pdf"])
     if uploaded_file:
-        agent_handle, doc_path = process_user_document(uploaded_file)
-        if agent_handle is None:
+        agent_handle, doc_id, job = process_user_document(uploaded_file)
+        if job is not None and job.status == "failed":
             st.error("❌ Sorry, we couldn't extract usable text from that document. Try a different file (TXT or a PDF with selectable/copyable text).")
             st.stop()
-        st.success(f"✅ Successfully uploaded and indexed '{uploaded_file.name}'!")
-        st.session_state.agent = agent_handle
-        st.session_state.cur_doc = doc_path
-        st.session_state.chat_history = []
-    else:
-        if "agent" not in st.session_state:
-            st.session_state.agent = default_pipeline()
-            st.session_state.cur_doc = config.DOCUMENT_PATH
+        if agent_handle is None:
+            # Still indexing: answers come from the current document until it is done
+            indexing_progress(job)
+        else:
+            st.success(f"✅ Successfully uploaded and indexed '{uploaded_file.name}'!")
+            st.session_state.agent = agent_handle
+            if st.session_state.get("cur_doc") != doc_id:
+                # A different document starts a new conversation; reruns keep the current one
+                st.session_state.cur_doc = doc_id
+                st.session_state.conversation = Conversation()
+    if "agent" not in st.session_state:
+        st.session_state.agent = default_pipeline()
+        st.session_state.cur_doc = config.DOCUMENT_PATH
 
     st.caption("You can use the default Innovate Inc. doc, or upload your own.")
 
@@ -84,61 +112,76 @@ mode = st.radio(
     ["💬 Q&A Chat", "📝 Summarize", "📊 Extract Structured Data"],
     horizontal=True
 )
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+if "conversation" not in st.session_state:
+    # Recent turns within SESSION_WINDOW_TOKENS, older ones kept only as a summary
+    st.session_state.conversation = Conversation()
 
 agent = st.session_state.agent
 
-def parse_agent_response(text):
-    # If the answer includes a <think>...</think> block, split it
-    import re
-    think_match = re.search(r"<think>(.*?)</think>", text, re.DOTALL | re.IGNORECASE)
-    if think_match:
-        think = think_match.group(1).strip()
-        result = re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL | re.IGNORECASE).strip()
-        return think, result
-    return None, text
+def render_agent_stream(tokens):
+    # Render tokens as they arrive, keeping any <think>...</think> block in its own box
+    think_box = st.empty()
+    answer_box = st.empty()
+    splitter = ThinkStreamSplitter()
+    think, result = "", ""
+
+    def render(events):
+        nonlocal think, result
+        for kind, text in events:
+            if kind == "think":
+                think += text
+                think_box.info(f"🤔 Thinking...\n\n{think.strip()}")
+            else:
+                result += text
+                answer_box.markdown(f"🤖 {result.strip()}")
+
+    for token in tokens:
+        render(splitter.feed(token))
+    render(splitter.flush())
+    return think.strip() or None, result.strip()
 
 if mode == "💬 Q&A Chat":
     st.markdown("#### Ask open-ended questions about your uploaded document or the default report.")
 
+    conversation = st.session_state.conversation
+
     # Display chat messages from history on app rerun
-    for message in st.session_state.chat_history:
+    if conversation.summary:
+        with st.expander("Earlier conversation (summarized)"):
+            st.markdown(conversation.summary)
+    for message in conversation.turns:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
 
     # Accept user input
     if prompt := st.chat_input("Ask the agent your question..."):
-        # Add user message to chat history
-        st.session_state.chat_history.append({"role": "user", "content": prompt})
         # Display user message in chat message container
         with st.chat_message("user"):
             st.markdown(prompt)
 
         # Display assistant response in chat message container
         with st.chat_message("assistant"):
-            with st.spinner("Agent thinking..."):
-                try:
-                    raw_answer = agent.process_query(prompt)
-                    print(f"[DEBUG] Full agent answer: {raw_answer}")
-                    think, result = parse_agent_response(raw_answer)
-
-                    if think:
-                        st.info(f"🤔 Thinking...\n\n{think}")
-                    
-                    st.markdown(f"🤖 {result}")
-                    answer_for_history = result
-
-                except Exception as e:
-                    answer_for_history = f"Error: {str(e)}"
-                    print(f"[ERROR] {e}")
-                    st.error(answer_for_history)
+            try:
+                # Follow-ups ("what about FutureFlow?") become standalone questions
+                query = agent.agent_tools.rewrite_query(prompt, conversation)
+                if query != prompt:
+                    st.caption(f"Interpreted as: {query}")
+                think, result = render_agent_stream(agent.stream_query(query))
+                logger.debug("Full agent answer: %s", result, extra=SAMPLED)
+                answer_for_history = result
+
+            except Exception as e:
+                answer_for_history = f"Error: {str(e)}"
+                logger.exception("Agent query failed")
+                st.error(answer_for_history)
         
-        # Add assistant response to chat history
-        st.session_state.chat_history.append({"role": "assistant", "content": answer_for_history})
+        # Add the exchange to the conversation, summarizing turns that leave the window
+        conversation.add("user", prompt)
+        conversation.add("assistant", answer_for_history)
+        conversation.fold(agent.agent_tools.summarize_history)
 
     if st.button("Clear Chat History", key="clear_chat_qna"):
-        st.session_state.chat_history.clear()
+        st.session_state.conversation = Conversation()
         st.success("Chat history cleared! Start new analysis.")
         st.rerun()
 
@@ -149,16 +192,11 @@ elif mode == "📝 Summarize":
         ["overall", "competitors", "SWOT", "market_size", "recommendations"]
     )
     if st.button("Summarize Aspect", key="summarize_btn"):
-        with st.spinner("Compiling market summary..."):
-            try:
-                summary = agent.agent_tools.summarize_tool(aspect)
-                think, result = parse_agent_response(summary)
-                if think:
-                    st.info(f"🤔 Thinking...\n\n{think}")
-                st.success("Summary ready!")
-                st.markdown("🤖 " + result)
-            except Exception as e:
-                st.error(f"Error: {e}")
+        try:
+            render_agent_stream(agent.agent_tools.summarize_tool_stream(aspect))
+            st.success("Summary ready!")
+        except Exception as e:
+            st.error(f"Error: {e}")
 
 elif mode == "📊 Extract Structured Data":
     st.markdown("#### Extract market data as structured JSON.")
@@ -0,0 +1,277 @@
+"""Map-reduce summarization over a whole document, with a persistent cache of node summaries."""
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from langchain.schema import Document
+from config import config
+from context import estimate_tokens, merge_chunks
+from metrics import registry
+from logging_setup import get_logger
+
+logger = get_logger(__name__)
+
+registry.describe("summary_nodes_total", "counter",
+                  "Map-reduce summary nodes by level (map or reduce) and outcome (cached or computed)")
+
+
+def _digest(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def content_groups(items: Sequence[Tuple[str, int]], max_tokens: int) -> List[List[int]]:
+    """Group consecutive (hash, tokens) items into runs of at most `max_tokens`.
+
+    Boundaries are content-defined: an item ends its group, once the group
+    holds a quarter of the budget, with a probability proportional to its
+    size taken from its own hash (about one boundary per quarter budget), or
+    the group ends when the next item would not fit. Groups average half the
+    budget, and an edit only regroups its own neighbourhood: every other group
+    (and its cached summary) stays the same.
+    """
+    min_tokens = max_tokens // 4
+    # Hash threshold per token, so an item of a quarter budget always qualifies
+    per_token = 0x100000000 / max(1, max_tokens // 4)
+    groups: List[List[int]] = []
+    current: List[int] = []
+    tokens = 0
+    for index, (item_hash, item_tokens) in enumerate(items):
+        if current and tokens + item_tokens > max_tokens:
+            groups.append(current)
+            current, tokens = [], 0
+        current.append(index)
+        tokens += item_tokens
+        if tokens >= min_tokens and int(item_hash[:8], 16) < item_tokens * per_token:
+            groups.append(current)
+            current, tokens = [], 0
+    if current:
+        groups.append(current)
+    return groups
+
+
+class SummaryNodeCache:
+    """Node summaries in SQLite, keyed by a hash of the node's inputs."""
+
+    def __init__(self, cache_path: Optional[str] = None):
+        self.cache_path = cache_path or config.SUMMARY_CACHE_PATH
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.cache_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS nodes (key TEXT PRIMARY KEY, summary TEXT NOT NULL, created_at REAL)"
+        )
+        self._db.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        found: Dict[str, str] = {}
+        with self._lock:
+            # SQLite limits bound parameters per statement; stay well below it
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                found.update(self._db.execute(
+                    f"SELECT key, summary FROM nodes WHERE key IN ({placeholders})", batch
+                ).fetchall())
+        return found
+
+    def set(self, key: str, summary: str) -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO nodes (key, summary, created_at) VALUES (?, ?, ?)",
+                             (key, summary, time.time()))
+            self._db.commit()
+
+
+_shared_cache: Optional[SummaryNodeCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> SummaryNodeCache:
+    """One node cache per process, shared by every agent and document."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = SummaryNodeCache()
+        return _shared_cache
+
+
+class HierarchicalSummarizer:
+    """Summarizes every chunk of the document instead of the top retrieved ones.
+
+    Chunks, in document order, are packed into sections of about
+    SUMMARY_GROUP_TOKENS and each section is summarized (map) with at most
+    SUMMARY_LLM_CONCURRENCY calls in flight. Section summaries are then
+    combined with the aspect in focus (reduce), level by level, until they fit
+    one context, which becomes the context of the final summary prompt. A
+    document that fits one context goes straight to the final prompt.
+
+    Each node is cached under a hash of its inputs (the chunk texts for a
+    section, the child keys and aspect above) and of its prompt template and
+    SUMMARY_NODE_TOKENS, and section boundaries are
+    content-defined, so after a document update only the sections that changed,
+    and the nodes above them, are summarized again. Section summaries do not
+    depend on the aspect and are shared by all of them.
+    """
+
+    def __init__(self, agent_tools, cache: Optional[SummaryNodeCache] = None):
+        self.tools = agent_tools
+        self.cache = cache or get_shared_cache()
+        self.group_tokens = config.SUMMARY_GROUP_TOKENS
+        self.concurrency = config.SUMMARY_LLM_CONCURRENCY
+        self._sections: Tuple[Optional[str], List[Tuple[str, str]]] = (None, [])
+        self._lock = threading.Lock()
+        self.computed = 0
+        self.cached = 0
+
+    def sections(self) -> List[Tuple[str, str]]:
+        """(node key, text) of each section of the current index (rebuilt when the index changes)."""
+        version = self.tools._index_version()
+        with self._lock:
+            cached_version, sections = self._sections
+        if sections and cached_version == version:
+            return sections
+        sections = self._split(self.tools.vector_store_manager.all_documents())
+        with self._lock:
+            self._sections = (version, sections)
+        return sections
+
+    def _prompt_key(self, level: str) -> str:
+        """Digest of a level's prompt and output budget, so editing either recomputes its nodes."""
+        if level == "map":
+            messages = self.tools._map_messages("{text}")
+        else:
+            messages = self.tools._reduce_messages("{aspect}", ["{summary}"])
+        return _digest(level, config.GROQ_MODEL, str(config.SUMMARY_NODE_TOKENS),
+                       json.dumps(messages, sort_keys=True))
+
+    def _split(self, documents: List[Document]) -> List[Tuple[str, str]]:
+        """Sections of consecutive chunks, overlapping chunk edges merged."""
+        hashes = [_digest(doc.page_content) for doc in documents]
+        items = [(chunk_hash, estimate_tokens(doc.page_content)) for chunk_hash, doc in zip(hashes, documents)]
+        prompt_key = self._prompt_key("map")
+        sections = []
+        for group in content_groups(items, self.group_tokens):
+            key = _digest(prompt_key, *(hashes[i] for i in group))
+            sections.append((key, "\n\n".join(merge_chunks([documents[i] for i in group]))))
+        return sections
+
+    def _reduce_groups(self, nodes: List[Tuple[str, str]], aspect: str) -> List[Tuple[str, List[Tuple[str, str]]]]:
+        """(node key, children) per reduce node of the next level."""
+        groups = content_groups([(key, estimate_tokens(summary)) for key, summary in nodes], self.group_tokens)
+        if len(groups) == len(nodes):
+            # Every group holds one node: pair them up so the tree always shrinks
+            groups = [list(range(i, min(i + 2, len(nodes)))) for i in range(0, len(nodes), 2)]
+        prompt_key = self._prompt_key("reduce")
+        return [
+            (_digest(prompt_key, aspect.lower(), *(nodes[i][0] for i in group)),
+             [nodes[i] for i in group])
+            for group in groups
+        ]
+
+    def _fits(self, nodes: List[Tuple[str, str]]) -> bool:
+        return sum(estimate_tokens(text) for _, text in nodes) <= self.group_tokens
+
+    def _lookup(self, keys: List[str], level: str) -> Dict[str, str]:
+        found = self.cache.get_many(keys)
+        with self._lock:
+            self.cached += len(found)
+        if found:
+            registry.inc("summary_nodes_total", len(found), level=level, outcome="cached")
+        return found
+
+    def _store(self, key: str, summary: str, level: str) -> None:
+        self.cache.set(key, summary)
+        with self._lock:
+            self.computed += 1
+        registry.inc("summary_nodes_total", level=level, outcome="computed")
+
+    def _run_level(self, work: List[Tuple[str, List[Dict[str, str]]]], level: str) -> Dict[str, str]:
+        """Summaries for (key, messages) pairs: cached ones, the rest in parallel."""
+        found = self._lookup([key for key, _ in work], level)
+        pending = [(key, messages) for key, messages in work if key not in found]
+
+        def compute(item):
+            key, messages = item
+            summary = self.tools._call_groq(messages, max_tokens=config.SUMMARY_NODE_TOKENS)
+            self._store(key, summary, level)
+            return key, summary
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                # Each call runs in a copy of the caller's context (request timings), as _run_blocking does
+                futures = [pool.submit(contextvars.copy_context().run, compute, item) for item in pending]
+                found.update(future.result() for future in futures)
+        return found
+
+    async def _arun_level(self, work: List[Tuple[str, List[Dict[str, str]]]], level: str) -> Dict[str, str]:
+        """Async variant of _run_level."""
+        found = await self.tools._run_blocking(self._lookup, [key for key, _ in work], level)
+        limiter = asyncio.Semaphore(self.concurrency)
+
+        async def compute(key, messages):
+            async with limiter:
+                summary = await self.tools._acall_groq(messages, max_tokens=config.SUMMARY_NODE_TOKENS)
+            await self.tools._run_blocking(self._store, key, summary, level)
+            return key, summary
+
+        found.update(await asyncio.gather(*(
+            compute(key, messages) for key, messages in work if key not in found
+        )))
+        return found
+
+    def _map_work(self, sections):
+        return [(key, self.tools._map_messages(text)) for key, text in sections]
+
+    def _reduce_work(self, groups, aspect):
+        return [(key, self.tools._reduce_messages(aspect, [summary for _, summary in children]))
+                for key, children in groups]
+
+    @staticmethod
+    def _joined(nodes: List[Tuple[str, str]]) -> str:
+        return "\n\n".join(text for _, text in nodes)
+
+    def context(self, aspect: str) -> str:
+        """Context for the final summary prompt: the whole document, or its reduced section summaries."""
+        started = time.perf_counter()
+        sections = self.sections()
+        if not sections or self._fits(sections):
+            return self._joined(sections)
+        summaries = self._run_level(self._map_work(sections), "map")
+        nodes = [(key, summaries[key]) for key, _ in sections]
+        while not self._fits(nodes):
+            groups = self._reduce_groups(nodes, aspect)
+            summaries = self._run_level(self._reduce_work(groups, aspect), "reduce")
+            nodes = [(key, summaries[key]) for key, _ in groups]
+        logger.info("Map-reduce summary context for '%s': %d sections in %.2fs", aspect, len(sections),
+                    time.perf_counter() - started)
+        return self._joined(nodes)
+
+    async def acontext(self, aspect: str) -> str:
+        """Async variant of context()."""
+        started = time.perf_counter()
+        sections = await self.tools._run_blocking(self.sections)
+        if not sections or self._fits(sections):
+            return self._joined(sections)
+        summaries = await self._arun_level(self._map_work(sections), "map")
+        nodes = [(key, summaries[key]) for key, _ in sections]
+        while not self._fits(nodes):
+            groups = self._reduce_groups(nodes, aspect)
+            summaries = await self._arun_level(self._reduce_work(groups, aspect), "reduce")
+            nodes = [(key, summaries[key]) for key, _ in groups]
+        logger.info("Map-reduce summary context for '%s': %d sections in %.2fs", aspect, len(sections),
+                    time.perf_counter() - started)
+        return self._joined(nodes)
+
+    def stats(self) -> Dict[str, int]:
+        return {"nodes_computed": self.computed, "nodes_cached": self.cached}
@@ -1,40 +1,264 @@
 """AI Agent tools using direct Groq API (no ChatGroq wrapper)."""
-from typing import Dict, Any, List
-from groq import Groq
+from typing import Dict, Any, List, Optional, Iterator, AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import Document
 from config import config
+from response_cache import ResponseCache
+from artifacts import ArtifactStore
+from llm_client import get_llm_client
+from context import ContextBuilder
+from router import normalize_query
+from singleflight import SingleFlight
+from sessions import Conversation, extractive_summary, format_turns, is_follow_up
+from summarizer import HierarchicalSummarizer
+from metrics import span, timed, record, record_llm_call
+import asyncio
+import contextvars
+import copy
 import json
 import os
+import threading
+import time
+
+_retrieval_executor: Optional[ThreadPoolExecutor] = None
+_retrieval_executor_lock = threading.Lock()
+
+
+def get_retrieval_executor() -> ThreadPoolExecutor:
+    """The process-wide pool for blocking retrieval work, shared by every agent."""
+    global _retrieval_executor
+    with _retrieval_executor_lock:
+        if _retrieval_executor is None:
+            _retrieval_executor = ThreadPoolExecutor(
+                max_workers=config.RETRIEVAL_WORKERS,
+                thread_name_prefix="retrieval"
+            )
+        return _retrieval_executor
+
 
 class AgentTools:
     """Collection of tools for the AI Market Analyst agent."""
 
-    def __init__(self, retriever):
+    SUMMARY_QUERIES = {
+        "overall": "market research overview findings conclusion",
+        "competitors": "competitive landscape market share competitors",
+        "swot": "SWOT analysis strengths weaknesses opportunities threats",
+        "market_size": "market size growth CAGR projections",
+        "recommendations": "strategic priorities recommendations conclusion"
+    }
+
+    def __init__(self, retriever, vector_store_manager=None):
         self.retriever = retriever
-        # Use direct Groq client
-        self.groq_client = Groq(api_key=config.GROQ_API_KEY)
-
-    def _retrieve_context(self, query: str, k: int = 3) -> str:
-        """Retrieve relevant context from vector store."""
-        docs = self.retriever.get_relevant_documents(query)
-        context = "\n\n".join([doc.page_content for doc in docs])
-        return context
-
-    def _call_groq(self, messages: List[Dict[str, str]]) -> str:
-        """Call Groq API directly."""
-        response = self.groq_client.chat.completions.create(
-            model=config.GROQ_MODEL,
-            messages=messages,
-            temperature=0,
-            max_tokens=2048
-        )
-        return response.choices[0].message.content
+        self.vector_store_manager = vector_store_manager
+        # Shared pooled client: rate limits and connections are per process, not per agent
+        self.llm = get_llm_client()
+        # Embedding and Chroma search are blocking; async callers offload them here.
+        # One pool per process, so threads do not grow with the number of open documents
+        self.executor = get_retrieval_executor()
+        self.response_cache = ResponseCache() if config.RESPONSE_CACHE_ENABLED else None
+        self.context_builder = ContextBuilder(getattr(vector_store_manager, "embeddings", None))
+        self._cached_index_version = None
+        # Identical concurrent tool calls (e.g. a burst of /api/summarize) share one computation
+        self.single_flight = SingleFlight() if config.REQUEST_COALESCING else None
+        self.artifact_store = None
+        if config.PRECOMPUTE_ARTIFACTS and vector_store_manager is not None:
+            self.artifact_store = ArtifactStore(
+                vector_store_manager.persist_directory,
+                vector_store_manager.collection_name
+            )
+        # Summaries cover the whole document when the store can list every chunk
+        self.summarizer = None
+        if config.SUMMARY_STRATEGY == "map_reduce" and hasattr(vector_store_manager, "all_documents"):
+            self.summarizer = HierarchicalSummarizer(self)
 
-    def qa_tool(self, question: str) -> str:
-        """Answer questions about the market research document."""
-        context = self._retrieve_context(question)
-        messages = [
+    @timed("search")
+    def _retrieve_docs(self, query: str, k: int = 3, mmr: Optional[bool] = None,
+                       score_threshold: Optional[float] = None, hybrid: Optional[bool] = None) -> List[Document]:
+        """Search the vector store with a per-call depth instead of the retriever's fixed k.
+
+        `hybrid` fuses vector and BM25 rankings (defaults to RETRIEVAL_HYBRID).
+        """
+        mmr = config.RETRIEVAL_USE_MMR if mmr is None else mmr
+        hybrid = config.RETRIEVAL_HYBRID if hybrid is None else hybrid
+        if score_threshold is None:
+            score_threshold = config.RETRIEVAL_SCORE_THRESHOLD
+        if self.vector_store_manager is not None:
+            return self.vector_store_manager.similarity_search(
+                query, k=k, mmr=mmr, score_threshold=score_threshold, hybrid=hybrid
+            )
+        vector_store = getattr(self.retriever, "vectorstore", None)
+        if vector_store is not None:
+            return vector_store.similarity_search(query, k=k)
+        return self.retriever.get_relevant_documents(query)
+
+    def _retrieve_context(self, query: str, k: int = 3, mmr: Optional[bool] = None,
+                          score_threshold: Optional[float] = None, tool: str = "qa",
+                          hybrid: Optional[bool] = None) -> str:
+        """Retrieve relevant context from vector store, compressed to the tool's token budget."""
+        docs = self._retrieve_docs(query, k, mmr, score_threshold, hybrid)
+        return self._build_context(query, docs, tool)
+
+    def _build_context(self, query: str, docs: List[Document], tool: str = "qa") -> str:
+        budget = {
+            "qa": config.CONTEXT_TOKENS_QA,
+            "summarize": config.CONTEXT_TOKENS_SUMMARY,
+            "extract": config.CONTEXT_TOKENS_EXTRACT,
+        }[tool]
+        return self.context_builder.build(query, docs, budget, tool)
+
+    def _index_version(self):
+        """Current document index version; a change invalidates cached responses and refreshes artifacts."""
+        version = getattr(self.vector_store_manager, "index_version", None)
+        previous = self._cached_index_version
+        if version != previous:
+            self._cached_index_version = version
+            if self.response_cache is not None:
+                self.response_cache.invalidate(keep_version=version)
+            # The store was re-synced while running; the first version is precomputed at startup
+            if self.artifact_store is not None and previous is not None:
+                self.artifact_store.refresh_in_background(self, version)
+        return version
+
+    def _query_vector(self, query: str):
+        """Query embedding for semantic cache lookups (served by the embedding cache)."""
+        if self.response_cache is None or not self.response_cache.semantic_enabled:
+            return None
+        if self.vector_store_manager is None:
+            return None
+        return self.vector_store_manager.embeddings.embed_query(query)
+
+    def _cached_response(self, messages: List[Dict[str, str]]):
+        """Return (cache key, cached content or None)."""
+        if self.response_cache is None:
+            return None, None
+        key = ResponseCache.make_key(config.GROQ_MODEL, messages, self._index_version())
+        return key, self.response_cache.get(key)
+
+    def _store_response(self, key, content: str, query_vector=None) -> None:
+        if self.response_cache is not None and key is not None:
+            self.response_cache.set(key, content, self._index_version(), query_vector)
+
+    def _call_groq(self, messages: List[Dict[str, str]], query_vector=None, max_tokens: int = 2048) -> str:
+        """Call Groq API directly, serving identical prompts from the response cache."""
+        key, cached = self._cached_response(messages)
+        if cached is not None:
+            record_llm_call("cache_hit")
+            return cached
+        with span("llm"):
+            response = self.llm.complete(messages, max_tokens=max_tokens)
+        record_llm_call("groq", getattr(response, "usage", None))
+        content = response.choices[0].message.content
+        self._store_response(key, content, query_vector)
+        return content
+
+    @timed("search")
+    def _retrieve_batch(self, queries: List[str], k: int = 3) -> List[List[Document]]:
+        if self.vector_store_manager is not None:
+            return self.vector_store_manager.batch_similarity_search(queries, k=k)
+        return [self._retrieve_docs(query, k) for query in queries]
+
+    async def _run_blocking(self, func, *args):
+        """Run blocking work on the retrieval pool, keeping the caller's context (request timings)."""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, context.run, func, *args)
+
+    async def _aretrieve_context(self, query: str, k: int = 3, tool: str = "qa") -> str:
+        """Retrieve context without blocking the event loop."""
+        return await self._run_blocking(self._retrieve_context, query, k, None, None, tool)
+
+    async def _acall_groq(self, messages: List[Dict[str, str]], query_vector=None, max_tokens: int = 2048) -> str:
+        """Call Groq API through the async client, using the response cache."""
+        key, cached = self._cached_response(messages)
+        if cached is not None:
+            record_llm_call("cache_hit")
+            return cached
+        with span("llm"):
+            response = await self.llm.acomplete(messages, max_tokens=max_tokens)
+        record_llm_call("groq", getattr(response, "usage", None))
+        content = response.choices[0].message.content
+        self._store_response(key, content, query_vector)
+        return content
+
+    def _artifacts(self):
+        """Precomputed artifacts for the current index version, if available."""
+        if self.artifact_store is None:
+            return None
+        return self.artifact_store.load(self._index_version())
+
+    def _precomputed_summary(self, aspect: str):
+        artifacts = self._artifacts()
+        if artifacts is None:
+            return None
+        return artifacts["summaries"].get(aspect.lower())
+
+    def _precomputed_extract(self):
+        artifacts = self._artifacts()
+        if artifacts is None or artifacts.get("extract") is None:
+            return None
+        return copy.deepcopy(artifacts["extract"])
+
+    def precompute_artifacts(self, background: bool = True):
+        """Compute extraction and summaries once for the current document version."""
+        if self.artifact_store is None:
+            return None
+        version = self._index_version()
+        if background:
+            return self.artifact_store.refresh_in_background(self, version)
+        return self.artifact_store.load(version) or self.artifact_store.compute(self, version)
+
+    def _stream_groq(self, messages: List[Dict[str, str]], query_vector=None) -> Iterator[str]:
+        """Yield completion tokens as Groq produces them; the full text is cached at the end."""
+        key, cached = self._cached_response(messages)
+        if cached is not None:
+            record_llm_call("cache_hit")
+            yield cached
+            return
+        # Timed by hand: a span would stay current while the consumer runs between tokens
+        started = time.perf_counter()
+        stream = self.llm.stream(messages, max_tokens=2048)
+        parts = []
+        usage = None
+        for chunk in stream:
+            usage = _stream_usage(chunk) or usage
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+        record("llm", time.perf_counter() - started)
+        record_llm_call("groq", usage)
+        self._store_response(key, "".join(parts), query_vector)
+
+    async def _astream_groq(self, messages: List[Dict[str, str]], query_vector=None) -> AsyncIterator[str]:
+        """Async variant of _stream_groq."""
+        key, cached = self._cached_response(messages)
+        if cached is not None:
+            record_llm_call("cache_hit")
+            yield cached
+            return
+        started = time.perf_counter()
+        stream = await self.llm.astream(messages, max_tokens=2048)
+        parts = []
+        usage = None
+        async for chunk in stream:
+            usage = _stream_usage(chunk) or usage
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+        record("llm", time.perf_counter() - started)
+        record_llm_call("groq", usage)
+        self._store_response(key, "".join(parts), query_vector)
+
+    def _similar_answer(self, query_vector):
+        if query_vector is None:
+            return None
+        return self.response_cache.get_similar(query_vector, self._index_version())
+
+    @timed("prompt")
+    def _qa_messages(self, question: str, context: str) -> List[Dict[str, str]]:
+        return [
             {
                 "role": "system",
                 "content": "You are a helpful AI assistant analyzing a market research document. Answer the user's question based on the provided context. Be specific and cite relevant information. If the answer is not in the context, say so."
@@ -44,20 +268,24 @@ class AgentTools:
                 "content": f"Context from document:\n{context}\n\nQuestion: {question}\n\nPlease provide a detailed answer."
             }
         ]
-        return self._call_groq(messages)
 
-    def summarize_tool(self, aspect: str = "overall") -> str:
-        """Summarize market research findings."""
-        query_map = {
-            "overall": "market research overview findings conclusion",
-            "competitors": "competitive landscape market share competitors",
-            "swot": "SWOT analysis strengths weaknesses opportunities threats",
-            "market_size": "market size growth CAGR projections",
-            "recommendations": "strategic priorities recommendations conclusion"
-        }
-        query = query_map.get(aspect.lower(), "market research summary")
-        context = self._retrieve_context(query, k=5)
-        messages = [
+    def _summary_query(self, aspect: str) -> str:
+        return self.SUMMARY_QUERIES.get(aspect.lower(), "market research summary")
+
+    def _summary_context(self, aspect: str) -> str:
+        """The whole document condensed by map-reduce, or the top retrieved chunks."""
+        if self.summarizer is not None:
+            return self.summarizer.context(aspect)
+        return self._retrieve_context(self._summary_query(aspect), k=5, tool="summarize")
+
+    async def _asummary_context(self, aspect: str) -> str:
+        if self.summarizer is not None:
+            return await self.summarizer.acontext(aspect)
+        return await self._aretrieve_context(self._summary_query(aspect), k=5, tool="summarize")
+
+    @timed("prompt")
+    def _summarize_messages(self, aspect: str, context: str) -> List[Dict[str, str]]:
+        return [
             {
                 "role": "system",
                 "content": "You are an expert market analyst. Summarize the key findings from the market research document clearly and concisely. Focus on actionable insights."
@@ -67,12 +295,37 @@ class AgentTools:
                 "content": f"Document content:\n{context}\n\nPlease provide a comprehensive summary focusing on: {aspect}\n\nStructure with: Key findings, Important metrics, Strategic implications"
             }
         ]
-        return self._call_groq(messages)
 
-    def extract_data_tool(self, extraction_type: str = "all") -> Dict[str, Any]:
-        """Extract structured data as JSON from the document."""
-        context = self._retrieve_context("market research data metrics", k=10)
-        messages = [
+    @timed("prompt")
+    def _map_messages(self, text: str) -> List[Dict[str, str]]:
+        return [
+            {
+                "role": "system",
+                "content": f"You summarize one section of a market research document. Keep every figure, company, product, date, strength, weakness, risk and recommendation it states, and omit nothing that a summary of the whole report could need. Use at most {config.SUMMARY_NODE_TOKENS * 3 // 4} words and return only the summary."
+            },
+            {
+                "role": "user",
+                "content": f"Section:\n{text}\n\nSummary:"
+            }
+        ]
+
+    @timed("prompt")
+    def _reduce_messages(self, aspect: str, summaries: List[str]) -> List[Dict[str, str]]:
+        sections = "\n\n".join(f"[{i}] {summary}" for i, summary in enumerate(summaries, 1))
+        return [
+            {
+                "role": "system",
+                "content": f"You combine summaries of consecutive sections of a market research document into one summary. Keep what matters for: {aspect}, with its figures and names, and drop repetition. Use at most {config.SUMMARY_NODE_TOKENS * 3 // 4} words and return only the summary."
+            },
+            {
+                "role": "user",
+                "content": f"Section summaries:\n{sections}\n\nCombined summary:"
+            }
+        ]
+
+    @timed("prompt")
+    def _extract_messages(self, context: str) -> List[Dict[str, str]]:
+        return [
             {
                 "role": "system",
                 "content": "You are a data extraction specialist. Extract structured information from the market research document and return ONLY valid JSON with no additional text."
@@ -110,9 +363,73 @@ Extract and return ONLY this JSON structure (no markdown, no extra text):
 }}"""
             }
         ]
-        
-        response_text = self._call_groq(messages)
-        
+
+    @timed("prompt")
+    def _rewrite_messages(self, message: str, history: str) -> List[Dict[str, str]]:
+        return [
+            {
+                "role": "system",
+                "content": "Rewrite the user's latest message as a standalone question about the market research document. Use the conversation only to resolve references such as pronouns, 'what about X' or an omitted subject. Keep the user's intent (question, summary or data extraction). Return only the rewritten message."
+            },
+            {
+                "role": "user",
+                "content": f"Conversation:\n{history}\n\nLatest message: {message}\n\nStandalone message:"
+            }
+        ]
+
+    @timed("prompt")
+    def _history_summary_messages(self, summary: str, turns: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        return [
+            {
+                "role": "system",
+                "content": f"You maintain a running summary of a conversation about a market research document. Merge the new turns into the summary, keeping entities, figures, the user's interests and open questions. Use at most {config.SESSION_SUMMARY_TOKENS * 3 // 4} words and return only the summary."
+            },
+            {
+                "role": "user",
+                "content": f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{format_turns(turns)}\n\nUpdated summary:"
+            }
+        ]
+
+    @staticmethod
+    def _clean_rewrite(message: str, rewritten: str) -> str:
+        """The rewritten query, or the original message if the model returned something unusable."""
+        rewritten = rewritten.strip().strip('"').strip()
+        if not rewritten or len(rewritten) > 4 * len(message) + 200:
+            return message
+        return rewritten
+
+    def rewrite_query(self, message: str, conversation: Conversation) -> str:
+        """Standalone version of a follow-up message, resolved against the compact history."""
+        if not config.QUERY_REWRITE or not conversation or not is_follow_up(message):
+            return message
+        rewritten = self._call_groq(self._rewrite_messages(message, conversation.history_text()), max_tokens=128)
+        return self._clean_rewrite(message, rewritten)
+
+    async def arewrite_query(self, message: str, conversation: Conversation) -> str:
+        """Async variant of rewrite_query."""
+        if not config.QUERY_REWRITE or not conversation or not is_follow_up(message):
+            return message
+        rewritten = await self._acall_groq(
+            self._rewrite_messages(message, conversation.history_text()), max_tokens=128
+        )
+        return self._clean_rewrite(message, rewritten)
+
+    def summarize_history(self, summary: str, turns: List[Dict[str, str]]) -> str:
+        """Fold turns into a conversation summary (LLM, or extractive when SESSION_LLM_SUMMARY is off)."""
+        if not config.SESSION_LLM_SUMMARY:
+            return extractive_summary(summary, turns, config.SESSION_SUMMARY_TOKENS)
+        return self._call_groq(self._history_summary_messages(summary, turns),
+                               max_tokens=config.SESSION_SUMMARY_TOKENS)
+
+    async def asummarize_history(self, summary: str, turns: List[Dict[str, str]]) -> str:
+        """Async variant of summarize_history."""
+        if not config.SESSION_LLM_SUMMARY:
+            return extractive_summary(summary, turns, config.SESSION_SUMMARY_TOKENS)
+        return await self._acall_groq(self._history_summary_messages(summary, turns),
+                                      max_tokens=config.SESSION_SUMMARY_TOKENS)
+
+    @timed("parse")
+    def _parse_json(self, response_text: str) -> Dict[str, Any]:
         try:
             data = json.loads(response_text)
         except json.JSONDecodeError:
@@ -128,3 +445,165 @@ Extract and return ONLY this JSON structure (no markdown, no extra text):
                 data = {"error": "No JSON found", "raw_response": response_text}
         
         return data
+
+    def flight_key(self, tool: str, argument: str):
+        """Calls are identical when tool, normalized argument and document version match."""
+        return (tool, normalize_query(argument), self._index_version())
+
+    def _coalesce(self, tool: str, argument: str, func, *args):
+        if self.single_flight is None:
+            return func(*args)
+        return self.single_flight.do(self.flight_key(tool, argument), func, *args)
+
+    async def _acoalesce(self, tool: str, argument: str, func, *args):
+        if self.single_flight is None:
+            return await func(*args)
+        return await self.single_flight.ado(self.flight_key(tool, argument), func, *args)
+
+    def qa_tool(self, question: str) -> str:
+        """Answer questions about the market research document."""
+        return self._coalesce("qa", question, self._qa, question)
+
+    def summarize_tool(self, aspect: str = "overall") -> str:
+        """Summarize market research findings."""
+        return self._coalesce("summarize", aspect, self._summarize, aspect)
+
+    def extract_data_tool(self, extraction_type: str = "all") -> Dict[str, Any]:
+        """Extract structured data as JSON from the document."""
+        return self._coalesce("extract", extraction_type, self._extract, extraction_type)
+
+    async def aqa_tool(self, question: str) -> str:
+        """Async variant of qa_tool."""
+        return await self._acoalesce("qa", question, self._aqa, question)
+
+    async def asummarize_tool(self, aspect: str = "overall") -> str:
+        """Async variant of summarize_tool."""
+        return await self._acoalesce("summarize", aspect, self._asummarize, aspect)
+
+    async def aextract_data_tool(self, extraction_type: str = "all") -> Dict[str, Any]:
+        """Async variant of extract_data_tool."""
+        return await self._acoalesce("extract", extraction_type, self._aextract, extraction_type)
+
+    def _qa(self, question: str) -> str:
+        query_vector = self._query_vector(question)
+        cached = self._similar_answer(query_vector)
+        if cached is not None:
+            return cached
+        context = self._retrieve_context(question)
+        return self._call_groq(self._qa_messages(question, context), query_vector)
+
+    def _summarize(self, aspect: str) -> str:
+        precomputed = self._precomputed_summary(aspect)
+        if precomputed is not None:
+            return precomputed
+        context = self._summary_context(aspect)
+        return self._call_groq(self._summarize_messages(aspect, context))
+
+    def _extract(self, extraction_type: str) -> Dict[str, Any]:
+        precomputed = self._precomputed_extract()
+        if precomputed is not None:
+            return precomputed
+        context = self._retrieve_context("market research data metrics", k=10, tool="extract")
+        response_text = self._call_groq(self._extract_messages(context))
+        return self._parse_json(response_text)
+
+    async def _aqa(self, question: str) -> str:
+        query_vector = None
+        if self.response_cache is not None and self.response_cache.semantic_enabled:
+            query_vector = await self._run_blocking(self._query_vector, question)
+        cached = self._similar_answer(query_vector)
+        if cached is not None:
+            return cached
+        context = await self._aretrieve_context(question)
+        return await self._acall_groq(self._qa_messages(question, context), query_vector)
+
+    async def _asummarize(self, aspect: str) -> str:
+        precomputed = self._precomputed_summary(aspect)
+        if precomputed is not None:
+            return precomputed
+        context = await self._asummary_context(aspect)
+        return await self._acall_groq(self._summarize_messages(aspect, context))
+
+    async def _aextract(self, extraction_type: str) -> Dict[str, Any]:
+        precomputed = self._precomputed_extract()
+        if precomputed is not None:
+            return precomputed
+        context = await self._aretrieve_context("market research data metrics", k=10, tool="extract")
+        response_text = await self._acall_groq(self._extract_messages(context))
+        return self._parse_json(response_text)
+
+    def _batch_contexts(self, questions: List[str], k: int = 3) -> List[str]:
+        docs_per_question = self._retrieve_batch(questions, k)
+        return [self._build_context(question, docs) for question, docs in zip(questions, docs_per_question)]
+
+    def qa_batch(self, questions: List[str], k: int = 3) -> List[str]:
+        """Answer many questions with shared retrieval and bounded parallel LLM calls."""
+        messages = [
+            self._qa_messages(question, context)
+            for question, context in zip(questions, self._batch_contexts(questions, k))
+        ]
+        with ThreadPoolExecutor(max_workers=config.BATCH_LLM_CONCURRENCY) as pool:
+            # Each call keeps the caller's context (request timings), as _run_blocking does
+            futures = [pool.submit(contextvars.copy_context().run, self._call_groq, item) for item in messages]
+            return [future.result() for future in futures]
+
+    async def aqa_batch(self, questions: List[str], k: int = 3) -> List[str]:
+        """Async variant of qa_batch; answers come back in question order."""
+        contexts = await self._run_blocking(self._batch_contexts, questions, k)
+        limiter = asyncio.Semaphore(config.BATCH_LLM_CONCURRENCY)
+
+        async def answer(question: str, context: str) -> str:
+            async with limiter:
+                return await self._acall_groq(self._qa_messages(question, context))
+
+        return await asyncio.gather(*(
+            answer(question, context) for question, context in zip(questions, contexts)
+        ))
+
+    def qa_tool_stream(self, question: str) -> Iterator[str]:
+        """Streaming variant of qa_tool."""
+        query_vector = self._query_vector(question)
+        cached = self._similar_answer(query_vector)
+        if cached is not None:
+            yield cached
+            return
+        context = self._retrieve_context(question)
+        yield from self._stream_groq(self._qa_messages(question, context), query_vector)
+
+    def summarize_tool_stream(self, aspect: str = "overall") -> Iterator[str]:
+        """Streaming variant of summarize_tool."""
+        precomputed = self._precomputed_summary(aspect)
+        if precomputed is not None:
+            yield precomputed
+            return
+        context = self._summary_context(aspect)
+        yield from self._stream_groq(self._summarize_messages(aspect, context))
+
+    async def aqa_tool_stream(self, question: str) -> AsyncIterator[str]:
+        """Async streaming variant of qa_tool."""
+        query_vector = None
+        if self.response_cache is not None and self.response_cache.semantic_enabled:
+            query_vector = await self._run_blocking(self._query_vector, question)
+        cached = self._similar_answer(query_vector)
+        if cached is not None:
+            yield cached
+            return
+        context = await self._aretrieve_context(question)
+        async for token in self._astream_groq(self._qa_messages(question, context), query_vector):
+            yield token
+
+    async def asummarize_tool_stream(self, aspect: str = "overall") -> AsyncIterator[str]:
+        """Async streaming variant of summarize_tool."""
+        precomputed = self._precomputed_summary(aspect)
+        if precomputed is not None:
+            yield precomputed
+            return
+        context = await self._asummary_context(aspect)
+        async for token in self._astream_groq(self._summarize_messages(aspect, context)):
+            yield token
+
+
+def _stream_usage(chunk):
+    """Token usage Groq attaches to the final chunk of a stream (x_groq.usage)."""
+    x_groq = getattr(chunk, "x_groq", None)
+    return getattr(x_groq, "usage", None) if x_groq is not None else None
@@ -1,54 +1,455 @@
-"""Vector store management with ChromaDB and HuggingFace embeddings."""
-from typing import List
-from langchain_community.embeddings import HuggingFaceEmbeddings
+"""Vector store management with ChromaDB and HuggingFace embeddings, plus a BM25 index."""
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from langchain_community.vectorstores import Chroma
 from langchain.schema import Document
 from config import config
+from embedding_cache import CachedEmbeddings
+from embedding_engine import EmbeddingEngine
+from faiss_store import FaissVectorStore
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from metrics import timed
+from logging_setup import get_logger, SAMPLED
+
+logger = get_logger(__name__)
+
+# Metadata flag of chunks added by append_documents(), which sync_vector_store() never prunes
+_APPENDED = "appended"
+
+# One embedding model per process, shared by every manager/collection
+_shared_embeddings: Dict[str, Any] = {}
+_shared_embeddings_lock = threading.Lock()
+
+
+def get_shared_embeddings(model_name: str):
+    """Process-wide embeddings for a model; the model itself loads on first embed."""
+    with _shared_embeddings_lock:
+        embeddings = _shared_embeddings.get(model_name)
+        if embeddings is None:
+            engine = EmbeddingEngine(model_name)
+            embeddings = engine
+            if config.EMBEDDING_CACHE_ENABLED:
+                embeddings = CachedEmbeddings(engine, engine.embedding_id)
+            _shared_embeddings[model_name] = embeddings
+        return embeddings
+
+
+def _engine_of(embeddings) -> Optional[EmbeddingEngine]:
+    if isinstance(embeddings, CachedEmbeddings):
+        embeddings = embeddings.embeddings
+    return embeddings if isinstance(embeddings, EmbeddingEngine) else None
+
 
 class VectorStoreManager:
     """Manages vector database operations using free HuggingFace embeddings."""
     
-    def __init__(self, model_name=None, persist_directory=None):
+    def __init__(self, model_name=None, persist_directory=None, collection_name=None, backend=None):
         self.model_name = model_name or config.EMBEDDING_MODEL_NAME
         self.persist_directory = persist_directory or config.VECTOR_DB_PATH
+        self.collection_name = collection_name or config.COLLECTION_NAME
+        self.backend = backend or config.VECTOR_BACKEND
+        if self.backend not in ("chroma", "faiss"):
+            raise ValueError(f"Unknown vector backend: {self.backend}")
 
-        print(f"✓ Loading HuggingFace embedding model: {self.model_name}")
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=self.model_name,
-            model_kwargs={"device": "cpu"}
-        )
+        self.embeddings = get_shared_embeddings(self.model_name)
+        engine = _engine_of(self.embeddings)
+        # Chunk ids and manifests are tied to the vector space, not just the model
+        self.embedding_id = engine.embedding_id if engine else self.model_name
         
         self.vector_store = None
+        self.index_version = None
+        self.chunk_count = None
+        self.lexical_index: Optional[BM25Index] = None
+        # Chunk ids stored so far, and those added by appends, during append_documents()
+        self._stored_ids: Optional[set] = None
+        self._appended_ids: Optional[set] = None
 
     def create_vector_store(self, documents: List[Document]) -> Chroma:
-        print(f"✓ Creating vector store with {len(documents)} documents...")
-        self.vector_store = Chroma.from_documents(
+        logger.info("Creating %s vector store with %d documents", self.backend, len(documents))
+        store_class = FaissVectorStore if self.backend == "faiss" else Chroma
+        self.vector_store = store_class.from_documents(
             documents=documents,
             embedding=self.embeddings,
             persist_directory=self.persist_directory,
-            collection_name=config.COLLECTION_NAME
+            collection_name=self.collection_name
+        )
+
+        self.index_version = _version_of(
+            _chunk_id(doc, {}, self.embedding_id) for doc in documents
         )
+        self.chunk_count = len(documents)
+        self._remove_manifest()
+        self._sync_lexical_index()
 
-        print(f"✓ Vector store created at: {self.persist_directory}")
-        print(f"✓ Embedding model: {self.model_name}")
+        logger.info("Vector store created at %s (embedding model %s)", self.persist_directory, self.model_name)
         return self.vector_store
 
+    def sync_vector_store(self, documents: Iterable[Document], chunk_settings: Optional[Dict[str, Any]] = None) -> Chroma:
+        """Incrementally index documents, embedding only chunks not already stored.
+
+        Each chunk is addressed by a hash of its text, the chunker settings and
+        the embedding model name. When the manifest already lists exactly these
+        chunks the persisted collection is reused without touching the model.
+        `documents` may be a generator: new chunks are embedded and written in
+        batches of EMBEDDING_BATCH_SIZE as they arrive, so only chunk ids are
+        kept for the whole document. Only chunks stored by an earlier sync are
+        removed when the document no longer has them; chunks added by
+        append_documents() (bulk ingestion) stay.
+        """
+        if not config.INCREMENTAL_INDEXING:
+            return self.create_vector_store(list(documents))
+
+        settings = chunk_settings or {}
+        manifest = self._read_manifest()
+        self.load_vector_store()
+        stored, appended = self._collection_ids(manifest)
+
+        wanted = set()
+        pending: List[Tuple[str, Document]] = []
+        added = 0
+
+        def flush():
+            nonlocal added
+            if not pending:
+                return
+            if added == 0:
+                # The manifest no longer describes the store until this sync completes
+                self._remove_manifest()
+            self.vector_store.add_documents([doc for _, doc in pending], ids=[cid for cid, _ in pending])
+            added += len(pending)
+            pending.clear()
+
+        for doc in documents:
+            chunk_id = _chunk_id(doc, settings, self.embedding_id)
+            if chunk_id in wanted:
+                continue
+            wanted.add(chunk_id)
+            if chunk_id not in stored:
+                pending.append((chunk_id, doc))
+                if len(pending) >= config.EMBEDDING_BATCH_SIZE:
+                    flush()
+        flush()
+
+        stale = [chunk_id for chunk_id in stored if chunk_id not in wanted and chunk_id not in appended]
+        if not added and not stale and manifest is not None:
+            logger.info("Vector store up to date (%d chunks), skipping embedding", len(wanted))
+            self.index_version = manifest.get("version")
+            self.chunk_count = len(stored)
+            self._sync_lexical_index()
+            return self.vector_store
+
+        if stale:
+            self._remove_manifest()
+            self.vector_store.delete(ids=stale)
+
+        self._rebuild_index()
+        ids = wanted | appended
+        self.index_version = _version_of(ids)
+        self.chunk_count = len(ids)
+        self._write_manifest(list(ids), settings, appended)
+        self._sync_lexical_index()
+
+        logger.info("Incremental index: %d embedded, %d removed, %d reused",
+                    added, len(stale), len(wanted) - added)
+        return self.vector_store
+
+    def append_documents(self, documents: List[Document], chunk_settings: Optional[Dict[str, Any]] = None) -> int:
+        """Add chunks to the collection, keeping everything already in it; returns how many were embedded.
+
+        For bulk ingestion: each call embeds and writes one batch in a single
+        add, skipping chunks already stored (so re-running an interrupted
+        ingest does not embed twice). The manifest and BM25 index are brought
+        up to date once by finish_append(). Appended chunks are recorded as
+        such, so the startup sync of the uploaded document does not prune them.
+        """
+        if self._stored_ids is None:
+            manifest = self._read_manifest()
+            if self.vector_store is None:
+                self.load_vector_store()
+            self._stored_ids, self._appended_ids = self._collection_ids(manifest)
+            self._remove_manifest()
+
+        settings = chunk_settings or {}
+        pending: Dict[str, Document] = {}
+        for doc in documents:
+            chunk_id = _chunk_id(doc, settings, self.embedding_id)
+            self._appended_ids.add(chunk_id)
+            if chunk_id not in self._stored_ids:
+                pending[chunk_id] = Document(page_content=doc.page_content,
+                                             metadata=dict(doc.metadata, **{_APPENDED: True}))
+        if pending:
+            self.vector_store.add_documents(list(pending.values()), ids=list(pending))
+            self._stored_ids.update(pending)
+        return len(pending)
+
+    def finish_append(self, chunk_settings: Optional[Dict[str, Any]] = None) -> None:
+        """Write the manifest and rebuild the BM25 index after append_documents() calls."""
+        if self._stored_ids is None:
+            return
+        self._rebuild_index()
+        self.index_version = _version_of(self._stored_ids)
+        self.chunk_count = len(self._stored_ids)
+        self._write_manifest(list(self._stored_ids), chunk_settings or {}, self._appended_ids)
+        self._stored_ids = self._appended_ids = None
+        self._sync_lexical_index()
+        logger.info("Collection %s now holds %d chunks", self.collection_name, self.chunk_count)
+
     def load_vector_store(self) -> Chroma:
-        print(f"✓ Loading vector store from: {self.persist_directory}")
+        logger.info("Loading %s vector store %s from %s", self.backend, self.collection_name, self.persist_directory)
+        manifest = self._read_manifest()
+        if manifest is not None:
+            self.index_version = manifest.get("version")
+            self.chunk_count = len(manifest.get("ids", []))
+        self._open_lexical_index()
+        if self.backend == "faiss":
+            self.vector_store = FaissVectorStore(
+                self.embeddings,
+                persist_directory=self.persist_directory,
+                collection_name=self.collection_name
+            )
+            return self.vector_store
         self.vector_store = Chroma(
             persist_directory=self.persist_directory,
             embedding_function=self.embeddings,
-            collection_name=config.COLLECTION_NAME
+            collection_name=self.collection_name
         )
         return self.vector_store
 
-    def similarity_search(self, query: str, k: int = 3) -> List[Document]:
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.persist_directory, f"{self.collection_name}.manifest.json")
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("model_name") != self.embedding_id or manifest.get("backend", "chroma") != self.backend:
+            return None
+        return manifest
+
+    def _collection_ids(self, manifest: Optional[Dict[str, Any]]) -> Tuple[set, set]:
+        """(every chunk id, ids added by append_documents()) of the loaded collection."""
+        if manifest is not None:
+            return set(manifest.get("ids", [])), set(manifest.get("appended", []))
+        # No manifest (an interrupted sync or ingest): read the flags off the chunks
+        stored = self.vector_store.get(include=["metadatas"])
+        appended = {chunk_id for chunk_id, metadata in zip(stored["ids"], stored["metadatas"])
+                    if (metadata or {}).get(_APPENDED)}
+        return set(stored["ids"]), appended
+
+    def _write_manifest(self, ids: List[str], chunk_settings: Dict[str, Any], appended: Iterable[str] = ()) -> None:
+        os.makedirs(self.persist_directory, exist_ok=True)
+        manifest = {
+            "model_name": self.embedding_id,
+            "backend": self.backend,
+            "chunk_settings": chunk_settings,
+            "version": self.index_version,
+            "ids": sorted(ids),
+            "appended": sorted(appended),
+        }
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _rebuild_index(self) -> None:
+        """Cover rows appended to a FAISS store by its ANN index (once per sync, not per batch)."""
+        if isinstance(self.vector_store, FaissVectorStore):
+            self.vector_store.rebuild_index()
+
+    def _remove_manifest(self) -> None:
+        try:
+            os.remove(self.manifest_path)
+        except OSError:
+            pass
+
+    def _open_lexical_index(self) -> None:
+        """Attach the persisted BM25 index if it was built for the current index version."""
+        self.lexical_index = None
+        if not config.LEXICAL_INDEX_ENABLED or self.index_version is None:
+            return
+        index = BM25Index(self.persist_directory, self.collection_name)
+        if index.version == self.index_version:
+            self.lexical_index = index
+
+    def _sync_lexical_index(self) -> None:
+        """Rebuild the BM25 index from the stored chunks when the index version changed."""
+        self._open_lexical_index()
+        if not config.LEXICAL_INDEX_ENABLED or self.lexical_index is not None:
+            return
+        stored = self.vector_store.get(include=["documents", "metadatas"])
+        self.lexical_index = BM25Index.build(
+            stored["ids"], stored["documents"], stored["metadatas"],
+            persist_directory=self.persist_directory,
+            collection_name=self.collection_name,
+            version=self.index_version,
+        )
+        logger.info("Lexical index built: %d chunks, %d terms",
+                    len(self.lexical_index), self.lexical_index.meta.get("terms", 0))
+
+    def warm_up(self, background: bool = False) -> None:
+        """Load the embedding model now rather than on the first query."""
+        engine = _engine_of(self.embeddings)
+        if engine is None or engine.loaded:
+            return
+        if background:
+            threading.Thread(target=engine.warmup, name="embedding-warmup", daemon=True).start()
+        else:
+            engine.warmup()
+
+    def embedding_info(self) -> Dict[str, Any]:
+        engine = _engine_of(self.embeddings)
+        return engine.info() if engine else {}
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Embedding cache counters, empty when caching is disabled."""
+        if isinstance(self.embeddings, CachedEmbeddings):
+            return self.embeddings.stats()
+        return {}
+
+    def all_documents(self) -> List[Document]:
+        """Every stored chunk, in document order (by source, then chunk position)."""
         if self.vector_store is None:
             raise ValueError("Vector store not initialized.")
+        stored = self.vector_store.get(include=["documents", "metadatas"])
+        documents = [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(stored["documents"], stored["metadatas"])
+        ]
+        # Chunks reused by an incremental sync keep the position they were first stored
+        # with, so after an edit that adds or removes chunks the order is approximate
+        documents.sort(key=lambda doc: (str(doc.metadata.get("source", "")), doc.metadata.get("chunk", 0)))
+        return documents
+
+    @timed("search")
+    def similarity_search(self, query: str, k: int = 3, mmr: bool = False,
+                          score_threshold: Optional[float] = None, hybrid: bool = False) -> List[Document]:
+        """Top-k chunks for a query, with depth, MMR, hybrid and score threshold chosen per call.
+
+        MMR takes precedence over hybrid retrieval, and both over the threshold:
+        MMR re-ranks for diversity, and fused ranks are not relevance scores.
+        """
+        if self.vector_store is None:
+            raise ValueError("Vector store not initialized.")
+        if mmr:
+            return self.vector_store.max_marginal_relevance_search(
+                query, k=k, fetch_k=max(4 * k, 20)
+            )
+        if hybrid:
+            return [doc for doc, _ in self.hybrid_search_with_scores(query, k)]
+        if score_threshold:
+            scored = self.vector_store.similarity_search_with_relevance_scores(query, k=k)
+            return [doc for doc, score in scored if score >= score_threshold]
         results = self.vector_store.similarity_search(query, k=k)
         return results
 
-    def get_retriever(self, k: int = 3):
+    @timed("search")
+    def similarity_search_with_scores(self, query: str, k: int = 3) -> List[Tuple[Document, float]]:
+        """Top-k chunks with relevance scores in [0, 1] (higher is closer)."""
         if self.vector_store is None:
             raise ValueError("Vector store not initialized.")
+        return self.vector_store.similarity_search_with_relevance_scores(query, k=k)
+
+    @timed("search")
+    def lexical_search_with_scores(self, query: str, k: int = 3) -> List[Tuple[Document, float]]:
+        """Top-k chunks by BM25 score; empty when no lexical index is available."""
+        if self.lexical_index is None:
+            return []
+        return self.lexical_index.search(query, k)
+
+    @timed("search")
+    def hybrid_search_with_scores(self, query: str, k: int = 3) -> List[Tuple[Document, float]]:
+        """Top-k chunks by reciprocal rank fusion of vector and BM25 rankings.
+
+        Scores are fused ranks (sum of 1 / (RRF_K + rank)), comparable across
+        collections but not in [0, 1]. Without a lexical index this is the
+        vector ranking alone.
+        """
+        if self.vector_store is None:
+            raise ValueError("Vector store not initialized.")
+        fetch_k = max(4 * k, 20)
+        rankings = [self.vector_store.similarity_search(query, k=fetch_k)]
+        if self.lexical_index is not None:
+            rankings.append([doc for doc, _ in self.lexical_index.search(query, fetch_k)])
+        return reciprocal_rank_fusion(rankings, k, config.RRF_K)
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed a batch of queries in one forward pass."""
+        if isinstance(self.embeddings, CachedEmbeddings):
+            return self.embeddings.embed_queries(queries)
+        return self.embeddings.embed_documents(queries)
+
+    def batch_similarity_search(self, queries: List[str], k: int = 3) -> List[List[Document]]:
+        """Top-k chunks for many queries using one embedding pass and one collection query.
+
+        Chunks shared between queries are materialized once and reused.
+        """
+        return [
+            [doc for doc, _ in scored]
+            for scored in self.batch_similarity_search_with_scores(queries, k)
+        ]
+
+    @timed("search")
+    def batch_similarity_search_with_scores(self, queries: List[str], k: int = 3) -> List[List[Tuple[Document, float]]]:
+        """Scored variant of batch_similarity_search (relevance in [0, 1])."""
+        if self.vector_store is None:
+            raise ValueError("Vector store not initialized.")
+        if not queries:
+            return []
+        if isinstance(self.vector_store, FaissVectorStore):
+            return self.vector_store.search_by_vectors_with_scores(self.embed_queries(queries), k=k)
+        results = self.vector_store._collection.query(
+            query_embeddings=self.embed_queries(queries),
+            n_results=k,
+            include=["documents", "metadatas", "distances"]
+        )
+        relevance = self.vector_store._select_relevance_score_fn()
+        chunks: Dict[str, Document] = {}
+        batches = []
+        for ids, texts, metadatas, distances in zip(
+            results["ids"], results["documents"], results["metadatas"], results["distances"]
+        ):
+            docs = []
+            for chunk_id, text, metadata, distance in zip(ids, texts, metadatas, distances):
+                if chunk_id not in chunks:
+                    chunks[chunk_id] = Document(page_content=text, metadata=metadata or {})
+                docs.append((chunks[chunk_id], relevance(distance)))
+            batches.append(docs)
+        logger.debug("Batch search: %d queries, %d unique chunks", len(queries), len(chunks), extra=SAMPLED)
+        return batches
+
+    def get_retriever(self, k: int = 3, mmr: bool = False, score_threshold: Optional[float] = None):
+        if self.vector_store is None:
+            raise ValueError("Vector store not initialized.")
+        if mmr:
+            return self.vector_store.as_retriever(
+                search_type="mmr", search_kwargs={"k": k, "fetch_k": max(4 * k, 20)}
+            )
+        if score_threshold:
+            return self.vector_store.as_retriever(
+                search_type="similarity_score_threshold",
+                search_kwargs={"k": k, "score_threshold": score_threshold}
+            )
         return self.vector_store.as_retriever(search_kwargs={"k": k})
+
+
+def _chunk_id(document: Document, chunk_settings: Dict[str, Any], model_name: str) -> str:
+    """Content address of a chunk: text + chunker settings + embedding model."""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(json.dumps(chunk_settings, sort_keys=True).encode("utf-8"))
+    digest.update(document.page_content.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _version_of(chunk_ids) -> str:
+    """Stable version string for a set of chunk ids."""
+    digest = hashlib.sha256()
+    for chunk_id in sorted(chunk_ids):
+        digest.update(chunk_id.encode("utf-8"))
+    return digest.hexdigest()[:16]